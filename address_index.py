@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""This module provides an in-memory index of M+ address records for offline duplicate checks.
+"""
+#    Copyright (C) Christian Steiner 2025  {{{1
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/> 1}}}
+import json
+import os
+import time
+from typing import Iterable, List
+
+DEBUG = False
+NAME_FIELDS = ('AdrOrganisationTxt', 'AdrForeNameTxt', 'AdrSurNameTxt')
+INDEX_KEYS = (NAME_FIELDS[:1], NAME_FIELDS)
+
+def normalize(value: str) ->str:
+    return value.strip().casefold()
+
+def matches(record: dict, conditions: tuple) ->bool:
+    """Return True if the record fulfills all (fieldPath, operand) conditions,
+    vocabulary references are sets of ids
+    """
+    for fieldPath, operand in conditions:
+        value = record.get(fieldPath, '')
+        if isinstance(value, (set, list)):
+            if operand not in value:
+                return False
+        elif normalize(value) != normalize(operand):
+            return False
+    return True
+
+class AddressIndex:
+    """A hash index of address records by organisation and by organisation, forename and surname.
+
+    The index can be saved as a json snapshot and loaded again until it expires.
+    """
+    DAY = 24*60*60
+
+    def __init__(self, records: Iterable[dict] = (), server='', created=None):
+        self.server = server
+        self.created = created if created is not None else time.time()
+        self.records: List[dict] = []
+        self.index = {}
+        for record in records:
+            self.add(record)
+
+    @classmethod
+    def key(cls, fields: tuple, values: dict) ->tuple:
+        return (fields, tuple([ normalize(values.get(field, '')) for field in fields ]))
+
+    def add(self, record: dict):
+        self.records.append(record)
+        for fields in INDEX_KEYS:
+            self.index.setdefault(self.key(fields, record), []).append(record)
+
+    def lookup(self, conditions: tuple) ->str:
+        """Return the id of the first record that fulfills the conditions or None
+        """
+        values = dict(conditions)
+        fields = tuple([ field for field in NAME_FIELDS if field in values ])
+        candidates = self.index.get(self.key(fields, values), []) if fields in INDEX_KEYS else self.records
+        for record in candidates:
+            if matches(record, conditions):
+                return record['__id']
+        return None
+
+    def max_id(self) ->int:
+        return max([ int(record['__id']) for record in self.records ], default=0)
+
+    def expired(self, ttl: float) ->bool:
+        return time.time() - self.created > ttl
+
+    def save(self, path: str):
+        """Save the index as json snapshot
+        """
+        records = [ { key: sorted(value) if isinstance(value, set) else value for key, value in record.items() } for record in self.records ]
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as snapshot:
+            json.dump({ 'server': self.server, 'created': self.created, 'records': records }, snapshot)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) ->'AddressIndex':
+        """Load an index from a json snapshot
+        """
+        with open(path, encoding='utf-8') as snapshot:
+            data = json.load(snapshot)
+        records = [ { key: set(value) if isinstance(value, list) else value for key, value in record.items() } for record in data['records'] ]
+        return cls(records, data['server'], data['created'])
+
+    def __len__(self) ->int:
+        return len(self.records)
+
+    def __str__(self) ->str:
+        return f'{len(self.records)} addresses from {self.server}, {time.strftime("%Y-%m-%d %H:%M", time.localtime(self.created))}'
@@ -18,6 +18,8 @@
 #    along with this program.  If not, see <https://www.gnu.org/licenses/> 1}}}
 from colorama import Fore, Style
 from abc import ABC, abstractmethod
+from bisect import insort
+from concurrent.futures import Executor, Future
 import csv
 import getpass
 import getopt
@@ -29,16 +31,29 @@ import os
 import re
 import requests
 from SPARQLWrapper import SPARQLWrapper, JSON
+from artist_cache import ArtistCache
+from artist_dates import parse_date
+from metrics import MetricsRegistry
+from name_matcher import MATCHER, NameMatcher
+from rate_limiter import get_rate_limiter
 import sys
+import threading
+from operator import attrgetter
 import urllib.parse
 import xml.dom.minidom as MD
 from xml.etree import ElementTree
 import lxml.etree as LET
 import zetcom_session
 from zetcom_session import DataItem, SchemaItem
-from typing import List
+from typing import Iterable, Iterator, List
 
 DEBUG = False 
+
+def schema_accessors(schema: List[SchemaItem]) ->tuple:
+    """Return the csv fields and attribute getters of a schema, 
+    compute them once per writer and pass them to Artist.asrow
+    """
+    return tuple([ (item.csvField, attrgetter(item.fieldPath)) for item in schema ])
        
 class Artist:
     XML_SEARCH = b'<?xml version="1.0" encoding="UTF-8"?> \
@@ -54,6 +69,25 @@ class Artist:
                     </module> \
                 </modules> \
     </application>'
+    XML_BULK_SEARCH = b'<?xml version="1.0" encoding="UTF-8"?> \
+    <application xmlns="http://www.zetcom.com/ria/ws/module/search" \
+                 xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" \
+                 xsi:schemaLocation="http://www.zetcom.com/ria/ws/module/search http://www.zetcom.com/ria/ws/module/search/search_1_1.xsd"> \
+                 <modules> \
+                    <module name="Person"> \
+                        <search limit="500" offset="0"> \
+                            <select><field fieldPath="__id"/><field fieldPath="PerNennformTxt"/></select> \
+                            <expert><or/></expert> \
+                        </search> \
+                    </module> \
+                </modules> \
+    </application>'
+    NAME_FIELD = 'PerNennformTxt'
+    FIELDS = ('input_name', 'name', 'forename', 'surename', 'ulan', 'wikidata', 'link', 'gender', 'birth', 'death',\
+            'placeOfBirth', 'placeOfDeath', 'dates', 'livedBefore', 'livedAfter', 'epoche', 'life_data', 'nationalities', 'id')
+    BULK_CHUNK_SIZE = 50
+    __slots__ = FIELDS + ('query_failed', '_updated')
+
     def __init__(self, input_name: str, zsession: zetcom_session.ZetcomSession, init_id=True):
         self.input_name = input_name
         self.name = self.parse_name(input_name)
@@ -74,21 +108,44 @@ class Artist:
         self.life_data = ''
         self.nationalities = []
         self.query_failed = False
-        self.zsession = zsession
         self.id = None
+        self._updated = False
         if init_id:
-            self._update_id()
+            self._update_id(zsession)
 
-    def asrow(self, schema: List[SchemaItem]) ->dict:
-        """Return Artist as row for csv writing
+    def asrow(self, schema: List[SchemaItem], accessors: tuple = None) ->dict:
+        """Return Artist as row for csv writing, the live span is only updated if the artist changed
         """
-        self.update()
+        if not self._updated:
+            self.update()
         output = {}
-        for item in schema:
-            if self.__dict__[item.fieldPath] != '':
-                output[item.csvField] = self.__dict__[item.fieldPath]
+        for csvField, getter in (accessors if accessors is not None else schema_accessors(schema)):
+            value = getter(self)
+            if value != '':
+                output[csvField] = value
         return output
 
+    def changed(self):
+        """Mark the artist as changed, i.e. the live span has to be updated
+        """
+        self._updated = False
+
+    def asdict(self) ->dict:
+        """Return the data of the artist as dictionary
+        """
+        return { field: getattr(self, field) for field in self.FIELDS }
+
+    @classmethod
+    def from_dict(cls, data: dict) ->'Artist':
+        """Create an artist from the output of asdict
+        """
+        artist = cls(data.get('input_name', ''), None, False)
+        for field in cls.FIELDS:
+            if field in data:
+                setattr(artist, field, data[field])
+        artist.changed()
+        return artist
+
     def _set_epoche(self):
         """Set epoche
         """
@@ -115,6 +172,7 @@ class Artist:
         self.livedAfter = self.updateLivedAfter()
         self.link = self.wikidata if self.wikidata != '' else self.ulan
         self._set_epoche()
+        self._updated = True
 
     def updateLivedBefore(self) ->str:
         if len(self.dates) > 0:
@@ -133,7 +191,7 @@ class Artist:
             name = name.split('(')[0].strip()
         return name 
 
-    def _update_id(self):
+    def _update_id(self, zsession: zetcom_session.ZetcomSession):
         """Get Artist id or None
         """
         namespaces = {}
@@ -142,40 +200,199 @@ class Artist:
         fulltext = search_tree.xpath('//search:fulltext', namespaces=namespaces)[0]
         fulltext.text = self.name 
         xml_string = LET.tostring(search_tree, encoding='UTF-8')
-        xml = self.zsession.post('/ria-ws/application/module/Person/search', xml_string) 
+        xml = zsession.post('/ria-ws/application/module/Person/search', xml_string) 
         namespaces['module'] = xml.nsmap[None] 
         if len(xml.xpath('//module:module/module:moduleItem', namespaces=namespaces)) > 0:
             self.id = xml.xpath('//module:module/module:moduleItem/@id', namespaces=namespaces)[0]
 
+    @classmethod
+    def name_variants(cls, name: str) -> List[str]:
+        """Return the name and its 'Surname, Forename' form
+        """
+        variants = [ name ]
+        parts = name.split(' ')
+        if len(parts) > 1:
+            variants.append(parts[-1] + ', ' + ' '.join(parts[:-1]))
+        return variants
+
+    @classmethod
+    def normalize_name(cls, name: str) -> str:
+        """Return a 'Forename Surname' form of a name for comparison
+        """
+        if ',' in name:
+            surname, forename = name.split(',', 1)
+            name = forename.strip() + ' ' + surname.strip()
+        return ' '.join(name.split()).lower()
+
+    @classmethod
+    def create_bulk_search(cls, names: List[str], fuzzy=False) ->bytes:
+        """Return an expert search for all names, with fuzzy for the names 
+        that contain all words of a name
+        """
+        namespaces = {}
+        search_tree = LET.fromstring(cls.XML_BULK_SEARCH)
+        namespaces['search'] =  search_tree.nsmap[None]
+        search = search_tree.xpath('//search:search', namespaces=namespaces)[0]
+        search.attrib['limit'] = str(len(names)*10)
+        orNode = search_tree.xpath('//search:expert/search:or', namespaces=namespaces)[0]
+        for name in names:
+            if fuzzy:
+                andNode = LET.SubElement(orNode, f'{{{namespaces["search"]}}}and')
+                for word in name.split():
+                    element = LET.SubElement(andNode, f'{{{namespaces["search"]}}}contains')
+                    element.attrib['fieldPath'] = cls.NAME_FIELD
+                    element.attrib['operand'] = word
+                continue
+            for variant in cls.name_variants(name):
+                element = LET.SubElement(orNode, f'{{{namespaces["search"]}}}equalsField')
+                element.attrib['fieldPath'] = cls.NAME_FIELD
+                element.attrib['operand'] = variant
+        return LET.tostring(search_tree, encoding='UTF-8')
+
+    @classmethod
+    def _bulk_search(cls, names: List[str], zsession: zetcom_session.ZetcomSession, fuzzy=False) ->Iterator[tuple]:
+        """Yield the (id, name) of all Persons found by a bulk search for names
+        """
+        xml = zsession.post('/ria-ws/application/module/Person/search', cls.create_bulk_search(names, fuzzy)) 
+        namespaces = { 'module': xml.nsmap[None] }
+        for item in xml.xpath('//module:module/module:moduleItem', namespaces=namespaces):
+            for value in item.xpath(f'module:dataField[@name="{cls.NAME_FIELD}"]/module:value/text()', namespaces=namespaces):
+                yield item.get('id'), value
+
+    @classmethod
+    def update_ids(cls, artists: List['Artist'], zsession: zetcom_session.ZetcomSession, chunk_size=BULK_CHUNK_SIZE, fallback=True):
+        """Set the ids of all artists with one Person search per chunk of names.
+
+        Artists without an exact match are searched again per chunk for names
+        that contain all their words unless fallback is False.
+        """
+        artists_by_name = {}
+        for artist in artists:
+            artists_by_name.setdefault(cls.normalize_name(artist.name), []).append(artist)
+        names = [ items[0].name for items in artists_by_name.values() ]
+        for index in range(0, len(names), chunk_size):
+            for item_id, value in cls._bulk_search(names[index:index+chunk_size], zsession):
+                for artist in artists_by_name.get(cls.normalize_name(value), []):
+                    if artist.id is None:
+                        artist.id = item_id
+        if not fallback:
+            return
+        names = [ items[0].name for items in artists_by_name.values() if items[0].id is None ]
+        for index in range(0, len(names), chunk_size):
+            chunk = names[index:index+chunk_size]
+            for item_id, value in cls._bulk_search(chunk, zsession, fuzzy=True):
+                for name in chunk:
+                    if all([ word in value.casefold() for word in name.casefold().split() ]):
+                        for artist in artists_by_name[cls.normalize_name(name)]:
+                            if artist.id is None:
+                                artist.id = item_id
+
     def addDate(self, dateStr: str):
-        """Add a date and sort the date list
-        """
-        date = re.compile('(\D+)*(\d{4})(\D\d{2,4})*(\D+)*')
-        century = re.compile('(\D+)*(\d{2})(.*century.*)')
-        if date.match(dateStr):
-            date_group = date.match(dateStr).groups()
-            self.dates.append(date_group[1])
-            if date_group[2] is not None:
-                second_date = date_group[2][1:]
-                self.dates.append(second_date)
-        elif century.match(dateStr):
-            date_group = century.match(dateStr).groups()
-            century_years = (int(date_group[1]) -1)*100
-            years = 50
-            if date_group[0] is not None and re.match(r'(?i)early', date_group[0]):
-                years = 25
-            elif date_group[0] is not None and re.match(r'(?i)late', date_group[0]):
-                years = 75
-            self.dates.append(str(century_years + years))
-        self.dates.sort()
+        """Add the years of a date string to the sorted date list
+        """
+        for year in parse_date(dateStr):
+            insort(self.dates, year)
+        self._updated = False
+
+class ArtistRegistry:
+    """An insertion ordered collection of artists with unique names.
+    """
+    def __init__(self, artists: Iterable[Artist] = ()):
+        self.artists = {}
+        for artist in artists:
+            self.add(artist)
+
+    def add(self, artist: Artist, replace=False) ->bool:
+        """Add an artist, return False if an artist with that name exists and is not replaced
+        """
+        if artist.name in self.artists and not replace:
+            return False
+        self.artists[artist.name] = artist
+        return True
+
+    def get(self, name: str) ->Artist:
+        return self.artists.get(name)
+
+    def discard(self, artist: Artist):
+        """Remove an artist if it is in the registry
+        """
+        self.artists.pop(artist.name, None)
+
+    def sorted(self) ->List[Artist]:
+        """Return the artists sorted by name
+        """
+        return [ self.artists[name] for name in sorted(self.artists.keys()) ]
+
+    def __contains__(self, item) ->bool:
+        name = item.name if isinstance(item, Artist) else item
+        return name in self.artists
+
+    def __iter__(self) ->Iterator[Artist]:
+        return iter(self.artists.values())
+
+    def __len__(self) ->int:
+        return len(self.artists)
 
 class ArtistAPI(ABC):
     """This class can be used to update artists 
+
+    Query latencies, cache hits and failed queries are recorded in metrics.
     """
+    BATCH_SIZE = 20
+
+    def __init__(self, endpoint, cache: ArtistCache = None, rate=1.0, burst=1, max_workers=4, matcher: NameMatcher = MATCHER, metrics: MetricsRegistry = None): 
+        self.endpoint = endpoint
+        self.cache = cache
+        self.matcher = matcher
+        self.limiter = get_rate_limiter(endpoint, rate, burst)
+        self.max_workers = max_workers
+        self.semaphore = threading.BoundedSemaphore(max_workers)
+        self.local = threading.local()
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.api_name = self.__class__.__name__
 
-    def __init__(self, endpoint): 
-        self.sparql = SPARQLWrapper(endpoint, "")
-        self.sparql.setReturnFormat(JSON)
+    @property
+    def sparql(self) ->SPARQLWrapper:
+        """Return the SPARQLWrapper of the current thread
+        """
+        if not hasattr(self.local, 'sparql'):
+            self.local.sparql = SPARQLWrapper(self.endpoint, "")
+            self.local.sparql.setReturnFormat(JSON)
+        return self.local.sparql
+
+    @classmethod
+    def _literal(cls, name: str) ->str:
+        """Return name escaped for a SPARQL string literal
+        """
+        return name.replace('\\', '\\\\').replace('"', '\\"')
+
+    @classmethod
+    def _year(cls, date_str: str) ->int:
+        """Return the year of a xsd date or gYear string
+        """
+        sign = -1 if date_str.startswith('-') else 1
+        return sign * int(date_str.lstrip('+-').split('-')[0])
+
+    @classmethod
+    def _retry_after(cls, e: Exception, default: float) ->float:
+        """Return the seconds of a Retry-After header of the exception or default
+        """
+        headers = getattr(e, 'headers', None)
+        if headers is not None and headers.get('Retry-After') is not None:
+            try:
+                return float(headers.get('Retry-After'))
+            except ValueError:
+                pass
+        return default
+
+    def _retry_later(self, e: Exception, artist: Artist, default: float) ->int:
+        """Block the endpoint for Retry-After or default seconds and query the artist again
+        """
+        wait = self._retry_after(e, default)
+        print(Fore.BLUE + f'Query the api again in {wait}s ...' + Style.RESET_ALL)
+        artist.query_failed = True
+        self.limiter.penalize(wait)
+        return self.query_artist(artist)
 
     @abstractmethod
     def _create_query(self, artist: Artist) ->str:
@@ -183,6 +400,13 @@ class ArtistAPI(ABC):
         """
         pass
 
+    @abstractmethod
+    def _create_batch_query(self, artists: List[Artist]) ->str:
+        """Abstract method: create one query for several artists,
+        the query must bind the artist name to ?name
+        """
+        pass
+
     @abstractmethod
     def _process_response(self, response: dict, artist: Artist):
         """Abstract method: process result 
@@ -195,13 +419,148 @@ class ArtistAPI(ABC):
         """
         pass
 
+    def _cache_key(self, artist: Artist) ->str:
+        return ArtistCache.key(self.__class__.__name__, artist.name, artist.livedBefore, artist.livedAfter)
+
+    def _filter_bindings(self, bindings: List[dict], artist: Artist) ->List[dict]:
+        """Return the bindings that lie in the lived before/after window of the artist,
+        bindings without a birth or death date are only checked by the other date
+        """
+        if artist.livedBefore == '':
+            return bindings
+        try:
+            before = int(artist.livedBefore)
+            after = int(artist.livedAfter)
+        except ValueError:
+            return bindings
+        return [ binding for binding in bindings if self._in_window(binding, before, after) ]
+
+    def _in_window(self, binding: dict, before: int, after: int) ->bool:
+        """Return whether the binding was born before and did not die before the window
+        """
+        try:
+            born = self._year(binding["birth"]["value"]) < before
+        except (KeyError, ValueError):
+            born = True
+        try:
+            alive = self._year(binding["death"]["value"]) >= after
+        except (KeyError, ValueError):
+            alive = True
+        return born and alive
+
+    def _process_batch_response(self, response: dict, artists: List[Artist]):
+        """Split the bindings of a batch query by ?name and process them for each artist
+        """
+        bindings_by_name = {}
+        for binding in response["results"]["bindings"]:
+            bindings_by_name.setdefault(binding["name"]["value"], []).append(binding)
+        for artist in artists:
+            bindings = self._filter_bindings(bindings_by_name.get(artist.name, []), artist)
+            response = { "results": { "bindings": bindings }}
+            if self.cache is not None:
+                self.cache.set(self._cache_key(artist), response)
+            self._process_response(response, artist)
+            artist.query_failed = False
+            artist.changed()
+
+    def _query(self, query: str) ->dict:
+        """Send a query to the endpoint and return the converted response
+        """
+        self.limiter.acquire()
+        sparql = self.sparql
+        sparql.setQuery(query)
+        return sparql.queryAndConvert()
+
+    def _cached(self, key: str) ->dict:
+        """Return the cached response for key or None
+        """
+        response = self.cache.get(key)
+        self.metrics.inc('artist_cache_total', api=self.api_name, result='miss' if response is None else 'hit')
+        return response
+
+    def _timed_query(self, query: str, kind='single') ->dict:
+        with self.metrics.timer('artist_query_seconds', api=self.api_name, kind=kind):
+            return self._query(query)
+
+    def _fetch(self, query: str, key: str) ->dict:
+        """Return the response for query from the cache or the endpoint
+        """
+        if self.cache is not None:
+            response = self._cached(key)
+            if response is not None:
+                return response
+        with self.semaphore:
+            response = self._timed_query(query)
+        if self.cache is not None:
+            self.cache.set(key, response)
+        return response
+
     def query_artist(self, artist: Artist) ->int:
         query = self._create_query(artist)
-        self.sparql.setQuery(query)
         try:
-            response = self.sparql.queryAndConvert()
+            with self.metrics.timer('artist_lookup_seconds', api=self.api_name):
+                response = self._fetch(query, self._cache_key(artist))
+                self._process_response(response, artist)
+            artist.query_failed = False
+            return 0
+        except Exception as e:
+            self.metrics.inc('artist_query_errors_total', api=self.api_name, error=e.__class__.__name__)
+            return self._process_exception(e, artist)
+        finally:
+            artist.changed()
+
+    def submit_artist(self, executor: Executor, artist: Artist) ->Future:
+        """Create the query for artist and fetch the response on executor
+        """
+        query = self._create_query(artist)
+        return executor.submit(self._fetch, query, self._cache_key(artist))
+
+    def process_future(self, future: Future, artist: Artist) ->int:
+        """Wait for a response from submit_artist and process it
+        """
+        try:
+            response = future.result()
             self._process_response(response, artist)
             artist.query_failed = False
             return 0
         except Exception as e:
-            self._process_exception(e, artist)
+            self.metrics.inc('artist_query_errors_total', api=self.api_name, error=e.__class__.__name__)
+            return self._process_exception(e, artist)
+        finally:
+            artist.changed()
+
+    def query_artists(self, artists: List[Artist], batch_size=BATCH_SIZE, failed: List[Artist] = None) ->int:
+        """Query the artists with one query per batch of names.
+
+        If a batch query fails, the artists of the batch are queried one by one,
+        artists whose query failed again are appended to failed.
+        """
+        exit_code = 0
+        for artist in artists:
+            artist.update()
+        if self.cache is not None:
+            missing = []
+            for artist in artists:
+                response = self._cached(self._cache_key(artist))
+                if response is not None:
+                    self._process_response(response, artist)
+                    artist.changed()
+                else:
+                    missing.append(artist)
+            artists = missing
+        for index in range(0, len(artists), batch_size):
+            batch = artists[index:index+batch_size]
+            try:
+                response = self._timed_query(self._create_batch_query(batch), 'batch')
+                self._process_batch_response(response, batch)
+            except Exception as e:
+                self.metrics.inc('artist_query_errors_total', api=self.api_name, error=e.__class__.__name__)
+                print(Fore.RED + f'Batch query failed: {e}, querying artists one by one ...' + Style.RESET_ALL)
+                self.limiter.penalize(self._retry_after(e, 0))
+                for artist in batch:
+                    exit_code = self.query_artist(artist)
+                    if exit_code != 0 and failed is not None:
+                        failed.append(artist)
+                    if exit_code in (403, 429):
+                        return exit_code
+        return exit_code
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""This module provides a persistent cache for artist api lookups.
+"""
+#    Copyright (C) Christian Steiner 2025  {{{1
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/> 1}}}
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Optional
+
+DEBUG = False 
+
+class ArtistCache:
+    """A sqlite based cache for api responses with ttl and lru eviction.
+
+    Responses without results expire after negative_ttl, so that artists 
+    added to an api are found again soon.
+    """
+    DAY = 24*60*60
+
+    def __init__(self, path='artist_cache.sqlite', ttl=30*DAY, max_entries=100000, bypass=False, negative_ttl=DAY):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, created REAL, accessed REAL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)')
+        self.connection.commit()
+
+    @classmethod
+    def key(cls, source: str, name: str, livedBefore='', livedAfter='') ->str:
+        """Return a normalized key for a query
+        """
+        name = ' '.join(unicodedata.normalize('NFC', name).split())
+        return f'{source}|{name}|{livedBefore}|{livedAfter}'
+
+    @classmethod
+    def is_negative(cls, value: dict) ->bool:
+        """Return whether value is a response without results
+        """
+        return isinstance(value, dict) and value.get('results', {}).get('bindings') == []
+
+    def get(self, key: str) ->Optional[dict]:
+        """Return the cached value or None
+        """
+        if self.bypass:
+            return None
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute('SELECT value, created FROM cache WHERE key = ?', (key,)).fetchone()
+            value = json.loads(row[0]) if row is not None else None
+            if row is None or now - row[1] > (self.negative_ttl if self.is_negative(value) else self.ttl):
+                if row is not None:
+                    self.connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+                    self.connection.commit()
+                self.misses += 1
+                return None
+            self.connection.execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+            self.connection.commit()
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: dict):
+        """Store a value and evict the least recently used entries
+        """
+        if self.bypass:
+            return
+        now = time.time()
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)', (key, json.dumps(value), now, now))
+            size = self.connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+            if size > self.max_entries:
+                self.connection.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed LIMIT ?)', (size - self.max_entries,))
+            self.connection.commit()
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM cache')
+            self.connection.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def __str__(self):
+        return f'{self.path}: {self.hits} hits, {self.misses} misses'
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""This module provides the date parsing for artists.
+"""
+#    Copyright (C) Christian Steiner 2025  {{{1
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/> 1}}}
+from functools import lru_cache
+import re
+from typing import Tuple
+
+DEBUG = False 
+DATE = re.compile(r'(\D+)*(\d{4})(\D\d{2,4})*(\D+)*')
+CENTURY = re.compile(r'(\D+)*(\d{2})(.*century.*)')
+EARLY = re.compile(r'(?i)early')
+LATE = re.compile(r'(?i)late')
+
+@lru_cache(maxsize=4096)
+def parse_date(dateStr: str) ->Tuple[str, ...]:
+    """Return the years of a date string, e.g. ('1923', '1939') for 'c. 1923-1939'
+    or ('1925',) for 'early 20th century'.
+    """
+    m = DATE.match(dateStr)
+    if m:
+        date_group = m.groups()
+        if date_group[2] is not None:
+            return (date_group[1], date_group[2][1:])
+        return (date_group[1],)
+    m = CENTURY.match(dateStr)
+    if m:
+        date_group = m.groups()
+        century_years = (int(date_group[1]) -1)*100
+        years = 50
+        if date_group[0] is not None and EARLY.match(date_group[0]):
+            years = 25
+        elif date_group[0] is not None and LATE.match(date_group[0]):
+            years = 75
+        return (str(century_years + years),)
+    return ()
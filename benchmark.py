@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""This program can be used to benchmark the update pipelines against local stand-ins.
+"""
+#    Copyright (C) Christian Steiner 2025  {{{1
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/> 1}}}
+from colorama import Fore, Style
+from contextlib import redirect_stdout
+import csv
+import getopt
+import io
+import json
+import math
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, List
+from annotations_update import AnnotationUpdate
+from local_authority import AuthorityStore, ULAN, WIKIDATA
+from mediastandard_validation import MediaStandard
+from ria_emulator import FIXTURE, RiaEmulator
+from zetcom_address_update import AddressParser, AddressRecord, COUNTRY_DICT, ZetcomAddressUpdates
+from zetcom_artist_update import ZetcomArtistUpdate
+
+DEBUG = False
+USERNAME = 'BenchmarkUser'
+PASSWORD = 'benchmark'
+MEDIASTANDARD = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'medienstandard_v3_regex.json')
+FORENAMES = ('Augusta', 'Elisàr', 'Stanisław', 'Paul', 'Sophie', 'Meret', 'Ferdinand', 'Hannah', 'Johannes', 'Niki', 'Jean', 'Louise', 'Max', 'Marianne')
+SURNAMES = ('Roszmann', 'Kupffer', 'Witkiewicz', 'Klee', 'Taeuber', 'Oppenheim', 'Hodler', 'Villiers', 'Itten', 'Saint Phalle', 'Arp', 'Bourgeois', 'Ernst', 'Werefkin')
+INSTITUTIONS = ('Kunstmuseum', 'Kunsthalle', 'Foundation', 'Gallery', 'Collection', 'Museum of Art', 'Archive', 'University')
+CITIES = ('Basel', 'Zürich', 'Bern', 'Paris', 'London', 'Berlin', 'New York', 'Tokyo')
+BENCHMARKS = ('artists', 'addresses', 'address_parser', 'annotations', 'mediastandard')
+
+def percentile(values: List[float], percent: float) ->float:
+    """Return the nearest-rank percentile of values
+    """
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(percent/100*len(ordered)) - 1))
+    return ordered[index]
+
+def peak_rss() ->int:
+    """Return the peak resident set size of this process in kB, 
+    i.e. the peak of all benchmarks that ran so far
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+class Measurement:
+    """Wall time, row count and call latencies of one benchmark run.
+    """
+    def __init__(self, name: str, rows=0):
+        self.name = name
+        self.rows = rows
+        self.latencies = []
+        self.seconds = 0.0
+        self.start = None
+
+    def timed(self, function: Callable) ->Callable:
+        """Return function wrapped to record its latency
+        """
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+        return wrapper
+
+    def wrap(self, obj, method: str):
+        """Record the latency of every call to obj.method
+        """
+        setattr(obj, method, self.timed(getattr(obj, method)))
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self.start
+
+    def asdict(self) ->dict:
+        seconds = max(self.seconds, 1e-9)
+        return { 'rows': self.rows, 'seconds': round(self.seconds, 4), 'rows_per_s': round(self.rows/seconds, 2),\
+                'requests': len(self.latencies), 'requests_per_s': round(len(self.latencies)/seconds, 2),\
+                'p50_ms': round(percentile(self.latencies, 50)*1000, 3), 'p95_ms': round(percentile(self.latencies, 95)*1000, 3),\
+                'process_peak_rss_kb': peak_rss() }
+
+class IiifHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        content = b'Not found' if '/missing_' in self.path else b'{"@context": "http://iiif.io/api/image/2/context.json"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        if DEBUG:
+            super().log_message(format, *args)
+
+class IiifStandIn:
+    """A local IIIF image server that knows every image except those named 'missing_*'.
+    """
+    def __init__(self):
+        self.server = None
+
+    def __enter__(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), IiifHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        host, port = self.server.server_address[0:2]
+        self.url = f'http://{host}:{port}'
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+def generate_artists(count: int, seed=0) ->List[dict]:
+    """Return count artist rows with 'Artist' and 'Date' columns
+    """
+    rng = random.Random(seed)
+    rows = []
+    for index in range(count):
+        name = f'{rng.choice(FORENAMES)} {rng.choice(SURNAMES)} {index}'
+        birth = rng.randint(1800, 1990)
+        rows.append({ 'Artist': name, 'Date': f'{birth}-{birth + rng.randint(20, 40)}' })
+    return rows
+
+def generate_addresses(count: int, seed=0) ->List[dict]:
+    """Return count address rows with the columns of ZetcomAddressUpdates.DEFAULT_SCHEMA
+    """
+    rng = random.Random(seed)
+    countries = list(COUNTRY_DICT.keys())
+    rows = []
+    for index in range(count):
+        institution = f'{rng.choice(CITIES)} {rng.choice(INSTITUTIONS)} {index}'
+        person = index % 3 != 0
+        forename = rng.choice(FORENAMES) if person else ''
+        surname = rng.choice(SURNAMES) if person else ''
+        if person and index % 7 == 0:
+            forename = 'Dr. ' + forename
+        rows.append({ 'Institution': institution, 'First_Name': forename, 'Last_Name': surname, 'Title': 'Curator' if person else '',\
+                'Address': f'Hauptstrasse {index % 200 + 1}\n{rng.randint(1000, 9999)} {rng.choice(CITIES)}', 'Country': rng.choice(countries),\
+                'Email': f'{surname.replace(" ", "").lower() or "info"}{index}@example.org' })
+    return rows
+
+def generate_exhibits(count: int, iiif_url: str, seed=0) ->(dict, List[dict]):
+    """Return exhibit json data and the object rows that replace its missing links
+    """
+    rng = random.Random(seed)
+    exhibits = []
+    objects = []
+    for index in range(count):
+        object_id = f'{index + 1:07d}'
+        missing = rng.random() < 0.2
+        name = f'missing_{object_id}' if missing else f'gw11_{object_id}_2024-01-01_s-001'
+        exhibits.append({ 'link': { lang: f'{iiif_url}/iiif/2/{name}?lang={lang}' for lang in ('de', 'en', 'fr') }})
+        if missing and rng.random() < 0.5:
+            objects.append({ 'ID': str(index + 1), 'Picturepark IIIF URL': f'<{iiif_url}/iiif/2/gw11_{object_id}_2025-01-01_s-001>' })
+    return { 'exhibits': exhibits }, objects
+
+def generate_filenames(count: int, seed=0) ->List[str]:
+    """Return count media filenames, about a quarter of them invalid
+    """
+    rng = random.Random(seed)
+    filenames = []
+    for index in range(count):
+        filename = f'kw2{rng.choice("ad")}_{rng.randint(1, 99999):07d}_{rng.randint(1990, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}_s-{rng.randint(1, 9):03d}-dw.jpg'
+        error = rng.randint(0, 11)
+        if error == 0:
+            filename = filename.upper()
+        elif error == 1:
+            filename = filename.replace('_s-', ' s-')
+        elif error == 2:
+            filename = 'z' + filename[1:]
+        filenames.append(filename)
+    return filenames
+
+def write_csv(path: str, rows: List[dict]):
+    with open(path, 'w', newline='') as writeFile:
+        writer = csv.DictWriter(writeFile, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+
+def emulator_fixture(persons: List[dict], addresses: List[dict]) ->dict:
+    """Return a RiaEmulator fixture with persons and addresses in the Person and Address modules
+    """
+    with open(FIXTURE, encoding='utf-8') as fixture_file:
+        fixture = json.load(fixture_file)
+    fixture['modules']['Person'] = persons
+    fixture['modules']['Address'] = addresses
+    return fixture
+
+def bench_artists(workdir: str, count: int, latency=0.0, workers=1, batch_size=1) ->dict:
+    """Benchmark ZetcomArtistUpdate.process_file; every fourth artist exists in M+,
+    every second one is known to the local authority index.
+    """
+    rows = generate_artists(count)
+    csv_file = os.path.join(workdir, 'artists.csv')
+    # process_file consumes the first row to detect the columns
+    write_csv(csv_file, [ { 'Artist': 'Header', 'Date': '' } ] + rows)
+    persons = []
+    store = AuthorityStore(os.path.join(workdir, 'authority.sqlite'))
+    for index, row in enumerate(rows):
+        forename, surname = row['Artist'].rsplit(' ', 1)
+        birth, death = row['Date'].split('-')
+        if index % 4 == 0:
+            persons.append({ '__id': str(100000 + index), 'PerNennformTxt': f'{surname}, {forename}' })
+        elif index % 2 == 1:
+            store.add({ 'uri': f'http://vocab.getty.edu/ulan/{500000000 + index}', 'source': ULAN, 'label': f'{surname}, {forename}', 'birth': birth, 'death': death }, [ row['Artist'] ])
+            store.add({ 'uri': f'http://www.wikidata.org/entity/Q{index}', 'source': WIKIDATA, 'label': row['Artist'], 'birth': f'{birth}-01-01T00:00:00Z', 'gender': 'female' }, [ row['Artist'] ])
+    store.commit()
+    store.close()
+    with RiaEmulator(emulator_fixture(persons, []), latency=latency, password=PASSWORD) as emulator:
+        update = ZetcomArtistUpdate(USERNAME, emulator.url, batch_size, None, workers, None, False, os.path.join(workdir, 'authority.sqlite'), PASSWORD)
+        measurement = Measurement('artists', count)
+        measurement.wrap(update.zsession, '_request')
+        measurement.wrap(update.getty, '_query')
+        measurement.wrap(update.wikidata, '_query')
+        with measurement:
+            update.process_file(csv_file, os.path.join(workdir, 'artists_out.csv'), os.path.join(workdir, 'artists_existing.csv'), unknown_file=os.path.join(workdir, 'artists_unknown.csv'))
+        update.close()
+    return measurement.asdict()
+
+def bench_addresses(workdir: str, count: int, latency=0.0) ->dict:
+    """Benchmark ZetcomAddressUpdates.process_file; every second address exists in M+
+    """
+    rows = generate_addresses(count)
+    csv_file = os.path.join(workdir, 'addresses.csv')
+    write_csv(csv_file, rows)
+    addresses = []
+    for index, row in enumerate(rows[::2]):
+        if row['First_Name'] == '':
+            addresses.append({ '__id': str(200000 + index), 'AdrOrganisationTxt': row['Institution'], 'AdrPersonTypeVoc': '30001' })
+        else:
+            addresses.append({ '__id': str(200000 + index), 'AdrOrganisationTxt': row['Institution'], 'AdrForeNameTxt': row['First_Name'].replace('Dr. ', ''),\
+                    'AdrSurNameTxt': row['Last_Name'], 'AdrPersonTypeVoc': '30002' })
+    with RiaEmulator(emulator_fixture([], addresses), latency=latency, password=PASSWORD) as emulator:
+        update = ZetcomAddressUpdates([], USERNAME, emulator.url, PASSWORD, quiet=True)
+        measurement = Measurement('addresses', count)
+        measurement.wrap(update.zsession, '_request')
+        with measurement:
+            update.process_file(csv_file, os.path.join(workdir, 'addresses_out.csv'))
+        update.close()
+    return measurement.asdict()
+
+def bench_address_parser(count: int) ->dict:
+    """Micro-benchmark of parsing address rows into address records, the latencies are per row
+    """
+    rows = generate_addresses(count)
+    parser = AddressParser(ZetcomAddressUpdates.DEFAULT_SCHEMA)
+    measurement = Measurement('address_parser', count)
+    parse = measurement.timed(lambda row: AddressRecord(parser.parse_row(row)))
+    with measurement:
+        for row in rows:
+            parse(row)
+    return measurement.asdict()
+
+def bench_annotations(workdir: str, count: int) ->dict:
+    """Benchmark AnnotationUpdate.process_file against a local IIIF server
+    """
+    with IiifStandIn() as iiif:
+        data, objects = generate_exhibits(count, iiif.url)
+        json_file = os.path.join(workdir, 'exhibits.json')
+        csv_file = os.path.join(workdir, 'objects.csv')
+        with open(json_file, 'w') as jf:
+            json.dump(data, jf)
+        write_csv(csv_file, objects if len(objects) > 0 else [ { 'ID': '0', 'Picturepark IIIF URL': '' } ])
+        update = AnnotationUpdate(csv_file)
+        measurement = Measurement('annotations', count)
+        measurement.wrap(update, '_is_link_valid')
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            with measurement:
+                update.process_file(json_file, os.path.join(workdir, 'exhibits_out.json'))
+        finally:
+            os.chdir(cwd)
+    return measurement.asdict()
+
+def bench_mediastandard(count: int, json_file=MEDIASTANDARD) ->dict:
+    """Benchmark MediaStandard.check_filename
+    """
+    checker = MediaStandard()
+    checker.load(json_file)
+    paths = [ Path(filename) for filename in generate_filenames(count) ]
+    measurement = Measurement('mediastandard', count)
+    check_filename = measurement.timed(checker.check_filename)
+    with measurement:
+        for path in paths:
+            check_filename(path)
+    return measurement.asdict()
+
+def run(benchmarks: List[str], count: int, latency=0.0, workers=1, batch_size=1) ->dict:
+    """Run benchmarks and return their results
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in benchmarks:
+            print(Fore.MAGENTA + f'Running {name} with {count} rows ...' + Style.RESET_ALL)
+            output = io.StringIO() if not DEBUG else sys.stdout
+            with redirect_stdout(output):
+                if name == 'artists':
+                    results[name] = bench_artists(workdir, count, latency, workers, batch_size)
+                elif name == 'addresses':
+                    results[name] = bench_addresses(workdir, count, latency)
+                elif name == 'address_parser':
+                    results[name] = bench_address_parser(count)
+                elif name == 'annotations':
+                    results[name] = bench_annotations(workdir, count)
+                else:
+                    results[name] = bench_mediastandard(count)
+            print(f'{name}: ' + ', '.join([ f'{key}={value}' for key, value in results[name].items() ]))
+    return { 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(), 'rows': count,\
+            'latency': latency, 'workers': workers, 'batch_size': batch_size, 'results': results }
+
+def usage():
+    """prints information on how to use the script
+    """
+    print(main.__doc__)
+
+def main(argv):
+    """This program can be used to benchmark the update pipelines against local stand-ins.
+
+    benchmark.py [OPTIONS] [artists|addresses|address_parser|annotations|mediastandard ...]
+
+        OPTIONS:
+        -h|--help                      show help
+        -b|--batch-size                artist batch size (default: 1)
+        -l|--latency                   emulated M+ latency in seconds (default: 0)
+        -n|--rows                      number of synthetic input rows (default: 1000)
+        -o|--output                    json file for the results (default: benchmark_results.json)
+        -w|--workers                   number of concurrent artist queries (default: 1)
+
+        :return: exit code (int)
+    """
+    count = 1000
+    latency = 0.0
+    workers = 1
+    batch_size = 1
+    output_file = 'benchmark_results.json'
+    try:
+        opts, args = getopt.getopt(argv, "hb:l:n:o:w:", ["help", "batch-size=", "latency=", "rows=", "output=", "workers="])
+    except getopt.GetoptError:
+        usage()
+        return 2
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            usage()
+            return 0
+        elif opt in ('-b', '--batch-size'):
+            batch_size = int(arg)
+        elif opt in ('-l', '--latency'):
+            latency = float(arg)
+        elif opt in ('-n', '--rows'):
+            count = int(arg)
+        elif opt in ('-o', '--output'):
+            output_file = arg
+        elif opt in ('-w', '--workers'):
+            workers = int(arg)
+    unknown = [ arg for arg in args if arg not in BENCHMARKS ]
+    if len(unknown) > 0:
+        print(Fore.RED + f'Unknown benchmark: {", ".join(unknown)}' + Style.RESET_ALL)
+        usage()
+        return 2
+    results = run(args if len(args) > 0 else list(BENCHMARKS), count, latency, workers, batch_size)
+    with open(output_file, 'w') as jf:
+        json.dump(results, jf, indent=2)
+    print(Fore.MAGENTA + f'Results written to {output_file}' + Style.RESET_ALL)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
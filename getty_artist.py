@@ -55,6 +55,22 @@ select distinct * {
    #filter (  ?birth < "#LIVEDBEFORE#"^^xsd:gYear && ?death >= "#LIVEDAFTER#"^^xsd:gYear)
 }
     """
+BATCH_QUERY = """
+select distinct * {
+  VALUES ?name { #NAMES# }
+  ?g skos:exactMatch [ rdfs:label ?name ];
+     foaf:focus/gvp:biographyPreferred ?bio;
+      gvp:prefLabelGVP [xl:literalForm ?label ].
+
+     ?bio
+       gvp:estStart ?birth;
+       gvp:estEnd ?death;
+
+   optional { ?bio  schema:gender [ rdfs:label ?gender ]
+      filter langMatches(lang(?gender), "en")
+   }
+}
+    """
       
 
 class Getty(ArtistAPI):
@@ -62,8 +78,8 @@ class Getty(ArtistAPI):
     """
     gender_dict = { 'male': 'männlich', 'female': 'weiblich', 'divers': 'divers' }
 
-    def __init__(self, endpoint='https://vocab.getty.edu/sparql.json'): 
-        super().__init__( endpoint)
+    def __init__(self, endpoint='https://vocab.getty.edu/sparql.json', cache=None, rate=2.0, burst=4, max_workers=4, metrics=None): 
+        super().__init__(endpoint, cache, rate, burst, max_workers, metrics=metrics)
 
     def _create_query(self, artist: Artist) ->str:
         """Create the query
@@ -74,11 +90,17 @@ class Getty(ArtistAPI):
             query = query.replace('#filter', 'filter').replace('#LIVEDBEFORE#', artist.livedBefore).replace('#LIVEDAFTER#', artist.livedAfter)
         return query
 
+    def _create_batch_query(self, artists: List[Artist]) ->str:
+        """Create one query for all artists, the lived before/after filter is applied on the response
+        """
+        names = ' '.join([ f'"{self._literal(name)}"' for name in dict.fromkeys([ artist.name for artist in artists ]) ])
+        return BATCH_QUERY.replace('#NAMES#', names)
+
     def _process_response(self, response: dict, artist: Artist):
         """Process result 
         """
         if len(response["results"]["bindings"]) > 0:
-            artist_data = response["results"]["bindings"][0]
+            artist_data = self.matcher.best(response["results"]["bindings"], artist, "label")
             artist.ulan = artist_data["g"]["value"]
             label = artist_data["label"]["value"]
             if "," in label:
@@ -96,17 +118,10 @@ class Getty(ArtistAPI):
     def _process_exception(self, e: Exception, artist: Artist) ->int:
         """Process exception 
         """
-        status = '403' in e.message and not artist.query_failed
-        print(e.message)
-        print(Fore.RED + f'With artist {artist.name} there was a exception from getty: {e.message}! {status}' + Style.RESET_ALL)
+        status = '403' in str(e) and not artist.query_failed
+        print(Fore.RED + f'With artist {artist.name} there was a exception from getty: {e}! {status}' + Style.RESET_ALL)
         if status:
-            sleep = 10
-            print(Fore.BLUE + f'Query the api again for  in {sleep}s ...' + Style.RESET_ALL)
-            artist.query_failed = True
-            for i in reversed(range(0, sleep)):
-                print(Fore.MAGENTA + f"{i}s" + Style.RESET_ALL, end="\r", flush=True)
-                sleep(1)
-            return self.query_artist(artist)
+            return self._retry_later(e, artist, 10)
         elif artist.query_failed:
             return 403
         else:
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""This module provides a append-only json lines journal.
+"""
+#    Copyright (C) Christian Steiner 2025  {{{1
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/> 1}}}
+import json
+import os
+import threading
+from typing import Iterator
+
+DEBUG = False 
+
+class Journal:
+    """An append-only journal with one json record per line.
+
+    Every record is flushed (and optionally fsynced) when it is appended,
+    a truncated last line from an interrupted run is removed when the 
+    journal is opened again.
+    """
+    BLOCK_SIZE = 4096
+
+    def __init__(self, path: str, truncate=False, sync=False):
+        self.path = path
+        self.sync = sync
+        self.lock = threading.Lock()
+        if not truncate and os.path.exists(path):
+            self.repair(path)
+        self.file = open(path, 'w' if truncate else 'a', encoding='utf-8')
+
+    @classmethod
+    def repair(cls, path: str):
+        """Truncate the file back to its last complete line
+        """
+        with open(path, 'rb+') as journalFile:
+            end = journalFile.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(0, position - cls.BLOCK_SIZE)
+                journalFile.seek(start)
+                block = journalFile.read(position - start)
+                if position == end and block.endswith(b'\n'):
+                    return
+                newline = block.rfind(b'\n')
+                if newline >= 0:
+                    journalFile.truncate(start + newline + 1)
+                    return
+                position = start
+            journalFile.truncate(0)
+
+    def append(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            if self.sync:
+                os.fsync(self.file.fileno())
+
+    def records(self) ->Iterator[dict]:
+        """Iterate over all complete records
+        """
+        with self.lock:
+            self.file.flush()
+        with open(self.path, encoding='utf-8') as readFile:
+            for line in readFile:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    if DEBUG:
+                        print(f'Skipping broken journal line: {line}')
+
+    def close(self):
+        self.file.close()
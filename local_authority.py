@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""This program can be used to build and query a local artist authority index from Getty ULAN or Wikidata dumps.
+"""
+#    Copyright (C) Christian Steiner 2025  {{{1
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/> 1}}}
+from colorama import Fore, Style
+import getopt
+import gzip
+import json
+import re
+import sqlite3
+import sys
+import threading
+from artist_api import Artist, ArtistAPI
+from name_matcher import normalize
+from zetcom_session import get_mplus_gender
+from typing import Iterator, List
+
+DEBUG = False 
+ULAN = 'ulan'
+WIKIDATA = 'wikidata'
+TRIPLE = re.compile(r'^<([^>]+)>\s+<([^>]+)>\s+(.+?)\s*\.\s*$')
+LITERAL = re.compile(r'^"((?:[^"\\]|\\.)*)"(?:@([\w-]+)|\^\^<[^>]+>)?$')
+ESCAPE = re.compile(r'\\(u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|.)')
+ESCAPE_CHARS = { 't': '\t', 'b': '\b', 'n': '\n', 'r': '\r', 'f': '\f' }
+GVP = 'http://vocab.getty.edu/ontology#'
+ULAN_PREDICATES = { 'http://www.w3.org/2004/02/skos/core#prefLabel': 'label', 'http://www.w3.org/2004/02/skos/core#altLabel': 'altLabel',\
+        'http://www.w3.org/2000/01/rdf-schema#label': 'altLabel', GVP + 'prefLabelGVP': 'term', 'http://www.w3.org/2008/05/skos-xl#literalForm': 'literalForm',\
+        'http://xmlns.com/foaf/0.1/focus': 'focus', GVP + 'biographyPreferred': 'bio', GVP + 'estStart': 'birth', GVP + 'estEnd': 'death',\
+        'http://schema.org/gender': 'gender', 'http://schema.org/birthPlace': 'placeOfBirth', 'http://schema.org/deathPlace': 'placeOfDeath' }
+ULAN_SUBJECT = re.compile(r'^http://vocab\.getty\.edu/ulan/\d+$')
+AAT_GENDER = { 'http://vocab.getty.edu/aat/300189559': 'male', 'http://vocab.getty.edu/aat/300189557': 'female' }
+WIKIDATA_GENDER = { 'Q6581097': 'male', 'Q6581072': 'female', 'Q48270': 'non-binary', 'Q1052281': 'trans woman', 'Q2449503': 'trans man' }
+LANGUAGES = ('en', 'de')
+
+def normalize_key(name: str) ->str:
+    """Return a lookup key for a name: without diacritics, case folded and 'Surname, Forename' reversed
+    """
+    return normalize(name)
+
+def unescape(literal: str) ->str:
+    """Resolve the escape sequences of a N-Triples literal
+    """
+    def replace(m: re.Match) ->str:
+        escape = m.group(1)
+        if escape[0] in 'uU' and len(escape) > 1:
+            return chr(int(escape[1:], 16))
+        return ESCAPE_CHARS.get(escape, escape)
+    return ESCAPE.sub(replace, literal)
+
+def open_dump(path: str):
+    """Open a dump file, gzip compressed or not
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+class AuthorityStore:
+    """A sqlite index of authority records keyed by normalized names.
+    """
+    def __init__(self, path='authority.sqlite'):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS records (uri TEXT PRIMARY KEY, source TEXT, label TEXT, birth TEXT, death TEXT,\
+                gender TEXT, placeOfBirth TEXT, placeOfDeath TEXT)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS names (key TEXT, uri TEXT, PRIMARY KEY (key, uri))')
+        self.connection.commit()
+
+    def add(self, record: dict, names: List[str]):
+        """Add a record with all its names
+        """
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?)', (record['uri'], record['source'], record['label'],\
+                    record.get('birth', ''), record.get('death', ''), record.get('gender', ''), record.get('placeOfBirth', ''), record.get('placeOfDeath', '')))
+            self.connection.executemany('INSERT OR IGNORE INTO names VALUES (?, ?)', [ (normalize_key(name), record['uri']) for name in set(names) if name != '' ])
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+
+    def lookup(self, name: str, source=None) ->List[dict]:
+        """Return all records with name
+        """
+        query = 'SELECT records.* FROM names JOIN records ON names.uri = records.uri WHERE names.key = ?'
+        parameters = [ normalize_key(name) ]
+        if source is not None:
+            query += ' AND records.source = ?'
+            parameters.append(source)
+        with self.lock:
+            cursor = self.connection.execute(query, parameters)
+            columns = [ column[0] for column in cursor.description ]
+            return [ dict(zip(columns, row)) for row in cursor.fetchall() ]
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM records').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+def parse_ntriples(lines) ->Iterator[tuple]:
+    """Yield (subject, predicate, object, is_literal) for the N-Triples lines with relevant predicates
+    """
+    for line in lines:
+        m = TRIPLE.match(line)
+        if m and m.group(2) in ULAN_PREDICATES:
+            obj = m.group(3)
+            literal = LITERAL.match(obj)
+            if literal:
+                if literal.group(2) is None or literal.group(2).split('-')[0] in LANGUAGES:
+                    yield m.group(1), ULAN_PREDICATES[m.group(2)], unescape(literal.group(1)), True
+            elif obj.startswith('<'):
+                yield m.group(1), ULAN_PREDICATES[m.group(2)], obj[1:-1], False
+
+ULAN_PLACE_LABEL = "(SELECT object FROM ulan_values WHERE subject = REPLACE({0}.object, '-place', '') AND predicate = 'label')"
+ULAN_QUERY = """SELECT focus.subject, COALESCE(literalForm.object, label.object, ''), COALESCE(label.object, ''),
+        COALESCE(birth.object, ''), COALESCE(death.object, ''), COALESCE(gender.object, ''),
+        COALESCE(""" + ULAN_PLACE_LABEL.format('placeOfBirth') + """, placeOfBirth.object, ''), COALESCE(""" + ULAN_PLACE_LABEL.format('placeOfDeath') + """, placeOfDeath.object, '')
+    FROM ulan_values AS focus
+    JOIN ulan_values AS bio ON bio.subject = focus.object AND bio.predicate = 'bio'
+    LEFT JOIN ulan_values AS label ON label.subject = focus.subject AND label.predicate = 'label'
+    LEFT JOIN ulan_values AS term ON term.subject = focus.subject AND term.predicate = 'term'
+    LEFT JOIN ulan_values AS literalForm ON literalForm.subject = term.object AND literalForm.predicate = 'literalForm'
+    LEFT JOIN ulan_values AS birth ON birth.subject = bio.object AND birth.predicate = 'birth'
+    LEFT JOIN ulan_values AS death ON death.subject = bio.object AND death.predicate = 'death'
+    LEFT JOIN ulan_values AS gender ON gender.subject = bio.object AND gender.predicate = 'gender'
+    LEFT JOIN ulan_values AS placeOfBirth ON placeOfBirth.subject = bio.object AND placeOfBirth.predicate = 'placeOfBirth'
+    LEFT JOIN ulan_values AS placeOfDeath ON placeOfDeath.subject = bio.object AND placeOfDeath.predicate = 'placeOfDeath'
+    WHERE focus.predicate = 'focus' AND EXISTS (SELECT 1 FROM ulan_values WHERE subject = bio.object)"""
+
+def import_ulan(path: str, store: AuthorityStore, chunk_size=10000) ->int:
+    """Import a Getty ULAN N-Triples dump, return the number of imported records.
+
+    The triples are streamed into temporary staging tables of the store,
+    the first value of each subject and predicate is kept. Birth and death
+    places are stored with the label of their TGN place if the dump contains it.
+    """
+    connection = store.connection
+    with store.lock:
+        connection.execute('CREATE TEMP TABLE ulan_values (subject TEXT, predicate TEXT, object TEXT, PRIMARY KEY (subject, predicate))')
+        connection.execute('CREATE TEMP TABLE ulan_alt_labels (subject TEXT, label TEXT)')
+        with open_dump(path) as dump:
+            values = []
+            alt_labels = []
+            for subject, predicate, obj, is_literal in parse_ntriples(dump):
+                if predicate == 'altLabel':
+                    alt_labels.append((subject, obj))
+                else:
+                    values.append((subject, predicate, obj))
+                if len(values) + len(alt_labels) >= chunk_size:
+                    connection.executemany('INSERT OR IGNORE INTO ulan_values VALUES (?, ?, ?)', values)
+                    connection.executemany('INSERT INTO ulan_alt_labels VALUES (?, ?)', alt_labels)
+                    values = []
+                    alt_labels = []
+            connection.executemany('INSERT OR IGNORE INTO ulan_values VALUES (?, ?, ?)', values)
+            connection.executemany('INSERT INTO ulan_alt_labels VALUES (?, ?)', alt_labels)
+        connection.execute('CREATE INDEX temp.ulan_alt_labels_subject ON ulan_alt_labels (subject)')
+        rows = connection.execute(ULAN_QUERY)
+    counter = 0
+    for subject, label, prefLabel, birth, death, gender, placeOfBirth, placeOfDeath in rows:
+        if not ULAN_SUBJECT.match(subject) or label == '':
+            continue
+        with store.lock:
+            alt_labels = [ row[0] for row in connection.execute('SELECT label FROM ulan_alt_labels WHERE subject = ?', (subject,)) ]
+        record = { 'uri': subject, 'source': ULAN, 'label': label, 'birth': birth, 'death': death,\
+                'gender': AAT_GENDER.get(gender, ''), 'placeOfBirth': placeOfBirth, 'placeOfDeath': placeOfDeath }
+        store.add(record, [ label, prefLabel ] + alt_labels)
+        counter += 1
+        if counter % chunk_size == 0:
+            store.commit()
+    store.commit()
+    with store.lock:
+        connection.execute('DROP TABLE temp.ulan_values')
+        connection.execute('DROP TABLE temp.ulan_alt_labels')
+    return counter
+
+def claim_values(entity: dict, prop: str) ->List:
+    """Return the values of a wikidata claim
+    """
+    values = []
+    for claim in entity.get('claims', {}).get(prop, []):
+        datavalue = claim.get('mainsnak', {}).get('datavalue')
+        if datavalue is not None:
+            value = datavalue['value']
+            values.append(value['id'] if 'id' in value else value.get('time', value))
+    return values
+
+def import_wikidata(path: str, store: AuthorityStore, chunk_size=10000) ->int:
+    """Import a Wikidata JSON dump (one entity per line), return the number of imported humans.
+
+    The labels of entities with coordinates are collected in a temporary 
+    staging table of the store, birth and death places are replaced by these
+    labels after the import.
+    """
+    connection = store.connection
+    with store.lock:
+        connection.execute('CREATE TEMP TABLE wikidata_places (id TEXT PRIMARY KEY, label TEXT)')
+    counter = 0
+    places = []
+    with open_dump(path) as dump:
+        for line in dump:
+            line = line.strip().rstrip(',')
+            if not line.startswith('{'):
+                continue
+            entity = json.loads(line)
+            labels = [ entity['labels'][lang]['value'] for lang in LANGUAGES if lang in entity.get('labels', {}) ]
+            if len(labels) == 0:
+                continue
+            if 'Q5' not in claim_values(entity, 'P31'):
+                if 'P625' in entity.get('claims', {}):
+                    places.append((entity['id'], labels[0]))
+                    if len(places) >= chunk_size:
+                        with store.lock:
+                            connection.executemany('INSERT OR IGNORE INTO wikidata_places VALUES (?, ?)', places)
+                        places = []
+                continue
+            aliases = [ alias['value'] for lang in LANGUAGES for alias in entity.get('aliases', {}).get(lang, []) ]
+            dates = { prop: claim_values(entity, prop) for prop in ('P569', 'P570') }
+            gender = [ WIKIDATA_GENDER.get(value, '') for value in claim_values(entity, 'P21') ]
+            place_ids = { prop: claim_values(entity, prop) for prop in ('P19', 'P20') }
+            record = { 'uri': 'http://www.wikidata.org/entity/' + entity['id'], 'source': WIKIDATA, 'label': labels[0],\
+                    'birth': dates['P569'][0].lstrip('+') if len(dates['P569']) > 0 else '', 'death': dates['P570'][0].lstrip('+') if len(dates['P570']) > 0 else '',\
+                    'gender': gender[0] if len(gender) > 0 else '', 'placeOfBirth': place_ids['P19'][0] if len(place_ids['P19']) > 0 else '',\
+                    'placeOfDeath': place_ids['P20'][0] if len(place_ids['P20']) > 0 else '' }
+            store.add(record, labels + aliases)
+            counter += 1
+            if counter % chunk_size == 0:
+                store.commit()
+    with store.lock:
+        connection.executemany('INSERT OR IGNORE INTO wikidata_places VALUES (?, ?)', places)
+        for field in ('placeOfBirth', 'placeOfDeath'):
+            connection.execute(f'UPDATE records SET {field} = (SELECT label FROM wikidata_places WHERE id = records.{field})\
+                    WHERE source = ? AND {field} IN (SELECT id FROM wikidata_places)', (WIKIDATA,))
+        connection.execute('DROP TABLE temp.wikidata_places')
+    store.commit()
+    return counter
+
+class LocalAuthority(ArtistAPI):
+    """This class can be used to update artists from a local authority index
+    """
+    def __init__(self, path='authority.sqlite', source=None, cache=None, max_workers=4, metrics=None): 
+        super().__init__('sqlite:' + path, cache, rate=1000.0, burst=1000, max_workers=max_workers, metrics=metrics)
+        self.source = source
+        self.store = AuthorityStore(path)
+        if source is not None:
+            self.api_name = f'{self.api_name}_{source}'
+
+    def _create_query(self, artist: Artist) ->str:
+        """Create the query: a json list of names
+        """
+        artist.update()
+        return json.dumps([ artist.name ])
+
+    def _create_batch_query(self, artists: List[Artist]) ->str:
+        return json.dumps(list(dict.fromkeys([ artist.name for artist in artists ])))
+
+    def _query(self, query: str) ->dict:
+        """Look up the names of the query and return a sparql like response
+        """
+        bindings = []
+        for name in json.loads(query):
+            for record in self.store.lookup(name, self.source):
+                binding = { key: { 'value': value } for key, value in record.items() if value != '' }
+                binding['name'] = { 'value': name }
+                bindings.append(binding)
+        return { 'results': { 'bindings': bindings }}
+
+    def _process_response(self, response: dict, artist: Artist):
+        """Process the result, bindings outside the lived before/after window of the artist are ignored
+        """
+        bindings = self._filter_bindings(response["results"]["bindings"], artist)
+        if len(bindings) > 0:
+            artist_data = self.matcher.best(bindings, artist, "label")
+            uri = artist_data["uri"]["value"]
+            label = artist_data["label"]["value"]
+            if artist_data["source"]["value"] == ULAN:
+                artist.ulan = uri
+                if "," in label:
+                    artist.surename = label.split(',')[0]
+                    artist.forename = label.split(',')[1].strip()
+                else:
+                    artist.surename = label
+            else:
+                artist.wikidata = uri
+                if artist.forename == '' and ' ' in label:
+                    artist.forename = ' '.join(label.split(' ')[:-1])
+                    artist.surename = label.split(' ')[-1]
+            if "gender" in artist_data.keys():
+                artist.gender = get_mplus_gender(artist_data["gender"]["value"])
+            for field in ('birth', 'death'):
+                if field in artist_data.keys():
+                    setattr(artist, field, self._parse_date(artist_data[field]["value"]))
+            for field in ('placeOfBirth', 'placeOfDeath'):
+                if field in artist_data.keys() and not artist_data[field]["value"].startswith(('Q', 'http')):
+                    setattr(artist, field, artist_data[field]["value"])
+
+    def _parse_date(self, date_str: str) ->str:
+        """Parses a date and returns it in the format 'dd.mm.yyyy'
+        """
+        date_parts = date_str.split('T')[0].split('-')
+        if len(date_parts) > 2 and date_parts[1:] != ['00', '00']:
+            return f'{date_parts[2]}.{date_parts[1]}.{date_parts[0]}'
+        return date_parts[0]
+
+    def _process_exception(self, e: Exception, artist: Artist) ->int:
+        """Process exception 
+        """
+        print(Fore.RED + f'With artist {artist.name} there was a exception from the local authority: {e}!' + Style.RESET_ALL)
+        return 1
+
+def usage():
+    """prints information on how to use the script
+    """
+    print(main.__doc__)
+
+def main(argv):
+    """This program can be used to import Getty ULAN or Wikidata dumps into a local authority index.
+
+    local_authority.py [OPTIONS] 
+
+        OPTIONS:
+        -h|--help                      show help
+        -d|--database                  sqlite index file (default: authority.sqlite)
+        -l|--lookup                    look up a name in the index
+        -u|--ulan                      import a ULAN N-Triples dump (.nt or .nt.gz)
+        -w|--wikidata                  import a Wikidata JSON dump (.json or .json.gz)
+    
+        :return: exit code (int)
+    """
+    database = 'authority.sqlite'
+    ulan_file = ''
+    wikidata_file = ''
+    name = ''
+    try:
+        opts, args = getopt.getopt(argv, "hd:l:u:w:", ["help", "database=", "lookup=", "ulan=", "wikidata="])
+    except getopt.GetoptError:
+        usage()
+        return 2
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            usage()
+            return 0
+        elif opt in ('-d', '--database'):
+            database = arg
+        elif opt in ('-l', '--lookup'):
+            name = arg
+        elif opt in ('-u', '--ulan'):
+            ulan_file = arg
+        elif opt in ('-w', '--wikidata'):
+            wikidata_file = arg
+    if ulan_file == '' and wikidata_file == '' and name == '':
+        usage()
+        return 0
+    store = AuthorityStore(database)
+    if ulan_file != '':
+        print(Fore.MAGENTA + f'Imported {import_ulan(ulan_file, store)} artists from {ulan_file}' + Style.RESET_ALL)
+    if wikidata_file != '':
+        print(Fore.MAGENTA + f'Imported {import_wikidata(wikidata_file, store)} artists from {wikidata_file}' + Style.RESET_ALL)
+    if name != '':
+        for record in store.lookup(name):
+            print(record)
+    store.close()
+    return 0 
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
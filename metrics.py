@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""This module provides a small metrics registry for counters and latency histograms.
+"""
+#    Copyright (C) Christian Steiner 2025  {{{1
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/> 1}}}
+from bisect import bisect_left
+from contextlib import contextmanager
+import json
+import re
+import threading
+import time
+import urllib.parse
+from typing import Callable, Dict, List
+
+DEBUG = False
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+IDENTIFIER = re.compile(r'/(\d+|[0-9a-f]{32}|[0-9a-f-]{36})(?=/|$)')
+
+def endpoint(url: str) ->str:
+    """Return the path of url with ids and session keys replaced by {id}
+    """
+    return IDENTIFIER.sub('/{id}', urllib.parse.urlsplit(url).path)
+
+class Histogram:
+    """A latency histogram with fixed bucket bounds in seconds.
+    """
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) ->float:
+        """Return the upper bound of the bucket that contains quantile q
+        """
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count > 0:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+        return 0.0
+
+class MetricsRegistry:
+    """Counters and latency histograms keyed by name and labels.
+
+    Listeners are called with (kind, name, value, labels) for every recorded value.
+    At close() a summary is printed if verbose is set and the metrics are
+    exported to path: a .json file or a Prometheus text file otherwise.
+    """
+    def __init__(self, path='', verbose=False, buckets=BUCKETS):
+        self.path = path
+        self.verbose = verbose
+        self.buckets = buckets
+        self.counters: Dict[tuple, float] = {}
+        self.histograms: Dict[tuple, Histogram] = {}
+        self.listeners: List[Callable] = []
+        self.lock = threading.Lock()
+
+    @classmethod
+    def key(cls, name: str, labels: dict) ->tuple:
+        return (name, tuple(sorted(labels.items())))
+
+    def add_listener(self, listener: Callable):
+        """Add a callback listener(kind, name, value, labels)
+        """
+        self.listeners.append(listener)
+
+    def _notify(self, kind: str, name: str, value: float, labels: dict):
+        for listener in self.listeners:
+            listener(kind, name, value, labels)
+
+    def inc(self, name: str, value=1, **labels):
+        """Increment a counter
+        """
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self._notify('counter', name, value, labels)
+
+    def observe(self, name: str, seconds: float, **labels):
+        """Record a latency
+        """
+        key = self.key(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(self.buckets)
+            self.histograms[key].observe(seconds)
+        self._notify('histogram', name, seconds, labels)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Record the latency of a with block
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter(self, name: str, **labels) ->float:
+        return self.counters.get(self.key(name, labels), 0)
+
+    def histogram(self, name: str, **labels) ->Histogram:
+        return self.histograms.get(self.key(name, labels))
+
+    def asdict(self) ->dict:
+        with self.lock:
+            counters = [ { 'name': name, 'labels': dict(labels), 'value': value } for (name, labels), value in sorted(self.counters.items()) ]
+            histograms = [ { 'name': name, 'labels': dict(labels), 'count': histogram.count, 'sum': histogram.sum,\
+                    'p50': histogram.quantile(0.5), 'p95': histogram.quantile(0.95),\
+                    'buckets': dict(zip([ str(bound) for bound in histogram.buckets ] + ['+Inf'], histogram.counts)) }\
+                    for (name, labels), histogram in sorted(self.histograms.items()) ]
+        return { 'counters': counters, 'histograms': histograms }
+
+    @classmethod
+    def _labels(cls, labels: tuple, extra=()) ->str:
+        items = list(labels) + list(extra)
+        if len(items) == 0:
+            return ''
+        return '{' + ','.join([ '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in items ]) + '}'
+
+    def to_prometheus(self) ->str:
+        """Return the metrics in the Prometheus text exposition format
+        """
+        lines = []
+        typed = set()
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {name} counter')
+                    typed.add(name)
+                lines.append(f'{name}{self._labels(labels)} {value}')
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {name} histogram')
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip([ str(bound) for bound in histogram.buckets ] + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{self._labels(labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{name}_sum{self._labels(labels)} {histogram.sum}')
+                lines.append(f'{name}_count{self._labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) ->str:
+        """Return a human readable summary
+        """
+        lines = []
+        with self.lock:
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                lines.append(f'{name}{self._labels(labels)}: {histogram.count} calls, {histogram.sum:.3f}s total, p50 <= {histogram.quantile(0.5)}s, p95 <= {histogram.quantile(0.95)}s')
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f'{name}{self._labels(labels)}: {value}')
+        return '\n'.join(lines)
+
+    def export(self, path: str):
+        """Write the metrics to a json or Prometheus text file
+        """
+        with open(path, 'w') as metrics_file:
+            if path.endswith('.json'):
+                json.dump(self.asdict(), metrics_file, indent=2)
+            else:
+                metrics_file.write(self.to_prometheus())
+
+    def close(self):
+        if self.verbose:
+            print(self.summary())
+        if self.path != '':
+            self.export(self.path)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""This module provides fuzzy matching of artist names.
+"""
+#    Copyright (C) Christian Steiner 2025  {{{1
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/> 1}}}
+from functools import lru_cache
+import re
+import unicodedata
+from typing import List
+
+DEBUG = False 
+PUNCTUATION = re.compile(r"[^\w\s]")
+
+@lru_cache(maxsize=65536)
+def normalize(name: str) ->str:
+    """Return a name without diacritics and punctuation, case folded and in 'Forename Surname' order
+    """
+    if ',' in name:
+        surname, forename = name.split(',', 1)
+        name = forename + ' ' + surname
+    name = ''.join([ c for c in unicodedata.normalize('NFKD', name) if not unicodedata.combining(c) ])
+    return ' '.join(PUNCTUATION.sub(' ', name.casefold()).split())
+
+def trigrams(name: str) ->frozenset:
+    padded = f'  {name} '
+    return frozenset([ padded[i:i+3] for i in range(len(padded) - 2) ])
+
+def jaccard(a: frozenset, b: frozenset) ->float:
+    if len(a) == 0 and len(b) == 0:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+def year(date_str: str) ->int:
+    """Return the year of a date string like '1870', '1870-05-01T00:00:00Z' or '01.05.1870'
+    """
+    date_str = date_str.split('T')[0]
+    if '.' in date_str:
+        return int(date_str.split('.')[-1])
+    sign = -1 if date_str.startswith('-') else 1
+    return sign * int(date_str.lstrip('+-').split('-')[0])
+
+class NameMatcher:
+    """This class scores candidate labels against artist names.
+
+    The features of the most recently used names are kept in a bounded
+    cache of the matcher, so one matcher can be shared by all apis of a batch.
+    """
+    LIVED_WEIGHT = 0.2
+    MAX_ENTRIES = 65536
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.features = lru_cache(maxsize=max_entries)(self._features)
+
+    def _features(self, name: str) ->tuple:
+        """Return the normalized name, its tokens and trigrams
+        """
+        normalized = normalize(name)
+        return (normalized, frozenset(normalized.split()), trigrams(normalized))
+
+    def similarity(self, label: str, name: str) ->float:
+        """Return the similarity of two names between 0 and 1
+        """
+        label_features = self.features(label)
+        name_features = self.features(name)
+        if label_features[0] == name_features[0]:
+            return 1.0
+        return (jaccard(label_features[1], name_features[1]) + jaccard(label_features[2], name_features[2])) / 2
+
+    def lived_score(self, birth: str, death: str, livedBefore: str, livedAfter: str) ->float:
+        """Return a bonus if birth and death fit the lived before/after window, a malus if not
+        """
+        if livedBefore == '' or birth == '' or death == '':
+            return 0.0
+        try:
+            fits = year(birth) < int(livedBefore) and year(death) >= int(livedAfter)
+        except ValueError:
+            return 0.0
+        return self.LIVED_WEIGHT if fits else -self.LIVED_WEIGHT
+
+    def score(self, label: str, name: str, birth='', death='', livedBefore='', livedAfter='') ->float:
+        return self.similarity(label, name) + self.lived_score(birth, death, livedBefore, livedAfter)
+
+    def best(self, bindings: List[dict], artist, label_key: str) ->dict:
+        """Return the sparql binding whose label matches the artist best, the first one on ties
+        """
+        if len(bindings) == 1:
+            return bindings[0]
+        def value(binding: dict, key: str) ->str:
+            return binding[key]["value"] if key in binding.keys() else ''
+        scores = [ self.score(value(binding, label_key), artist.name, value(binding, 'birth'), value(binding, 'death'), artist.livedBefore, artist.livedAfter)\
+                for binding in bindings ]
+        return bindings[scores.index(max(scores))]
+
+MATCHER = NameMatcher()
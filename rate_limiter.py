@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""This module provides a token bucket rate limiter for api endpoints.
+"""
+#    Copyright (C) Christian Steiner 2025  {{{1
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/> 1}}}
+import threading
+import time
+
+DEBUG = False 
+
+class TokenBucket:
+    """A thread safe token bucket.
+
+    Tokens are refilled with rate tokens per second up to burst tokens,
+    acquire blocks until a token is available.
+    """
+    def __init__(self, rate: float, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) ->float:
+        """Take a token, wait if necessary and return the seconds waited
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+            waited += wait
+
+    def configure(self, rate: float, burst=1):
+        """Change rate and burst, the tokens are capped at the new burst
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+            self.burst = burst
+            self.tokens = min(self.tokens, burst)
+
+    def penalize(self, seconds: float):
+        """Block all requests for seconds, e.g. from a Retry-After header
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            self.tokens = 0
+            self.updated = now
+
+    def __str__(self):
+        return f'{self.rate} req/s, burst {self.burst}'
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(endpoint: str, rate: float, burst=1) ->TokenBucket:
+    """Return the shared rate limiter of an endpoint, the latest rate and burst apply
+    """
+    with _limiters_lock:
+        if endpoint not in _limiters:
+            _limiters[endpoint] = TokenBucket(rate, burst)
+        elif (_limiters[endpoint].rate, _limiters[endpoint].burst) != (rate, burst):
+            _limiters[endpoint].configure(rate, burst)
+        return _limiters[endpoint]
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""This program provides a local stand-in for the M+ ria application that can be used for load and regression tests.
+"""
+#    Copyright (C) Christian Steiner 2025  {{{1
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/> 1}}}
+import base64
+import copy
+import getopt
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+from xml.etree import ElementTree as ET
+from typing import List
+
+DEBUG = False 
+PREFIX = '/ria-ws/application'
+SESSION_NS = 'http://www.zetcom.com/ria/ws/session'
+MODULE_NS = 'http://www.zetcom.com/ria/ws/module'
+VOCABULARY_NS = 'http://www.zetcom.com/ria/ws/vocabulary'
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_files', 'ria_fixture.json')
+
+def local_name(tag: str) ->str:
+    return tag.split('}')[-1]
+
+def tostring(element: ET.Element, namespace: str) ->bytes:
+    """Serialize element with namespace as default namespace
+    """
+    element.set('xmlns', namespace)
+    return ET.tostring(element, encoding='UTF-8', xml_declaration=True)
+
+class RiaEmulator:
+    """A local ria server with a fixture dataset and configurable latency, errors and throttling.
+    """
+    ROUTES = [ ('GET', re.compile(r'^/session/?$'), 'open_session'),\
+            ('DELETE', re.compile(r'^/session/(?P<key>[^/]+)$'), 'close_session'),\
+            ('POST', re.compile(r'^/module/(?P<module>\w+)/search/?$'), 'search'),\
+            ('GET', re.compile(r'^/module/(?P<module>\w+)/(?P<item_id>\w+)/export/(?P<export_id>\w+)$'), 'export'),\
+            ('GET', re.compile(r'^/vocabulary/instances/(?P<vocabulary>\w+)/nodes/search/?$'), 'nodes'),\
+            ('PUT', re.compile(r'^/vocabulary/instances/(?P<vocabulary>\w+)/nodes/(?P<node_id>\w+)$'), 'update_node'),\
+            ('PUT', re.compile(r'^/vocabulary/instances/(?P<vocabulary>\w+)/nodes/(?P<node_id>\w+)/terms/(?P<term_id>\w+)$'), 'update_term') ]
+
+    def __init__(self, fixture=FIXTURE, latency=0.0, error_rate=0.0, throttle_rate=0.0, retry_after=1, password=None, seed=None):
+        if isinstance(fixture, dict):
+            self.data = copy.deepcopy(fixture)
+        else:
+            with open(fixture, encoding='utf-8') as fixture_file:
+                self.data = json.load(fixture_file)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.password = password
+        self.random = random.Random(seed)
+        self.sessions = set()
+        self.counts = {}
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self) ->str:
+        host, port = self.server.server_address[0:2]
+        return f'http://{host}:{port}'
+
+    def start(self, host='127.0.0.1', port=0) ->str:
+        """Start the server in a background thread and return its url
+        """
+        self.server = ThreadingHTTPServer((host, port), RiaRequestHandler)
+        self.server.daemon_threads = True
+        self.server.emulator = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, method: str, path: str, headers, body: bytes) ->tuple:
+        """Return (status, content type, body, headers) for a request
+        """
+        url = urllib.parse.urlsplit(path)
+        if not url.path.startswith(PREFIX):
+            return 404, 'text/plain', b'Not found', {}
+        route_path = url.path[len(PREFIX):]
+        for route_method, pattern, handler in self.ROUTES:
+            m = pattern.match(route_path)
+            if route_method == method and m:
+                with self.lock:
+                    self.counts[handler] = self.counts.get(handler, 0) + 1
+                    injected = self.random.random()
+                if self.latency > 0:
+                    time.sleep(self.latency)
+                if injected < self.throttle_rate:
+                    return 429, 'text/plain', b'Too Many Requests', { 'Retry-After': str(self.retry_after) }
+                if injected < self.throttle_rate + self.error_rate:
+                    return 500, 'text/plain', b'Internal Server Error', {}
+                if handler != 'open_session' and not self._authorized(headers):
+                    return 401, 'text/plain', b'Unauthorized', {}
+                query = dict(urllib.parse.parse_qsl(url.query))
+                return getattr(self, handler)(body=body, query=query, headers=headers, **m.groupdict())
+        return 404, 'text/plain', b'Not found', {}
+
+    def _credentials(self, headers) ->tuple:
+        authorization = headers.get('Authorization', '')
+        if not authorization.startswith('Basic '):
+            return None, None
+        user, _, secret = base64.b64decode(authorization[6:]).decode('utf-8').partition(':')
+        return user, secret
+
+    def _authorized(self, headers) ->bool:
+        user, secret = self._credentials(headers)
+        if secret is None:
+            return False
+        if secret.startswith('session['):
+            return secret[8:-1] in self.sessions
+        return self.password is None or secret == f'password[{self.password}]'
+
+    def open_session(self, headers, **kwargs) ->tuple:
+        if not self._authorized(headers):
+            return 401, 'text/plain', b'Unauthorized', {}
+        key = uuid.uuid4().hex
+        self.sessions.add(key)
+        root = ET.Element('application')
+        session = ET.SubElement(root, 'session')
+        ET.SubElement(session, 'key').text = key
+        return 200, 'application/xml', tostring(root, SESSION_NS), {}
+
+    def close_session(self, key: str, **kwargs) ->tuple:
+        self.sessions.discard(key)
+        return 200, 'text/plain', b'', {}
+
+    def _matches(self, condition: ET.Element, item: dict) ->bool:
+        """Evaluate an expert search condition for item
+        """
+        tag = local_name(condition.tag)
+        children = list(condition)
+        if tag in ('expert', 'and'):
+            return all([ self._matches(child, item) for child in children ])
+        if tag == 'or':
+            return any([ self._matches(child, item) for child in children ])
+        if tag == 'not':
+            return not any([ self._matches(child, item) for child in children ])
+        value = str(item.get(condition.get('fieldPath'), '')).casefold()
+        operand = condition.get('operand', '').casefold()
+        if tag == 'equalsField':
+            return value == operand
+        if tag == 'notEqualsField':
+            return value != operand
+        if tag == 'startsWithField':
+            return value.startswith(operand)
+        if tag == 'startsNotWithField':
+            return not value.startswith(operand)
+        if tag == 'contains':
+            return operand in value
+        if tag in ('greaterField', 'lessField'):
+            if value.isdigit() and operand.isdigit():
+                value, operand = int(value), int(operand)
+            return value > operand if tag == 'greaterField' else value < operand
+        raise ValueError(f'Unsupported search condition {tag}')
+
+    def search(self, module: str, body: bytes, **kwargs) ->tuple:
+        items = self.data['modules'].get(module, [])
+        search = ET.fromstring(body).find('.//{*}search')
+        expert = search.find('{*}expert')
+        fulltext = search.find('{*}fulltext')
+        if expert is not None:
+            items = [ item for item in items if self._matches(expert, item) ]
+        elif fulltext is not None and fulltext.text is not None:
+            words = fulltext.text.casefold().split()
+            items = [ item for item in items if all([ word in ' '.join([ str(value) for value in item.values() ]).casefold() for word in words ]) ]
+        select = [ field.get('fieldPath') for field in search.findall('{*}select/{*}field') ]
+        offset = int(search.get('offset', 0))
+        limit = int(search.get('limit', 100))
+        root = ET.Element('application')
+        modules = ET.SubElement(root, 'modules')
+        module_element = ET.SubElement(modules, 'module', { 'name': module, 'totalSize': str(len(items)) })
+        for item in items[offset:offset+limit]:
+            item_element = ET.SubElement(module_element, 'moduleItem', { 'id': item['__id'] })
+            for field, value in item.items():
+                if len(select) > 0 and field not in select:
+                    continue
+                if field.startswith('__'):
+                    ET.SubElement(ET.SubElement(item_element, 'systemField', { 'name': field }), 'value').text = value
+                elif field.endswith('Voc'):
+                    reference = ET.SubElement(item_element, 'vocabularyReference', { 'name': field })
+                    ET.SubElement(reference, 'vocabularyReferenceItem', { 'id': value })
+                else:
+                    ET.SubElement(ET.SubElement(item_element, 'dataField', { 'name': field }), 'value').text = value
+        return 200, 'application/xml', tostring(root, MODULE_NS), {}
+
+    def export(self, module: str, item_id: str, export_id: str, **kwargs) ->tuple:
+        key = f'{module}/{item_id}/{export_id}'
+        if key in self.data.get('exports', {}):
+            return 200, 'application/json', json.dumps(self.data['exports'][key]).encode('utf-8'), {}
+        items = [ item for item in self.data['modules'].get(module, []) if item['__id'] == item_id.lstrip('0') ]
+        if len(items) == 0:
+            return 404, 'text/plain', b'Not found', {}
+        return 200, 'application/json', json.dumps(items).encode('utf-8'), {}
+
+    def _node_element(self, parent, node: dict) ->ET.Element:
+        attrib = { 'id': node['id'], 'logicalName': node['logicalName'] }
+        element = ET.SubElement(parent, 'node', attrib) if parent is not None else ET.Element('node', attrib)
+        terms = ET.SubElement(element, 'terms')
+        for term in node['terms']:
+            ET.SubElement(ET.SubElement(terms, 'term', { 'id': term['id'] }), 'content').text = term['content']
+        return element
+
+    def nodes(self, vocabulary: str, query: dict, **kwargs) ->tuple:
+        nodes = [ node for node in self.data['vocabularies'].get(vocabulary, []) if query.get('nodeName', '').casefold() in node['logicalName'].casefold() ]
+        offset = int(query.get('offset', 0))
+        limit = int(query.get('limit', len(nodes)))
+        root = ET.Element('collection', { 'size': str(len(nodes)) })
+        for node in nodes[offset:offset+limit]:
+            self._node_element(root, node)
+        return 200, 'application/xml', tostring(root, VOCABULARY_NS), {}
+
+    def _find_node(self, vocabulary: str, node_id: str) ->dict:
+        nodes = [ node for node in self.data['vocabularies'].get(vocabulary, []) if node['id'] == node_id ]
+        return nodes[0] if len(nodes) > 0 else None
+
+    def update_node(self, vocabulary: str, node_id: str, body: bytes, **kwargs) ->tuple:
+        node = self._find_node(vocabulary, node_id)
+        if node is None:
+            return 404, 'text/plain', b'Not found', {}
+        with self.lock:
+            node['logicalName'] = ET.fromstring(body).get('logicalName', node['logicalName'])
+        return 200, 'application/xml', tostring(self._node_element(None, node), VOCABULARY_NS), {}
+
+    def update_term(self, vocabulary: str, node_id: str, term_id: str, body: bytes, **kwargs) ->tuple:
+        node = self._find_node(vocabulary, node_id)
+        terms = [ term for term in node['terms'] if term['id'] == term_id ] if node is not None else []
+        if len(terms) == 0:
+            return 404, 'text/plain', b'Not found', {}
+        content = ET.fromstring(body).find('{*}content')
+        with self.lock:
+            terms[0]['content'] = content.text if content is not None else terms[0]['content']
+        element = ET.Element('term', { 'id': term_id })
+        ET.SubElement(element, 'content').text = terms[0]['content']
+        return 200, 'application/xml', tostring(element, VOCABULARY_NS), {}
+
+class RiaRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length) if length > 0 else b''
+        status, content_type, content, headers = self.server.emulator.handle(self.command, self.path, self.headers, body)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = _handle
+    do_POST = _handle
+    do_PUT = _handle
+    do_DELETE = _handle
+
+    def log_message(self, format, *args):
+        if DEBUG:
+            super().log_message(format, *args)
+
+def usage():
+    """prints information on how to use the script
+    """
+    print(main.__doc__)
+
+def main(argv):
+    """This program runs a local stand-in for the M+ ria application.
+
+    ria_emulator.py [OPTIONS] 
+
+        OPTIONS:
+        -h|--help                      show help
+        -e|--error-rate                fraction of requests that fail with 500
+        -f|--fixture                   json fixture file (default: test_files/ria_fixture.json)
+        -l|--latency                   latency per request in seconds
+        -p|--port                      port (default: 8080)
+        -t|--throttle-rate             fraction of requests that fail with 429
+    
+        :return: exit code (int)
+    """
+    fixture = FIXTURE
+    port = 8080
+    latency = 0.0
+    error_rate = 0.0
+    throttle_rate = 0.0
+    try:
+        opts, args = getopt.getopt(argv, "he:f:l:p:t:", ["help", "error-rate=", "fixture=", "latency=", "port=", "throttle-rate="])
+    except getopt.GetoptError:
+        usage()
+        return 2
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            usage()
+            return 0
+        elif opt in ('-e', '--error-rate'):
+            error_rate = float(arg)
+        elif opt in ('-f', '--fixture'):
+            fixture = arg
+        elif opt in ('-l', '--latency'):
+            latency = float(arg)
+        elif opt in ('-p', '--port'):
+            port = int(arg)
+        elif opt in ('-t', '--throttle-rate'):
+            throttle_rate = float(arg)
+    emulator = RiaEmulator(fixture, latency, error_rate, throttle_rate)
+    print(f'Ria emulator running on {emulator.start(port=port)}' + PREFIX)
+    try:
+        emulator.thread.join()
+    except KeyboardInterrupt:
+        emulator.stop()
+    return 0 
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,34 @@
+import unittest
+import os
+import tempfile
+from address_index import AddressIndex, matches
+
+RECORDS = [ { '__id': '11099', 'AdrOrganisationTxt': 'Kunstmuseum Basel', 'AdrPersonTypeVoc': { '30001' } },\
+        { '__id': '19964', 'AdrOrganisationTxt': 'Kunstmuseum Basel', 'AdrForeNameTxt': 'Christian', 'AdrSurNameTxt': 'Selz', 'AdrPersonTypeVoc': { '30002' } } ]
+
+
+class TestAddressIndex(unittest.TestCase):
+    def test_matches(self):
+        self.assertTrue(matches(RECORDS[0], (('AdrOrganisationTxt', 'kunstmuseum basel '), ('AdrPersonTypeVoc', '30001'))))
+        self.assertFalse(matches(RECORDS[1], (('AdrOrganisationTxt', 'Kunstmuseum Basel'), ('AdrPersonTypeVoc', '30001'))))
+
+    def test_lookup(self):
+        index = AddressIndex(RECORDS, 'http://localhost')
+        self.assertEqual(index.lookup((('AdrOrganisationTxt', 'Kunstmuseum Basel'), ('AdrPersonTypeVoc', '30001'))), '11099')
+        self.assertEqual(index.lookup((('AdrOrganisationTxt', 'Kunstmuseum Basel'), ('AdrForeNameTxt', 'Christian'), ('AdrSurNameTxt', 'SELZ'))), '19964')
+        self.assertEqual(index.lookup((('AdrOrganisationTxt', 'Kunstmuseum Basel'), ('AdrForeNameTxt', ''), ('AdrSurNameTxt', ''))), '11099')
+        self.assertEqual(index.lookup((('AdrOrganisationTxt', 'Kunsthalle Basel'), ('AdrPersonTypeVoc', '30001'))), None)
+        self.assertEqual(index.lookup((('AdrSurNameTxt', 'Selz'),)), '19964')
+
+    def test_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'addresses.json')
+            AddressIndex(RECORDS, 'http://localhost', created=1000).save(path)
+            index = AddressIndex.load(path)
+            self.assertEqual(len(index), 2)
+            self.assertEqual(index.server, 'http://localhost')
+            self.assertTrue(index.expired(AddressIndex.DAY))
+            self.assertEqual(index.lookup((('AdrOrganisationTxt', 'Kunstmuseum Basel'), ('AdrPersonTypeVoc', '30001'))), '11099')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,7 +5,8 @@ import lxml.etree as ET
 import sys
 import zetcom_session
 from zetcom_session import SchemaItem
-from artist_api import Artist
+from artist_api import Artist, ArtistRegistry
+from ria_emulator import RiaEmulator
 from typing import List
 
 
@@ -18,6 +19,33 @@ class TestArtistApi(unittest.TestCase):
         self.assertTrue(artist.id is not None)
         zsession.close()
         
+    def test_artist_update_ids(self):
+        zsession = zetcom_session.ZetcomSession()
+        zsession.open()
+        artists = [ Artist('Augusta Roszmann', zsession, False), Artist('Unknown Test Artist', zsession, False) ]
+        Artist.update_ids(artists, zsession)
+        self.assertTrue(artists[0].id is not None)
+        self.assertTrue(artists[1].id is None)
+        zsession.close()
+
+    def test_artist_update_ids_fulltext(self):
+        with RiaEmulator() as emulator:
+            emulator.data['modules']['Person'] = [ { '__id': '7001', 'PerNennformTxt': 'Kupffer, Elisàr von (1872-1942)' } ]
+            zsession = zetcom_session.ZetcomSession(server=emulator.url, password='test')
+            zsession.open()
+            artists = [ Artist('Elisàr von Kupffer', zsession, False), Artist('Unknown Test Artist', zsession, False) ]
+            Artist.update_ids(artists, zsession, fallback=False)
+            self.assertTrue(artists[0].id is None)
+            Artist.update_ids(artists, zsession)
+            self.assertEqual(artists[0].id, '7001')
+            self.assertTrue(artists[1].id is None)
+            self.assertEqual(emulator.counts['search'], 3)
+            zsession.close()
+
+    def test_normalize_name(self):
+        self.assertEqual(Artist.normalize_name('Kupffer, Elisàr von'), 'elisàr von kupffer')
+        self.assertEqual(Artist.name_variants('Elisàr von Kupffer'), ['Elisàr von Kupffer', 'Kupffer, Elisàr von'])
+
     def test_artist_add_date(self):
         zsession = zetcom_session.ZetcomSession()
         zsession.open()
@@ -33,6 +61,17 @@ class TestArtistApi(unittest.TestCase):
         self.assertEqual(artist.livedAfter, '1939')
         zsession.close()
 
+    def test_artist_registry(self):
+        registry = ArtistRegistry([ Artist('Test B', None, False), Artist('Test A', None, False) ])
+        self.assertFalse(registry.add(Artist('"Test B"', None, False)))
+        self.assertTrue('Test A' in registry)
+        self.assertEqual(len(registry), 2)
+        self.assertEqual([ artist.name for artist in registry ], ['Test B', 'Test A'])
+        self.assertEqual([ artist.name for artist in registry.sorted() ], ['Test A', 'Test B'])
+        artist = Artist('Test B (1900)', None, False)
+        self.assertTrue(registry.add(artist, replace=True))
+        self.assertTrue(registry.get('Test B') is artist)
+
     def test_artist_epoche(self):
         artist = Artist('Test Test', None, False)
         artist.birth = '01.12.1888'
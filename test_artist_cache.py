@@ -0,0 +1,62 @@
+import unittest
+import os
+import tempfile
+import time
+from artist_cache import ArtistCache
+
+
+class TestArtistCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'cache.sqlite')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_key(self):
+        self.assertEqual(ArtistCache.key('Getty', ' Elisàr  von Kupffer', '1923', '1939'), 'Getty|Elisàr von Kupffer|1923|1939')
+
+    def test_get_set(self):
+        cache = ArtistCache(self.path)
+        self.assertTrue(cache.get('a') is None)
+        cache.set('a', { 'results': { 'bindings': [] }})
+        self.assertEqual(cache.get('a'), { 'results': { 'bindings': [] }})
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+        cache.close()
+        cache = ArtistCache(self.path)
+        self.assertTrue(cache.get('a') is not None)
+        cache.close()
+
+    def test_eviction(self):
+        cache = ArtistCache(self.path, max_entries=2)
+        cache.set('a', {})
+        time.sleep(0.01)
+        cache.set('b', {})
+        time.sleep(0.01)
+        cache.get('a')
+        cache.set('c', {})
+        self.assertEqual(len(cache), 2)
+        self.assertTrue(cache.get('b') is None)
+        cache.ttl = 0
+        self.assertTrue(cache.get('a') is None)
+        cache.close()
+
+    def test_negative_ttl(self):
+        cache = ArtistCache(self.path, negative_ttl=0)
+        cache.set('a', { 'results': { 'bindings': [] }})
+        cache.set('b', { 'results': { 'bindings': [ { 'name': { 'value': 'b' }} ] }})
+        time.sleep(0.01)
+        self.assertTrue(cache.get('a') is None)
+        self.assertTrue(cache.get('b') is not None)
+        cache.close()
+
+    def test_bypass(self):
+        cache = ArtistCache(self.path, bypass=True)
+        cache.set('a', {})
+        self.assertTrue(cache.get('a') is None)
+        self.assertEqual(len(cache), 0)
+        cache.close()
+
+if __name__ == "__main__":
+    unittest.main()
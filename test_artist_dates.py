@@ -0,0 +1,15 @@
+import unittest
+from artist_dates import parse_date
+
+
+class TestArtistDates(unittest.TestCase):
+    def test_parse_date(self):
+        self.assertEqual(parse_date('c. 1923-1939'), ('1923', '1939'))
+        self.assertEqual(parse_date('1908'), ('1908',))
+        self.assertEqual(parse_date('Not dated'), ())
+        self.assertEqual(parse_date('early 20th century'), ('1925',))
+        self.assertEqual(parse_date('late 19th century'), ('1875',))
+        self.assertEqual(parse_date('20th century'), ('1950',))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+from pathlib import Path
+import benchmark
+from mediastandard_validation import MediaStandard
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_percentile(self):
+        values = [ float(i) for i in range(1, 101) ]
+        self.assertEqual(benchmark.percentile(values, 50), 50.0)
+        self.assertEqual(benchmark.percentile(values, 95), 95.0)
+        self.assertEqual(benchmark.percentile([], 95), 0.0)
+
+    def test_measurement(self):
+        measurement = benchmark.Measurement('test', 3)
+        square = measurement.timed(lambda x: x*x)
+        with measurement:
+            self.assertEqual(sum([ square(i) for i in range(3) ]), 5)
+        result = measurement.asdict()
+        self.assertEqual(result['requests'], 3)
+        self.assertTrue(result['rows_per_s'] > 0)
+        self.assertTrue(result['process_peak_rss_kb'] > 0)
+
+    def test_generators(self):
+        self.assertEqual(benchmark.generate_artists(10), benchmark.generate_artists(10))
+        self.assertEqual(len(set([ row['Institution'] for row in benchmark.generate_addresses(50) ])), 50)
+        data, objects = benchmark.generate_exhibits(100, 'http://localhost')
+        self.assertEqual(len(data['exhibits']), 100)
+        self.assertTrue(all([ '/missing_' not in row['Picturepark IIIF URL'] for row in objects ]))
+
+    def test_address_parser(self):
+        self.assertEqual(benchmark.bench_address_parser(100)['requests'], 100)
+
+    def test_mediastandard(self):
+        checker = MediaStandard()
+        checker.load(benchmark.MEDIASTANDARD)
+        results = [ checker.check_filename(Path(filename)).check_passed for filename in benchmark.generate_filenames(200) ]
+        self.assertTrue(0 < results.count(False) < 100)
+        self.assertEqual(benchmark.bench_mediastandard(200)['requests'], 200)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -21,6 +21,15 @@ class TestGetty(unittest.TestCase):
         self.assertEqual(artist.death, '1942')
         row = artist.asrow([ SchemaItem('forename', 'forename'), SchemaItem('surename','surename')])
         self.assertEqual(row['forename'], 'Elisar von')
+    def test_batch_query(self):
+        artists = [ Artist('Elisàr von Kupffer', None, False), Artist('Augusta Roszmann', None, False) ]
+        artists[0].addDate('1923-1939')
+        getty = Getty()
+        query = getty._create_batch_query(artists)
+        self.assertTrue('"Elisàr von Kupffer" "Augusta Roszmann"' in query)
+        getty.query_artists(artists)
+        self.assertEqual(artists[0].surename, 'Kupffer')
+        self.assertEqual(artists[0].death, '1942')
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+import os
+import tempfile
+from journal import Journal
+
+
+class TestJournal(unittest.TestCase):
+    def test_append_records(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'journal.jsonl')
+            journal = Journal(path)
+            journal.append({ 'key': 'Elisàr von Kupffer', 'id': None })
+            journal.append({ 'key': 'Augusta Roszmann', 'id': '1' })
+            journal.close()
+            with open(path, 'a') as f:
+                f.write('{"key": "broken')
+            journal = Journal(path)
+            journal.append({ 'key': 'Augusta Kupffer', 'id': '2' })
+            self.assertEqual([ record['key'] for record in journal.records() ], ['Elisàr von Kupffer', 'Augusta Roszmann', 'Augusta Kupffer'])
+            journal.close()
+            journal = Journal(path, truncate=True)
+            self.assertEqual(len(list(journal.records())), 0)
+            journal.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import json
+import os
+import tempfile
+from artist_api import Artist
+from zetcom_artist_update import ZetcomArtistUpdate
+from local_authority import AuthorityStore, LocalAuthority, import_ulan, import_wikidata, normalize_key, ULAN, WIKIDATA
+
+ULAN_DUMP = """<http://vocab.getty.edu/ulan/500000001> <http://www.w3.org/2004/02/skos/core#prefLabel> "Kupffer, Elis\\u00E0r von"@en .
+<http://vocab.getty.edu/ulan/500000001> <http://vocab.getty.edu/ontology#prefLabelGVP> <http://vocab.getty.edu/ulan/term/1500000001> .
+<http://vocab.getty.edu/ulan/term/1500000001> <http://www.w3.org/2008/05/skos-xl#literalForm> "Kupffer, Elisar von"@en .
+<http://vocab.getty.edu/ulan/500000001> <http://xmlns.com/foaf/0.1/focus> <http://vocab.getty.edu/ulan/500000001-agent> .
+<http://vocab.getty.edu/ulan/500000001-agent> <http://vocab.getty.edu/ontology#biographyPreferred> <http://vocab.getty.edu/ulan/bio/4000000001> .
+<http://vocab.getty.edu/ulan/bio/4000000001> <http://vocab.getty.edu/ontology#estStart> "1872"^^<http://www.w3.org/2001/XMLSchema#gYear> .
+<http://vocab.getty.edu/ulan/bio/4000000001> <http://vocab.getty.edu/ontology#estEnd> "1942"^^<http://www.w3.org/2001/XMLSchema#gYear> .
+<http://vocab.getty.edu/ulan/bio/4000000001> <http://schema.org/gender> <http://vocab.getty.edu/aat/300189559> .
+<http://vocab.getty.edu/ulan/bio/4000000001> <http://schema.org/birthPlace> <http://vocab.getty.edu/tgn/7007775-place> .
+<http://vocab.getty.edu/tgn/7007775> <http://www.w3.org/2004/02/skos/core#prefLabel> "Tallinn"@en .
+"""
+WIKIDATA_ENTITY = { 'id': 'Q9582671', 'labels': { 'en': { 'value': 'Adhemar Gonzaga' }}, 'aliases': {},\
+        'claims': { 'P31': [ { 'mainsnak': { 'datavalue': { 'value': { 'id': 'Q5' }}}} ],\
+            'P569': [ { 'mainsnak': { 'datavalue': { 'value': { 'time': '+1901-08-26T00:00:00Z' }}}} ],\
+            'P570': [ { 'mainsnak': { 'datavalue': { 'value': { 'time': '+1978-01-29T00:00:00Z' }}}} ],\
+            'P21': [ { 'mainsnak': { 'datavalue': { 'value': { 'id': 'Q6581097' }}}} ],\
+            'P19': [ { 'mainsnak': { 'datavalue': { 'value': { 'id': 'Q155' }}}} ] }}
+WIKIDATA_PLACE = { 'id': 'Q155', 'labels': { 'en': { 'value': 'Brazil' }}, 'aliases': {},\
+        'claims': { 'P625': [ { 'mainsnak': { 'datavalue': { 'value': { 'latitude': -10, 'longitude': -55 }}}} ] }}
+
+
+class TestLocalAuthority(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.tmp_dir.name, 'authority.sqlite')
+        ulan_file = os.path.join(self.tmp_dir.name, 'ulan.nt')
+        with open(ulan_file, 'w') as f:
+            f.write(ULAN_DUMP)
+        wikidata_file = os.path.join(self.tmp_dir.name, 'wikidata.json')
+        with open(wikidata_file, 'w') as f:
+            f.write('[\n' + json.dumps(WIKIDATA_ENTITY) + ',\n' + json.dumps(WIKIDATA_PLACE) + ',\n]\n')
+        store = AuthorityStore(self.database)
+        self.assertEqual(import_ulan(ulan_file, store), 1)
+        self.assertEqual(import_wikidata(wikidata_file, store), 1)
+        store.close()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_normalize_key(self):
+        self.assertEqual(normalize_key('Kupffer, Elisàr  von'), 'elisar von kupffer')
+
+    def test_lookup(self):
+        store = AuthorityStore(self.database)
+        self.assertEqual(len(store.lookup('Elisàr von Kupffer', ULAN)), 1)
+        self.assertEqual(len(store.lookup('Elisàr von Kupffer', WIKIDATA)), 0)
+        store.close()
+
+    def test_query_artist(self):
+        artist = Artist('Elisàr von Kupffer', None, False)
+        artist.addDate('1923-1939')
+        authority = LocalAuthority(self.database, ULAN)
+        authority.query_artist(artist)
+        self.assertEqual(artist.surename, 'Kupffer')
+        self.assertEqual(authority.metrics.histogram('artist_lookup_seconds', api='LocalAuthority_ulan').count, 1)
+        self.assertEqual(artist.death, '1942')
+        self.assertEqual(artist.gender, 'männlich')
+        self.assertEqual(artist.placeOfBirth, 'Tallinn')
+        artists = [ Artist('Adhemar Gonzaga', None, False) ]
+        LocalAuthority(self.database, WIKIDATA).query_artists(artists)
+        self.assertEqual(artists[0].birth, '26.08.1901')
+        self.assertEqual(artists[0].placeOfBirth, 'Brazil')
+
+    def test_lived_window_without_death(self):
+        authority = LocalAuthority(self.database, ULAN)
+        artist = Artist('Elisàr von Kupffer', None, False)
+        artist.addDate('1860-1870')
+        artist.update()
+        bindings = [ { 'birth': { 'value': '1872' }}, { 'birth': { 'value': '1850' }} ]
+        self.assertEqual(authority._filter_bindings(bindings, artist), bindings[1:])
+
+    def test_lived_window(self):
+        artists = [ Artist('Elisàr von Kupffer', None, False), Artist('Elisàr von Kupffer', None, False) ]
+        for artist in artists:
+            artist.addDate('1960-1970')
+        authority = LocalAuthority(self.database, ULAN)
+        authority.query_artist(artists[0])
+        authority.query_artists(artists[1:])
+        self.assertEqual([ artist.ulan for artist in artists ], ['', ''])
+
+    def test_query_artists_row(self):
+        artist = Artist('Elisàr von Kupffer', None, False)
+        artist.addDate('1923-1939')
+        LocalAuthority(self.database, ULAN).query_artists([ artist ])
+        row = artist.asrow(ZetcomArtistUpdate.OUTPUT_SCHEMA)
+        self.assertEqual(row['Website'], artist.ulan)
+        self.assertTrue(row['Website'].startswith('http://vocab.getty.edu/ulan/'))
+        self.assertEqual(row['Zeitraum'], '19. Jh.')
+        self.assertEqual(row['Lebensdaten'], '1872–1942')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import json
+import os
+import tempfile
+from metrics import MetricsRegistry, endpoint
+
+
+class TestMetrics(unittest.TestCase):
+    def test_endpoint(self):
+        self.assertEqual(endpoint('https://mptest.kumu.swiss/ria-ws/application/module/Object/0054240/export/95025'), '/ria-ws/application/module/Object/{id}/export/{id}')
+        self.assertEqual(endpoint('http://localhost/ria-ws/application/session/0123456789abcdef0123456789abcdef'), '/ria-ws/application/session/{id}')
+        self.assertEqual(endpoint('http://localhost/ria-ws/application/module/Address/search'), '/ria-ws/application/module/Address/search')
+
+    def test_registry(self):
+        metrics = MetricsRegistry()
+        events = []
+        metrics.add_listener(lambda kind, name, value, labels: events.append((kind, name)))
+        metrics.inc('requests_total', method='GET')
+        metrics.inc('requests_total', 2, method='GET')
+        for seconds in (0.001, 0.02, 0.02, 3.0):
+            metrics.observe('request_seconds', seconds, method='GET')
+        with metrics.timer('parse_seconds'):
+            pass
+        self.assertEqual(metrics.counter('requests_total', method='GET'), 3)
+        self.assertEqual(metrics.counter('requests_total', method='POST'), 0)
+        histogram = metrics.histogram('request_seconds', method='GET')
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.quantile(0.5), 0.025)
+        self.assertEqual(histogram.quantile(0.95), 5.0)
+        self.assertEqual(metrics.histogram('parse_seconds').count, 1)
+        self.assertEqual(len(events), 7)
+        self.assertTrue('request_seconds{method="GET"}: 4 calls' in metrics.summary())
+
+    def test_export(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp_dir.name, 'metrics.json')
+        metrics = MetricsRegistry(path)
+        metrics.inc('cache_total', api='Getty', result='hit')
+        metrics.observe('query_seconds', 0.2, api='Getty')
+        prometheus = metrics.to_prometheus()
+        self.assertTrue('# TYPE cache_total counter' in prometheus)
+        self.assertTrue('cache_total{api="Getty",result="hit"} 1' in prometheus)
+        self.assertTrue('query_seconds_bucket{api="Getty",le="0.25"} 1' in prometheus)
+        self.assertTrue('query_seconds_bucket{api="Getty",le="0.1"} 0' in prometheus)
+        self.assertTrue('query_seconds_count{api="Getty"} 1' in prometheus)
+        metrics.close()
+        with open(path) as jf:
+            data = json.load(jf)
+        tmp_dir.cleanup()
+        self.assertEqual(data['counters'][0]['labels'], { 'api': 'Getty', 'result': 'hit' })
+        self.assertEqual(data['histograms'][0]['count'], 1)
+
+if __name__ == "__main__":
+    unittest.main()
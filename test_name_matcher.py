@@ -0,0 +1,31 @@
+import unittest
+from types import SimpleNamespace
+from name_matcher import NameMatcher, normalize, year
+
+
+class TestNameMatcher(unittest.TestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize('Kupffer, Elisàr von'), 'elisar von kupffer')
+        self.assertEqual(normalize('Stanisław  Ignacy Witkiewicz'), 'stanisław ignacy witkiewicz')
+
+    def test_year(self):
+        self.assertEqual(year('1872'), 1872)
+        self.assertEqual(year('1901-08-26T00:00:00Z'), 1901)
+        self.assertEqual(year('26.08.1901'), 1901)
+
+    def test_best(self):
+        matcher = NameMatcher()
+        artist = SimpleNamespace(name='Elisàr von Kupffer', livedBefore='1923', livedAfter='1939')
+        bindings = [ { 'itemLabel': { 'value': 'Elisabeth Kupfer' }},\
+                { 'itemLabel': { 'value': 'Elisar von Kupffer' }, 'birth': { 'value': '1872-03-03T00:00:00Z' }, 'death': { 'value': '1942-10-31T00:00:00Z' }},\
+                { 'itemLabel': { 'value': 'Elisar von Kupffer' }, 'birth': { 'value': '1950-01-01T00:00:00Z' }, 'death': { 'value': '2000-01-01T00:00:00Z' }} ]
+        self.assertTrue(matcher.best(bindings, artist, 'itemLabel') is bindings[1])
+        self.assertTrue(matcher.score('Kupffer, Elisar von', artist.name) == 1.0)
+        self.assertEqual(matcher.features.cache_info().currsize, 4)
+        matcher = NameMatcher(max_entries=2)
+        matcher.score('Kupffer, Elisar von', artist.name)
+        matcher.score('Elisabeth Kupfer', artist.name)
+        self.assertEqual(matcher.features.cache_info().currsize, 2)
+
+if __name__ == "__main__":
+    unittest.main()
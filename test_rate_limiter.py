@@ -0,0 +1,25 @@
+import unittest
+import time
+from rate_limiter import TokenBucket, get_rate_limiter
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_acquire(self):
+        bucket = TokenBucket(20, 2)
+        start = time.monotonic()
+        for i in range(4):
+            bucket.acquire()
+        self.assertTrue(time.monotonic() - start >= 0.09)
+
+    def test_penalize(self):
+        bucket = TokenBucket(100, 5)
+        bucket.penalize(0.1)
+        self.assertTrue(bucket.acquire() >= 0.09)
+
+    def test_shared(self):
+        self.assertTrue(get_rate_limiter('https://example.org/sparql', 1) is get_rate_limiter('https://example.org/sparql', 5))
+        self.assertEqual(get_rate_limiter('https://example.org/sparql', 5, 3).burst, 3)
+        self.assertEqual(get_rate_limiter('https://example.org/sparql', 1).rate, 1)
+
+if __name__ == "__main__":
+    unittest.main()
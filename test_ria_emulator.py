@@ -0,0 +1,46 @@
+import unittest
+import base64
+import json
+import urllib.error
+import urllib.request
+from ria_emulator import RiaEmulator
+
+SEARCH = '<?xml version="1.0" encoding="UTF-8"?><application xmlns="http://www.zetcom.com/ria/ws/module/search"><modules><module name="Address"><search limit="10" offset="0"><select><field fieldPath="__id"/></select><expert><and><equalsField fieldPath="AdrOrganisationTxt" operand="Kunstmuseum Basel"/><equalsField fieldPath="AdrPersonTypeVoc" operand="30001"/></and></expert></search></module></modules></application>'
+
+
+class TestRiaEmulator(unittest.TestCase):
+    def request(self, emulator, method, url, data=None, password='test'):
+        auth = base64.b64encode(f'user[SimpleUserTest]:password[{password}]'.encode('utf-8')).decode('utf-8')
+        request = urllib.request.Request(emulator.url + '/ria-ws/application' + url, data=data, method=method, headers={ 'Authorization': 'Basic ' + auth })
+        with urllib.request.urlopen(request) as response:
+            return response.read()
+
+    def test_search(self):
+        with RiaEmulator() as emulator:
+            xml = self.request(emulator, 'POST', '/module/Address/search', SEARCH.encode('utf-8'))
+            self.assertTrue(b'totalSize="1"' in xml)
+            self.assertTrue(b'id="11099"' in xml)
+            self.assertEqual(emulator.counts['search'], 1)
+
+    def test_export_and_nodes(self):
+        with RiaEmulator() as emulator:
+            self.assertEqual(json.loads(self.request(emulator, 'GET', '/module/Object/0054240/export/95025'))[0]['ID'], '54240')
+            xml = self.request(emulator, 'GET', '/vocabulary/instances/PerRightsHolderVgr/nodes/search/?nodeName=2025&offset=1&limit=1')
+            self.assertTrue(b'size="2"' in xml)
+            self.assertTrue(b'Pictoright 2025' in xml and b'ProLitteris' not in xml)
+
+    def test_session_and_injection(self):
+        with RiaEmulator(password='secret', throttle_rate=1.0, retry_after=3) as emulator:
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                self.request(emulator, 'GET', '/session', password='secret')
+            self.assertEqual(context.exception.code, 429)
+            self.assertEqual(context.exception.headers['Retry-After'], '3')
+        with RiaEmulator(password='secret') as emulator:
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                self.request(emulator, 'GET', '/session', password='wrong')
+            self.assertEqual(context.exception.code, 401)
+            self.assertTrue(b'<key>' in self.request(emulator, 'GET', '/session', password='secret'))
+            self.assertEqual(len(emulator.sessions), 1)
+
+if __name__ == "__main__":
+    unittest.main()
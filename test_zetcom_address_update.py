@@ -3,10 +3,12 @@ import csv
 from os import sep, path
 import lxml.etree as ET
 import sys
+import tempfile
 import zetcom_address_update
-from zetcom_address_update import AddressItem
+from ria_emulator import RiaEmulator
+from zetcom_address_update import AddressItem, AddressParser, AddressRecord, Field
 from zetcom_session import SchemaItem 
-from zetcom_address_update import address_parse_title, parse_address_parts, print_address_fields
+from zetcom_address_update import address_parse_pairs, address_parse_title, parse_address_parts, print_address_fields
 from typing import List
 
 
@@ -49,6 +51,102 @@ class TestZetcomAddress(unittest.TestCase):
         items: List[AddressItem] = [ AddressItem('AdrOrganisationTxt','Kunstmuseum Basel') ] 
         address.close()
 
+    def test_address_record(self):
+        addressList = AddressRecord([ AddressItem('AdrOrganisationTxt', 'The Metropolitan Museum of Art') ])
+        address_parse_title('Irene Miller', addressList)
+        address_parse_pairs(' and Kim Harding', addressList)
+        self.assertEqual([ item.fieldPath for item in addressList ], ['AdrOrganisationTxt', 'AdrForeNameTxt', 'AdrSurNameTxt', 'AdrForeNamePartnerTxt', 'AdrSurNamePartnerTxt'])
+        self.assertEqual(addressList.first('AdrSurNameTxt'), 'Miller')
+        self.assertEqual(addressList.first('AdrSurNamePartnerTxt'), 'Harding')
+        self.assertEqual(addressList.first('AdrCityTxt'), '')
+        self.assertTrue('AdrForeNamePartnerTxt' in addressList)
+        self.assertEqual(addressList.pop().operand, 'Harding')
+        self.assertFalse('AdrSurNamePartnerTxt' in addressList)
+        self.assertEqual([ item.operand for item in addressList.select(['AdrSurNameTxt', 'AdrForeNameTxt']) ], ['Miller', 'Irene'])
+        self.assertEqual(len(addressList), 4)
+
+    def test_address_parser(self):
+        parser = AddressParser(zetcom_address_update.ZetcomAddressUpdates.DEFAULT_SCHEMA)
+        testRow = {'Institution': 'The Metropolitan Museum of Art', 'First_Name': 'Dr. Irene Miller', 'Last_Name': 'and Kim Harding', 'Title': 'Associate Curator', 'Address': '1000 Fifth Avenue \nNew York, NY 10028', 'Country': 'USA', 'Email': 'Ashley.Dunn@metmuseum.org, kim@example.org'}
+        fields = parser.parse_row(testRow)
+        self.assertEqual(fields[:6], [ Field('AdrOrganisationTxt', 'The Metropolitan Museum of Art'), Field('AdrAcademicTitleVoc', 'Dr.'), Field('AdrForeNameTxt', 'Irene'),\
+                Field('AdrSurNameTxt', 'Miller'), Field('AdrForeNamePartnerTxt', 'Kim'), Field('AdrSurNamePartnerTxt', 'Harding') ])
+        self.assertEqual(fields[6:], [ Field('AdrCountryVoc', 'Vereinigte Staaten von Amerika'), Field('AdrFunctionVoc', 'Associate Curator'), Field('AdrStreeTxt', '1000 Fifth Avenue'),\
+                Field('AdrCityTxt', 'New York, NY 10028'), Field('AdrContactGrp1', 'Ashley.Dunn@metmuseum.org'), Field('AdrContactGrp2', 'kim@example.org') ])
+        addressList: List[AddressItem] = []
+        parse_address_parts('Hauptstrasse 1, Postfach, 4051 Basel', addressList)
+        self.assertEqual([ (item.fieldPath, item.operand) for item in addressList ], [('AdrPostcodeTxt', '4051 Basel'), ('AdrCityTxt', 'Postfach'), ('AdrStreeTxt', 'Hauptstrasse 1')])
+
+    def test_address_ids(self):
+        with RiaEmulator() as emulator:
+            address = zetcom_address_update.ZetcomAddressUpdates([], server=emulator.url, password='test', batch_size=2)
+            search_items = [ [ AddressItem('AdrOrganisationTxt','Kunstmuseum Basel'), AddressItem('AdrForeNameTxt', 'Christian'), AddressItem('AdrSurNameTxt', 'Selz') ],\
+                    [ AddressItem('AdrOrganisationTxt','Kunstmuseum Basel') ],\
+                    [ AddressItem('AdrOrganisationTxt','Kunsthalle Basel') ],\
+                    [ AddressItem('AdrOrganisationTxt','The Metropolitan Museum of Art') ],\
+                    [ AddressItem('AdrOrganisationTxt','Kunstmuseum Basel') ] ]
+            self.assertEqual(address.address_ids(search_items), ['19964', '11099', None, '19965', '11099'])
+            self.assertEqual(emulator.counts['search'], 2)
+            self.assertEqual(address.address_id([ AddressItem('AdrOrganisationTxt','Kunstmuseum Basel') ]), '11099')
+            address.close()
+
+    def test_prefetch(self):
+        with RiaEmulator() as emulator, tempfile.TemporaryDirectory() as tmp_dir:
+            snapshot = path.join(tmp_dir, 'addresses.json')
+            address = zetcom_address_update.ZetcomAddressUpdates([], server=emulator.url, password='test')
+            address.PAGE_SIZE = 2
+            address.index = address.load_index(snapshot)
+            self.assertEqual(len(address.index), 3)
+            self.assertEqual(emulator.counts['search'], 2)
+            search_items = [ [ AddressItem('AdrOrganisationTxt','Kunstmuseum Basel'), AddressItem('AdrForeNameTxt', 'Christian'), AddressItem('AdrSurNameTxt', 'Selz') ],\
+                    [ AddressItem('AdrOrganisationTxt','Kunsthalle Basel') ], [ AddressItem('AdrOrganisationTxt','Kunstmuseum Basel') ] ]
+            self.assertEqual(address.address_ids(search_items), ['19964', None, '11099'])
+            self.assertEqual(emulator.counts['search'], 2)
+            address.close()
+            address = zetcom_address_update.ZetcomAddressUpdates([], server=emulator.url, password='test', snapshot=snapshot)
+            self.assertEqual(len(address.index), 3)
+            self.assertEqual(emulator.counts['search'], 4)
+            address.close()
+            emulator.data['modules']['Address'].append({ '__id': '19966', 'AdrOrganisationTxt': 'Kunsthalle Basel', 'AdrPersonTypeVoc': '30001' })
+            address = zetcom_address_update.ZetcomAddressUpdates([], server=emulator.url, password='test', snapshot=snapshot)
+            self.assertEqual(address.address_ids(search_items), ['19964', '19966', '11099'])
+            address.close()
+            self.assertEqual(len(zetcom_address_update.AddressIndex.load(snapshot)), 4)
+            del emulator.data['modules']['Address'][0]
+            address = zetcom_address_update.ZetcomAddressUpdates([], server=emulator.url, password='test', snapshot=snapshot)
+            self.assertEqual(address.address_ids(search_items), ['19964', '19966', None])
+            address.close()
+
+    def test_process_file_emulator(self):
+        with RiaEmulator() as emulator, tempfile.TemporaryDirectory() as tmp_dir:
+            csv_file = path.join(tmp_dir, 'addresses.csv')
+            with open(csv_file, 'w', newline='') as writeFile:
+                writer = csv.DictWriter(writeFile, fieldnames=['Institution', 'First_Name', 'Last_Name', 'Title', 'Address', 'Country', 'Email'])
+                writer.writeheader()
+                writer.writerow({ 'Institution': 'Kunstmuseum Basel', 'First_Name': 'Christian', 'Last_Name': 'Selz', 'Title': '', 'Address': 'Basel', 'Country': 'Switzerland', 'Email': '' })
+                writer.writerow({ 'Institution': 'Kunsthalle Basel', 'First_Name': '', 'Last_Name': '', 'Title': '', 'Address': 'Basel', 'Country': 'Switzerland', 'Email': '' })
+                writer.writerow({ 'Institution': 'Kunsthalle Bern', 'First_Name': 'Anna', 'Last_Name': 'Muster', 'Title': '', 'Address': 'Bern', 'Country': 'Switzerland', 'Email': '' })
+                writer.writerow({ 'Institution': 'The Metropolitan Museum of Art', 'First_Name': '', 'Last_Name': '', 'Title': '', 'Address': 'New York', 'Country': 'USA', 'Email': '' })
+            address = zetcom_address_update.ZetcomAddressUpdates([], server=emulator.url, password='test')
+            address.process_file(csv_file, path.join(tmp_dir, 'output.csv'))
+            address.close()
+            self.assertEqual(emulator.counts['search'], 1)
+            with open(path.join(tmp_dir, 'output.csv'), newline='') as openFile:
+                self.assertEqual([ row['Institution'] for row in csv.DictReader(openFile) ], ['Kunsthalle Basel', 'Kunsthalle Bern'])
+            with open(path.join(tmp_dir, 'output.txt')) as openFile:
+                self.assertEqual(openFile.read().split(), ['19964', '19965'])
+
+    def test_parse_records(self):
+        rows = [ { 'Institution': f'Museum {index // 2}', 'First_Name': '', 'Last_Name': f'Name {index}', 'Title': '', 'Address': 'Basel', 'Country': 'Switzerland', 'Email': '' } for index in range(20) ]
+        with RiaEmulator() as emulator:
+            address = zetcom_address_update.ZetcomAddressUpdates([], server=emulator.url, password='test')
+            expected = [ list(record) for record in address.parse_records(address.accepted_rows(rows)) ]
+            self.assertEqual(len(expected), 10)
+            address.processes = 2
+            address.CHUNK_SIZE = 3
+            self.assertEqual([ list(record) for record in address.parse_records(address.accepted_rows(rows)) ], expected)
+            address.close()
+
     @unittest.skip('Resources')
     def test_process_file(self):
         address = zetcom_address_update.ZetcomAddressUpdates([])
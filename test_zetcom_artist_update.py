@@ -1,9 +1,15 @@
 import unittest
 import csv
+import io
+from contextlib import redirect_stdout
 from os import sep, path
 import lxml.etree as ET
 import sys
+import tempfile
 import zetcom_artist_update
+from artist_api import Artist, ArtistRegistry
+from journal import Journal
+from ria_emulator import RiaEmulator
 from typing import List
 
 
@@ -12,6 +18,75 @@ class TestZetcomArtist(unittest.TestCase):
         artist_update = zetcom_artist_update.ZetcomArtistUpdate()
         artist_update.close()
 
+    def test_artist_writer(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_file = path.join(tmp_dir, 'output.csv')
+            existing_out = path.join(tmp_dir, 'existing.csv')
+            unknown_file = path.join(tmp_dir, 'unknown.csv')
+            writer = zetcom_artist_update.ArtistWriter(output_file, existing_out, zetcom_artist_update.ZetcomArtistUpdate.OUTPUT_SCHEMA,\
+                    zetcom_artist_update.ZetcomArtistUpdate.EXISTING_SCHEMA, unknown_file)
+            artist = Artist('Elisàr von Kupffer', None, False)
+            artist.surename = 'Kupffer'
+            writer.write(artist, 'new')
+            with open(output_file, newline='') as openFile:
+                rows = list(csv.DictReader(openFile))
+                self.assertEqual(rows[0]['Nachname'], 'Kupffer')
+            writer.write(Artist('Unknown Test Artist', None, False), 'new')
+            self.assertFalse(path.exists(existing_out))
+            writer.close()
+            with open(unknown_file, newline='') as openFile:
+                self.assertEqual(list(csv.DictReader(openFile))[0]['Name'], 'Unknown Test Artist')
+
+
+    def test_journal_completed(self):
+        with RiaEmulator() as emulator, tempfile.TemporaryDirectory() as tmp_dir:
+            journal = Journal(path.join(tmp_dir, 'journal.jsonl'))
+            artist_update = zetcom_artist_update.ZetcomArtistUpdate(server=emulator.url, journal=journal, authority=path.join(tmp_dir, 'authority.sqlite'), password='test')
+            with artist_update.getty.store.lock:
+                artist_update.getty.store.connection.execute('DROP TABLE names')
+            self.assertEqual(artist_update.process_api(Artist('Elisàr von Kupffer', None, False), ArtistRegistry()), 1)
+            self.assertEqual([ record['status'] for record in journal.records() ], ['failed'])
+            artist_update.process_api_batches([ Artist('Augusta Kupffer', None, False) ], ArtistRegistry())
+            self.assertEqual([ record['status'] for record in journal.records() ], ['failed', 'failed'])
+            self.assertEqual(artist_update.failed, 2)
+            new_artists, existing_artists, failed_artists = artist_update.artists_from_journal()
+            self.assertEqual((len(new_artists), len(failed_artists)), (0, 2))
+            unknown_file = path.join(tmp_dir, 'unknown.csv')
+            artist_update.writer = zetcom_artist_update.ArtistWriter('', '', artist_update.OUTPUT_SCHEMA, artist_update.EXISTING_SCHEMA, unknown_file)
+            artist_update.process_api(Artist('Elisàr von Kupffer', None, False), ArtistRegistry())
+            artist_update.writer.close()
+            with open(unknown_file, newline='') as openFile:
+                self.assertEqual(list(csv.DictReader(openFile))[0]['Name'], 'Elisàr von Kupffer')
+            artist_update.close()
+
+    def test_rate(self):
+        with RiaEmulator() as emulator:
+            artist_update = zetcom_artist_update.ZetcomArtistUpdate(server=emulator.url, password='test', rate=0.5, burst=1)
+            self.assertEqual((artist_update.getty.limiter.rate, artist_update.wikidata.limiter.burst), (0.5, 1))
+            artist_update.close()
+            artist_update = zetcom_artist_update.ZetcomArtistUpdate(server=emulator.url, password='test')
+            self.assertEqual((artist_update.getty.limiter.rate, artist_update.wikidata.limiter.burst), (2.0, 2))
+            artist_update.close()
+
+    def test_stream_file(self):
+        with RiaEmulator() as emulator, tempfile.TemporaryDirectory() as tmp_dir:
+            csv_file = path.join(tmp_dir, 'artists.csv')
+            with open(csv_file, 'w', newline='') as openFile:
+                writer = csv.writer(openFile)
+                writer.writerows([ ['Artist', 'Date'], ['Skipped Row', '1900'], ['Test Artist', '1923'], ['Elisàr von Kupffer', '1923'],\
+                        ['Other Artist', '1950'], ['Test Artist', '1939'] ])
+            artist_update = zetcom_artist_update.ZetcomArtistUpdate(server=emulator.url, stream=True, authority=path.join(tmp_dir, 'authority.sqlite'), password='test')
+            artist_update.STREAM_CHUNK_SIZE = 1
+            files = [ path.join(tmp_dir, name) for name in ('output.csv', 'existing.csv', 'unknown.csv') ]
+            with redirect_stdout(io.StringIO()):
+                artist_update.process_file(csv_file, files[0], files[1], unknown_file=files[2])
+            artist_update.close()
+            self.assertEqual(emulator.counts['search'], 5)
+            with open(files[1], newline='') as openFile:
+                self.assertEqual([ row['ID'] for row in csv.DictReader(openFile) ], ['1002'])
+            with open(files[2], newline='') as openFile:
+                rows = list(csv.DictReader(openFile))
+                self.assertEqual([ (row['Name'], row['Lebte vor'], row['Lebte nach']) for row in rows ], [('Other Artist', '1950', '1950'), ('Test Artist', '1923', '1939')])
 
 
 if __name__ == "__main__":
@@ -1,8 +1,11 @@
 import unittest
 from os import sep, path
+import asyncio
 import lxml.etree as ET
 import sys
+import time
 import zetcom_session
+from ria_emulator import RiaEmulator
 
 class TestZetcomTest(unittest.TestCase):
     def test_check_init(self):
@@ -11,6 +14,15 @@ class TestZetcomTest(unittest.TestCase):
         self.assertEqual(zsession.username,'SimpleUserTest')
         zsession.close()
 
+    def test_transport(self):
+        zsession = zetcom_session.ZetcomSession(pool_size=4, connect_timeout=2, read_timeout=30, backoff_factor=0.5, max_backoff=3)
+        self.assertEqual(zsession.timeout, (2, 30))
+        adapter = zsession.session.get_adapter('https://mptest.kumu.swiss')
+        self.assertEqual(adapter._pool_maxsize, 4)
+        for attempt in range(10):
+            self.assertTrue(0 <= zsession._backoff(attempt) <= 3)
+        zsession.close()
+
     def test_get_json(self):
         zsession = zetcom_session.ZetcomSession()
         zsession.open()
@@ -42,6 +54,59 @@ class TestZetcomTest(unittest.TestCase):
         self.assertEqual(xml.xpath('//module:module/@totalSize', namespaces=namespaces)[0], '1')
         zsession.close()
 
+    def test_emulator(self):
+        with RiaEmulator(throttle_rate=0.3, seed=1, retry_after=0) as emulator:
+            zsession = zetcom_session.ZetcomSession(server=emulator.url, password='test', backoff_factor=0.01)
+            zsession.open()
+            xml = zsession.get("/ria-ws/application/vocabulary/instances/AdrPersonTypeVgr/nodes/search")
+            self.assertEqual(xml.nsmap[None], "http://www.zetcom.com/ria/ws/vocabulary")
+            self.assertEqual(zsession.get_json('/ria-ws/application/module/Object/0054240/export/95025')[0]["ID"], '54240')
+            nodes = zsession.get_vocabulary_nodes('PerRightsHolderVgr', '2025', offset=1, limit=1)
+            self.assertEqual([ node.get('logicalName') for node in nodes ], ['Pictoright 2025'])
+            zsession.close()
+            self.assertEqual(len(emulator.sessions), 0)
+            metrics = zsession.metrics
+            self.assertEqual(metrics.counter('ria_requests_total', method='GET', endpoint='/ria-ws/application/module/Object/{id}/export/{id}', status='200'), 1)
+            self.assertEqual(metrics.counter('ria_retries_total', method='GET', endpoint='/ria-ws/application/session'), emulator.counts['open_session'] - 1)
+            self.assertTrue(metrics.counter('ria_bytes_total', direction='received') > 0)
+            self.assertEqual(metrics.histogram('xml_parse_seconds').count, 2)
+
+    def test_emulator_bytes(self):
+        xml_string = '<?xml version="1.0" encoding="UTF-8"?><application xmlns="http://www.zetcom.com/ria/ws/module/search"><modules><module name="Person"><search limit="10" offset="0"><expert><equalsField fieldPath="PerNennformTxt" operand="Kupffer, Elisàr von"/></expert></search></module></modules></application>'
+        with RiaEmulator() as emulator:
+            zsession = zetcom_session.ZetcomSession(server=emulator.url, password='test')
+            zsession.open()
+            sent = zsession.metrics.counter('ria_bytes_total', direction='sent')
+            xml = zsession.post('/ria-ws/application/module/Person/search', xml_string)
+            self.assertEqual(len(xml.xpath('//module:moduleItem', namespaces={ 'module': xml.nsmap[None] })), 1)
+            self.assertEqual(zsession.metrics.counter('ria_bytes_total', direction='sent') - sent, len(xml_string.encode('utf-8')))
+            zsession.close()
+
+    def test_async_post(self):
+        xml_string = '<?xml version="1.0" encoding="UTF-8"?><application xmlns="http://www.zetcom.com/ria/ws/module/search" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://www.zetcom.com/ria/ws/module/search http://www.zetcom.com/ria/ws/module/search/search_1_1.xsd"><modules><module name="Address"><search limit="10" offset="0"><select><field fieldPath="__id"/></select><expert><equalsField fieldPath="__id" operand="11099"/></expert></search></module></modules></application>'
+        async def search():
+            async with zetcom_session.AsyncZetcomSession(concurrency=4) as zsession:
+                self.assertTrue(zsession.key is not None)
+                return await asyncio.gather(*[ zsession.post('/ria-ws/application/module/Address/search', xml_string) for i in range(4) ])
+        responses = asyncio.run(search())
+        self.assertEqual(len(responses), 4)
+        for xml in responses:
+            namespaces = { 'module': xml.nsmap[None] }
+            self.assertEqual(xml.xpath('//module:module/@totalSize', namespaces=namespaces)[0], '1')
+
+    def test_async_concurrency(self):
+        async def get(zsession):
+            return await asyncio.gather(*[ zsession.get_json('/ria-ws/application/module/Object/0054240/export/95025') for i in range(40) ])
+        async def run(emulator):
+            async with zetcom_session.AsyncZetcomSession(server=emulator.url, concurrency=40, password='test') as zsession:
+                start = time.perf_counter()
+                responses = await get(zsession)
+                return responses, time.perf_counter() - start
+        with RiaEmulator(latency=0.5) as emulator:
+            responses, seconds = asyncio.run(run(emulator))
+        self.assertEqual(len(responses), 40)
+        self.assertTrue(seconds < 2.0)
+
 
 if __name__ == "__main__":
     unittest.main()
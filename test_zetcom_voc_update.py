@@ -0,0 +1,124 @@
+import unittest
+import io
+import os
+import tempfile
+from contextlib import redirect_stdout
+from journal import Journal
+from ria_emulator import RiaEmulator
+import zetcom_voc_update
+
+
+class TestZetcomVocUpdate(unittest.TestCase):
+    def test_dry_run(self):
+        with RiaEmulator() as emulator:
+            voc = zetcom_voc_update.ZetcomVocUpdate('PerRightsHolderVgr', '2025', '2026', server=emulator.url, password='test')
+            output = io.StringIO()
+            with redirect_stdout(output):
+                self.assertEqual(voc.update(voc.get_nodes(), dry_run=True), 2)
+            voc.close()
+            self.assertTrue('+ <node' in output.getvalue() and 'Pictoright 2026' in output.getvalue())
+            self.assertEqual(emulator.counts.get('update_node', 0) + emulator.counts.get('update_term', 0), 0)
+
+    def test_update(self):
+        with RiaEmulator() as emulator:
+            voc = zetcom_voc_update.ZetcomVocUpdate('PerRightsHolderVgr', '2025', '2026', server=emulator.url, workers=2, password='test')
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(voc.update(voc.get_nodes()), 2)
+            self.assertEqual(emulator.counts['update_term'], 3)
+            self.assertEqual(emulator.counts['update_node'], 2)
+            nodes = emulator.data['vocabularies']['PerRightsHolderVgr']
+            self.assertEqual([ node['logicalName'] for node in nodes ], ['ProLitteris 2026', 'Pictoright 2026', 'Public Domain'])
+            self.assertEqual(nodes[0]['terms'][1]['content'], '© ProLitteris, Zürich 2026')
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(voc.update(voc.get_nodes()), 0)
+            self.assertEqual(emulator.counts['update_node'], 2)
+            voc.close()
+
+    def test_update_pages(self):
+        with RiaEmulator() as emulator:
+            voc = zetcom_voc_update.ZetcomVocUpdate('PerRightsHolderVgr', '2025', '2026', server=emulator.url, password='test')
+            voc.PAGE_SIZE = 1
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(voc.update(dry_run=True), 2)
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(voc.update(), 2)
+            voc.close()
+            self.assertEqual(emulator.counts['nodes'], 6)
+            self.assertEqual(emulator.counts['update_node'], 2)
+            self.assertEqual([ node['logicalName'] for node in emulator.data['vocabularies']['PerRightsHolderVgr'] ], ['ProLitteris 2026', 'Pictoright 2026', 'Public Domain'])
+
+    def test_update_pages_unchanged(self):
+        with RiaEmulator() as emulator:
+            voc = zetcom_voc_update.ZetcomVocUpdate('PerRightsHolderVgr', 'pictoright', 'Pictoright', server=emulator.url, password='test')
+            voc.PAGE_SIZE = 1
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(voc.update(), 0)
+            voc.close()
+            self.assertEqual(emulator.counts['nodes'], 3)
+
+    def test_journal_rollback(self):
+        with RiaEmulator() as emulator, tempfile.TemporaryDirectory() as tmp_dir:
+            journal_file = os.path.join(tmp_dir, 'journal.jsonl')
+            voc = zetcom_voc_update.ZetcomVocUpdate('PerRightsHolderVgr', '2025', '2026', server=emulator.url, workers=2, journal=Journal(journal_file), password='test')
+            with redirect_stdout(io.StringIO()):
+                voc.update(voc.get_nodes())
+            records = voc.read_journal()
+            self.assertEqual(records['50001']['status'], 'committed')
+            self.assertEqual(len([ record for record in records.values() if record['status'] == 'done' ]), 5)
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(voc.rollback(), 5)
+            voc.close()
+            nodes = emulator.data['vocabularies']['PerRightsHolderVgr']
+            self.assertEqual([ node['logicalName'] for node in nodes ], ['ProLitteris 2025', 'Pictoright 2025', 'Public Domain'])
+            self.assertEqual(nodes[0]['terms'][1]['content'], '© ProLitteris, Zürich 2025')
+
+    def test_resume(self):
+        with RiaEmulator() as emulator, tempfile.TemporaryDirectory() as tmp_dir:
+            journal = Journal(os.path.join(tmp_dir, 'journal.jsonl'))
+            journal.append({ 'key': 'run', 'run': '1', 'status': 'started', 'filter': '2025', 'replace': '2026' })
+            journal.append({ 'key': '50001', 'run': '1', 'status': 'committed' })
+            voc = zetcom_voc_update.ZetcomVocUpdate('PerRightsHolderVgr', '2025', '2026', server=emulator.url, journal=journal, password='test')
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(voc.update(voc.get_nodes(), resume=True), 1)
+            voc.close()
+            self.assertEqual(emulator.counts['update_node'], 1)
+            self.assertEqual(emulator.data['vocabularies']['PerRightsHolderVgr'][1]['logicalName'], 'Pictoright 2026')
+
+    def test_runs(self):
+        with RiaEmulator() as emulator, tempfile.TemporaryDirectory() as tmp_dir:
+            journal = Journal(os.path.join(tmp_dir, 'journal.jsonl'))
+            voc = zetcom_voc_update.ZetcomVocUpdate('PerRightsHolderVgr', '2025', '2026', server=emulator.url, journal=journal, password='test')
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(voc.update(voc.get_nodes()), 2)
+            voc.filter_term, voc.replace_term = '2026', '2027'
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(voc.update(voc.get_nodes(), resume=True), 2)
+                self.assertEqual(voc.rollback(), 5)
+            self.assertEqual(len(zetcom_voc_update.run_ids(journal)), 2)
+            voc.close()
+            nodes = emulator.data['vocabularies']['PerRightsHolderVgr']
+            self.assertEqual([ node['logicalName'] for node in nodes ], ['ProLitteris 2026', 'Pictoright 2026', 'Public Domain'])
+
+    def test_dry_run_rollback(self):
+        with redirect_stdout(io.StringIO()):
+            self.assertEqual(zetcom_voc_update.main(['-d', '--rollback']), 2)
+
+    def test_new_journal(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            journal_file = os.path.join(tmp_dir, 'journal.jsonl')
+            journal = Journal(journal_file)
+            journal.append({ 'key': '/nodes/50001/terms/60001', 'node': '50001', 'status': 'done' })
+            journal.append({ 'key': '/nodes/50001', 'node': '50001', 'status': 'pending', 'original': '<node/>' })
+            self.assertEqual(zetcom_voc_update.open_entries(zetcom_voc_update.last_records(journal)), ['/nodes/50001/terms/60001', '/nodes/50001'])
+            journal.close()
+            with redirect_stdout(io.StringIO()):
+                self.assertEqual(zetcom_voc_update.main(['-n', '-j', journal_file]), 1)
+            journal = Journal(journal_file)
+            self.assertEqual(len(list(journal.records())), 2)
+            journal.append({ 'key': '/nodes/50001', 'node': '50001', 'status': 'done' })
+            journal.append({ 'key': '50001', 'status': 'committed' })
+            self.assertEqual(zetcom_voc_update.open_entries(zetcom_voc_update.last_records(journal)), [])
+            journal.close()
+
+if __name__ == "__main__":
+    unittest.main()
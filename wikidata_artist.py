@@ -63,13 +63,36 @@ SELECT DISTINCT ?item ?itemLabel ?birth ?VornameLabel ?FamiliennameLabel ?death
   OPTIONAL { ?item wdt:P19 ?placeOfBirth. }
 }
     """
+BATCH_QUERY = """
+SELECT DISTINCT ?name ?item ?itemLabel ?birth ?VornameLabel ?FamiliennameLabel ?death ?genderLabel ?placeOfBirthLabel ?placeOfDeathLabel WHERE {
+  hint:Query hint:optimizer "None".
+  #SEARCHES#
+  SERVICE wikibase:label { bd:serviceParam wikibase:language "[AUTO_LANGUAGE],en". }
+  OPTIONAL { ?item wdt:P735 ?Vorname. }
+  OPTIONAL { ?item wdt:P734 ?Familienname. }
+  ?item wdt:P569 ?birth;
+    wdt:P570 ?death.
+  OPTIONAL { ?item wdt:P21 ?gender. }
+  OPTIONAL { ?item wdt:P20 ?placeOfDeath. }
+  OPTIONAL { ?item wdt:P19 ?placeOfBirth. }
+}
+    """
+SEARCH = """{
+    SERVICE wikibase:mwapi {
+      bd:serviceParam wikibase:api "Search";
+        wikibase:endpoint "www.wikidata.org";
+        mwapi:srsearch "'#NAME#' haswbstatement:P31=Q5".
+      ?item wikibase:apiOutputItem mwapi:title.
+    }
+    BIND("#NAME#" AS ?name)
+  }"""
        
 class Wikidata(ArtistAPI):
     """This class can be used to update artists 
     """
 
-    def __init__(self, endpoint='https://query.wikidata.org/sparql'): 
-        super().__init__(endpoint)
+    def __init__(self, endpoint='https://query.wikidata.org/sparql', cache=None, rate=1.0, burst=2, max_workers=4, metrics=None): 
+        super().__init__(endpoint, cache, rate, burst, max_workers, metrics=metrics)
 
     def _parse_date(self, date_str: str) ->str:
         """Parses a date and returns it in the format 'dd.mm.yyyy'
@@ -93,16 +116,17 @@ class Wikidata(ArtistAPI):
             query = query.replace('#filter', 'filter').replace('#VALUES','VALUES').replace('#LIVEDBEFORE#', artist.livedBefore).replace('#LIVEDAFTER#', artist.livedAfter)
         return query
 
+    def _create_batch_query(self, artists: List[Artist]) ->str:
+        """Create one query for all artists with a union of searches, 
+        the lived before/after filter is applied on the response
+        """
+        searches = [ SEARCH.replace('#NAME#', self._literal(name)) for name in dict.fromkeys([ artist.name for artist in artists ]) ]
+        return BATCH_QUERY.replace('#SEARCHES#', ' UNION '.join(searches))
+
     def _find_artist_in_response(self, result_dicts: List[dict], artist: Artist) ->dict:
-        """Return artist data that comes closest to artist input name.
+        """Return artist data that comes closest to artist input name and lived before/after window.
         """
-        if len(result_dicts) == 1:
-            return result_dicts[0]
-        if len([ item for item in result_dicts if item["itemLabel"]["value"] == artist.name ]) > 0:
-            return [ item for item in result_dicts if item["itemLabel"]["value"] == artist.name ][0]
-        if len([ item for item in result_dicts if item["itemLabel"]["value"].lower() == artist.name.lower() ]) > 0:
-            return [ item for item in result_dicts if item["itemLabel"]["value"].lower() == artist.name.lower() ][0]
-        return result_dicts[0]
+        return self.matcher.best(result_dicts, artist, "itemLabel")
 
     def _process_response(self, response: dict, artist: Artist):
         """Process result 
@@ -142,16 +166,10 @@ class Wikidata(ArtistAPI):
     def _process_exception(self, e: Exception, artist: Artist) ->int:
         """Process exception 
         """
-        status = len([i for i in e.args if '429' in i]) > 0 and not artist.query_failed
+        status = '429' in str(e) and not artist.query_failed
         print(Fore.RED + f'With artist {artist.name} there was a exception from wikidata: {e}! {status}' + Style.RESET_ALL)
         if status:
-            sleep = 70
-            print(Fore.BLUE + f'Query the api again for  in {sleep}s ...' + Style.RESET_ALL)
-            artist.query_failed = True
-            for i in reversed(range(0, sleep)):
-                print(Fore.MAGENTA + f"{i}s" + Style.RESET_ALL, end="\r", flush=True)
-                sleep(1)
-            return self.query_artist(artist)
+            return self._retry_later(e, artist, 70)
         elif artist.query_failed:
             return 429
         else:
@@ -17,6 +17,9 @@
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <https://www.gnu.org/licenses/> 1}}}
 from colorama import Fore, Style
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import copy
 import csv
 import getpass
 import getopt
@@ -33,8 +36,9 @@ import xml.dom.minidom as MD
 from xml.etree import ElementTree
 import lxml.etree as LET
 import zetcom_session
+from address_index import AddressIndex, matches
 from zetcom_session import DataItem, SchemaItem
-from typing import List
+from typing import Dict, Iterator, List
 
 TITLE_DICT = {"Dr.": "30134", }
 COUNTRY_DICT = {"Argentina": "Argentinien", "Australia": "Australien", "Brazil": "Brasilien", "Canada": "Kanada", "Chile": "Chile", "Colombia": "Kolumbien", "Croatia": "Kroatien", "Denmark": "Dänemark", "Ecuador": "Ecuador", "Finland": "Finnland", "France": "Frankreich", "Germany": "Deutschland", "Italy": "Italien", "Japan": "Japan", "Mexico": "Mexiko", "Monaco": "Monaco", "Netherlands": "Niederlande", "Peru": "Peru", "Slovakia": "Slovakei", "Spain": "Spanien", "Sweden": "Schweden", "Switzerland": "Schweiz", "UK": "Vereinigtes Königreich, Großbritannien", "USA": "Vereinigte Staaten von Amerika", "Wales": "Vereinigtes Königreich, Großbritannien"}
@@ -48,86 +52,213 @@ class AddressItem(DataItem):
     def __str__(self):
         return f'{self.fieldPath}: {self.operand}|'
 
+class AddressRecord:
+    """The address items of a row keyed by field path.
 
-def fix_forename(addressList: List[AddressItem], surnameFieldName='AdrSurNameTxt'):
-    lastItem = addressList.pop()
-    last_split_content = lastItem.operand.split(' ')
-    lastItem.operand = last_split_content[0]
-    addressList.append(lastItem)
-    addressList.append(AddressItem(surnameFieldName,' '.join(last_split_content[1:]).strip()))
+    A field can have several items, the items keep their insertion order.
+    append and pop work like on a List[AddressItem], so the parser 
+    functions accept both.
+    """
+    def __init__(self, items: List[AddressItem] = ()):
+        self.items: List[AddressItem] = []
+        self.fields: Dict[str, List[AddressItem]] = {}
+        for item in items:
+            self.append(item)
 
-def address_parse_pairs(content, addressList: List[AddressItem]):
-    p = re.compile('\s*and\s')
-    if p.match(content):
-        fix_forename(addressList)
-        m = p.match(content)
-        address_parse_title(content[m.end():], addressList, 'AdrAcademicTitlePartnerVoc', 'AdrForeNamePartnerTxt')
-        fix_forename(addressList, 'AdrSurNamePartnerTxt')
-    else:
-        addressList.append(AddressItem('AdrSurNameTxt', content.strip())) 
+    def append(self, item: AddressItem):
+        self.items.append(item)
+        self.fields.setdefault(item.fieldPath, []).append(item)
 
-def address_parse_title(content, addressList: List[AddressItem], titleFieldName='AdrAcademicTitleVoc', fornameFieldName='AdrForeNameTxt'):
-    p = re.compile('[A-Z][a-z]+\.\s') 
-    if p.match(content):
-        split_content = content.split(' ')
-        title = split_content[0].replace('a','')
-        forename = ' '.join(split_content[1:])
-        addressList.append(AddressItem(titleFieldName, title)) 
-        addressList.append(AddressItem(fornameFieldName, forename.strip())) 
-    else:
-        addressList.append(AddressItem(fornameFieldName, content.strip())) 
+    def pop(self) ->AddressItem:
+        """Remove and return the last item
+        """
+        item = self.items.pop()
+        items = self.fields[item.fieldPath]
+        items.pop()
+        if len(items) == 0:
+            del self.fields[item.fieldPath]
+        return item
 
-def parse_address_parts(content, addressList: List[AddressItem]):
-    p = re.compile('.*\n.*')
-    q = re.compile('.*,.*')
-    if not p.match(content) and not q.match(content):
-        addressList.append(AddressItem('AdrCityTxt', content.strip()))
-    else:
-        lines = [ line for line in content.split('\n') if line != ''] \
-                if p.match(content) and len([ line for line in content.split('\n') if line != '']) > 1\
-                else [ line for line in content.split(',') if line != '']
-        plz_ort = re.compile('([A-Z]-)*(.*\d)(\s)(\w*)')
+    def first(self, fieldPath: str, default='') ->str:
+        """Return the operand of the first item of fieldPath or default
+        """
+        items = self.fields.get(fieldPath)
+        return items[0].operand if items else default
+
+    def values(self, fieldPath: str) ->List[str]:
+        return [ item.operand for item in self.fields.get(fieldPath, []) ]
+
+    def select(self, fieldPaths: List[str]) ->List[AddressItem]:
+        """Return the items of fieldPaths
+        """
+        return [ item for fieldPath in fieldPaths for item in self.fields.get(fieldPath, []) ]
+
+    def __contains__(self, fieldPath: str) ->bool:
+        return fieldPath in self.fields
+
+    def __iter__(self) ->Iterator[AddressItem]:
+        return iter(self.items)
+
+    def __len__(self) ->int:
+        return len(self.items)
+
+
+class Field(namedtuple('Field', ['fieldPath', 'operand'])):
+    """A parsed address field, the operand is stripped like the operand of a DataItem
+    """
+    __slots__ = ()
+
+    def __new__(cls, fieldPath: str, operand: str):
+        return tuple.__new__(cls, (fieldPath, operand.strip()))
+
+class AddressParser:
+    """Address field parsers with precompiled patterns.
+
+    Every parser splits its field content once and appends the resulting
+    fields to a list, parse_row parses all fields of a csv row for a schema. 
+    The parsers create Field tuples, the module functions use them 
+    with AddressItems.
+    """
+    PAIR = re.compile(r'\s*and\s')
+    TITLE = re.compile(r'[A-Z][a-z]+\.\s')
+    PLZ_ORT = re.compile(r'([A-Z]-)*(.*\d)(\s)(\w*)')
+    PLZ = re.compile(r'.*\d.*')
+    EMAIL_PAIR = re.compile(r'.*@.*,.*@.*')
+
+    def __init__(self, schemas: List[SchemaItem] = ()):
+        parsers = { address_parse_title: self.title, address_parse_pairs: self.pairs, parse_address_parts: self.address_parts,\
+                update_country_information: self.country, parse_pair_emails: self.emails }
+        self.steps = [ (schema.csvField, schema.fieldPath, parsers.get(schema.testFunction, schema.testFunction)) for schema in schemas ]
+
+    def parse_row(self, row: dict) ->List[Field]:
+        """Parse the fields of a csv row
+        """
+        fields = []
+        for csvField, fieldPath, parser in self.steps:
+            content = row[csvField]
+            if parser is None:
+                fields.append(Field(fieldPath, content))
+            else:
+                parser(content, fields)
+        return fields
+
+    def address_type(self, addressList: AddressRecord, item=Field):
+        """Append the person type: couple, institution or person
+        """
+        if 'AdrForeNamePartnerTxt' in addressList:
+            addressList.append(item('AdrPersonTypeVoc', 'couple'))
+        elif '' in addressList.values('AdrForeNameTxt') and '' in addressList.values('AdrSurNameTxt'):
+            addressList.append(item('AdrPersonTypeVoc', 'institution'))
+        else:
+            addressList.append(item('AdrPersonTypeVoc', 'person'))
+
+    def parse_record(self, row: dict) ->AddressRecord:
+        """Parse a csv row into an address record with person type
+        """
+        addressList = AddressRecord(self.parse_row(row))
+        self.address_type(addressList)
+        return addressList
+
+    def split_forename(self, fields: list, surnameFieldName='AdrSurNameTxt', item=Field):
+        """Split the last field into forename and surname
+        """
+        lastItem = fields.pop()
+        forename, _, surname = lastItem.operand.partition(' ')
+        fields.append(item(lastItem.fieldPath, forename))
+        fields.append(item(surnameFieldName, surname.strip()))
+
+    def pairs(self, content: str, fields: list, item=Field):
+        m = self.PAIR.match(content)
+        if m:
+            self.split_forename(fields, item=item)
+            self.title(content[m.end():], fields, item, 'AdrAcademicTitlePartnerVoc', 'AdrForeNamePartnerTxt')
+            self.split_forename(fields, 'AdrSurNamePartnerTxt', item)
+        else:
+            fields.append(item('AdrSurNameTxt', content.strip())) 
+
+    def title(self, content: str, fields: list, item=Field, titleFieldName='AdrAcademicTitleVoc', fornameFieldName='AdrForeNameTxt'):
+        if self.TITLE.match(content):
+            title, _, forename = content.partition(' ')
+            fields.append(item(titleFieldName, title.replace('a',''))) 
+            fields.append(item(fornameFieldName, forename.strip())) 
+        else:
+            fields.append(item(fornameFieldName, content.strip())) 
+
+    def address_parts(self, content: str, fields: list, item=Field):
+        if '\n' not in content and ',' not in content:
+            fields.append(item('AdrCityTxt', content.strip()))
+            return
+        lines = [ line for line in content.split('\n') if line != '' ] if '\n' in content else []
+        if len(lines) < 2:
+            lines = [ line for line in content.split(',') if line != '' ]
         if len(lines) == 2:
-            addressList.append(AddressItem('AdrStreeTxt', lines[0]))
-            if plz_ort.match(lines[1]):
-                plz_ort_groups = plz_ort.match(lines[1]).groups()
-                addressList.append(AddressItem('AdrPostcodeTxt', plz_ort_groups[1]))
-                addressList.append(AddressItem('AdrCityTxt', plz_ort_groups[-1]))
+            fields.append(item('AdrStreeTxt', lines[0]))
+            m = self.PLZ_ORT.match(lines[1])
+            if m:
+                plz_ort_groups = m.groups()
+                fields.append(item('AdrPostcodeTxt', plz_ort_groups[1]))
+                fields.append(item('AdrCityTxt', plz_ort_groups[-1]))
             else:
-                addressList.append(AddressItem('AdrCityTxt', lines[1]))
+                fields.append(item('AdrCityTxt', lines[1]))
+        elif self.PLZ.match(lines[-1]):
+            fields.append(item('AdrPostcodeTxt', lines[-1]))
+            fields.append(item('AdrCityTxt', lines[-2]))
+            fields.append(item('AdrStreeTxt','\n'.join(lines[0:-2])))
+        elif self.PLZ.match(lines[-2]):
+            fields.append(item('AdrPostcodeTxt', lines[-2]))
+            fields.append(item('AdrCityTxt', lines[-1]))
+            fields.append(item('AdrStreeTxt','\n'.join(lines[0:-2])))
         else:
-            plz = re.compile('.*\d.*')
-            if plz.match(lines[-1]):
-                addressList.append(AddressItem('AdrPostcodeTxt', lines[-1]))
-                addressList.append(AddressItem('AdrCityTxt', lines[-2]))
-                addressList.append(AddressItem('AdrStreeTxt','\n'.join(lines[0:-2])))
-            elif plz.match(lines[-2]):
-                addressList.append(AddressItem('AdrPostcodeTxt', lines[-2]))
-                addressList.append(AddressItem('AdrCityTxt', lines[-1]))
-                addressList.append(AddressItem('AdrStreeTxt','\n'.join(lines[0:-2])))
+            m = self.PLZ_ORT.match(lines[-1])
+            if m:
+                plz_ort_groups = m.groups()
+                fields.append(item('AdrPostcodeTxt', plz_ort_groups[1]))
+                fields.append(item('AdrCityTxt', plz_ort_groups[-1]))
             else:
-                if plz_ort.match(lines[-1]):
-                    plz_ort_groups = plz_ort.match(lines[1]).groups()
-                    addressList.append(AddressItem('AdrPostcodeTxt', plz_ort_groups[1]))
-                    addressList.append(AddressItem('AdrCityTxt', plz_ort_groups[-1]))
-                else:
-                    addressList.append(AddressItem('AdrCityTxt', lines[-1]))
-                addressList.append(AddressItem('AdrStreeTxt','\n'.join(lines[0:-1])))
+                fields.append(item('AdrCityTxt', lines[-1]))
+            fields.append(item('AdrStreeTxt','\n'.join(lines[0:-1])))
+
+    def country(self, content: str, fields: list, item=Field):
+        country_key = content.strip() 
+        fields.append(item('AdrCountryVoc', COUNTRY_DICT.get(country_key, country_key)))
+
+    def emails(self, content: str, fields: list, item=Field):
+        if self.EMAIL_PAIR.match(content):
+            emails = content.split(',')
+            fields.append(item('AdrContactGrp1', emails[0].strip()))
+            fields.append(item('AdrContactGrp2', emails[1].strip()))
+        else:
+            fields.append(item('AdrContactGrp1', content))
+
+def fix_forename(addressList: List[AddressItem], surnameFieldName='AdrSurNameTxt'):
+    PARSER.split_forename(addressList, surnameFieldName, AddressItem)
+
+def address_parse_pairs(content, addressList: List[AddressItem]):
+    PARSER.pairs(content, addressList, AddressItem)
+
+def address_parse_title(content, addressList: List[AddressItem], titleFieldName='AdrAcademicTitleVoc', fornameFieldName='AdrForeNameTxt'):
+    PARSER.title(content, addressList, AddressItem, titleFieldName, fornameFieldName)
+
+def parse_address_parts(content, addressList: List[AddressItem]):
+    PARSER.address_parts(content, addressList, AddressItem)
 
 def update_country_information(content, addressList: List[AddressItem]):
-    country_key = content.strip() 
-    if country_key in COUNTRY_DICT.keys():
-        country_key = COUNTRY_DICT[country_key]
-    addressList.append(AddressItem('AdrCountryVoc', country_key))
+    PARSER.country(content, addressList, AddressItem)
 
 def parse_pair_emails(content, addressList: List[AddressItem]):
-    k = re.compile('.*@.*,.*@.*')
-    if k.match(content):
-        emails = [ email.strip() for email in content.split(',') ]
-        addressList.append(AddressItem('AdrContactGrp1', emails[0]))
-        addressList.append(AddressItem('AdrContactGrp2', emails[1]))
-    else:
-        addressList.append(AddressItem('AdrContactGrp1', content))
+    PARSER.emails(content, addressList, AddressItem)
+
+PARSER = AddressParser()
+WORKER_PARSER: AddressParser = None
+
+def init_worker(parser: AddressParser):
+    global WORKER_PARSER
+    WORKER_PARSER = parser
+
+def parse_records(rows: List[dict]) ->List[AddressRecord]:
+    """Parse a chunk of csv rows in a worker process
+    """
+    return [ WORKER_PARSER.parse_record(row) for row in rows ]
 
 class ZetcomAddressUpdates:
     """This class can be used to update address
@@ -142,6 +273,11 @@ class ZetcomAddressUpdates:
             SchemaItem('Last_Name', 'AdrSurNameTxt', address_parse_pairs), SchemaItem('Country', 'AdrCountryVoc', update_country_information), SchemaItem('Title', 'AdrFunctionVoc'),\
             SchemaItem('Address', 'AdrStreetTxt', parse_address_parts), SchemaItem('Email', 'AdrContactGrp1', parse_pair_emails)\
             ]
+    BATCH_SIZE = 50
+    CHUNK_SIZE = 500
+    PAGE_SIZE = 1000
+    SEARCH_LIMIT = 10
+    SEARCH_FIELDS = [ 'AdrOrganisationTxt', 'AdrForeNameTxt', 'AdrSurNameTxt', 'AdrPersonTypeVoc' ]
     XML_SEARCH = b'<?xml version="1.0" encoding="UTF-8"?> \
     <application xmlns="http://www.zetcom.com/ria/ws/module/search" \
                  xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" \
@@ -156,49 +292,173 @@ class ZetcomAddressUpdates:
                 </modules> \
     </application>' 
 
-    def __init__(self, schemas: List[SchemaItem], username="SimpleUserTest", server='https://mptest.kumu.swiss'): 
+    def __init__(self, schemas: List[SchemaItem], username="SimpleUserTest", server='https://mptest.kumu.swiss', password=None, batch_size=BATCH_SIZE, prefetch=False, snapshot='', snapshot_ttl=AddressIndex.DAY, quiet=False, processes=1): 
         if len(schemas) > 0:
             self.schemas = schemas
         else:
             self.schemas = self.DEFAULT_SCHEMA
         self.address_types = {}
-        self.zsession = zetcom_session.ZetcomSession(username, server)
+        self.batch_size = batch_size
+        self.quiet = quiet
+        self.processes = processes
+        self.search_tree = LET.fromstring(self.XML_SEARCH)
+        self.parser = AddressParser(self.schemas)
+        self.zsession = zetcom_session.ZetcomSession(username, server, password=password)
         self.zsession.open()
         self._init_addr_type_dict()
+        self.index = self.load_index(snapshot, snapshot_ttl) if prefetch or snapshot != '' else None
        
     def _init_addr_type_dict(self):
         """Initialize the address type dictionary
         """
         self.addr_type_dict = {}
-        namespaces = {}
-        xml_tree = self.zsession.get("/ria-ws/application/vocabulary/instances/AdrPersonTypeVgr/nodes/search")
-        namespaces['collection'] = xml_tree.nsmap[None]
-        nodes = xml_tree.xpath('//collection:collection/collection:node', namespaces=namespaces)
-        for node in nodes:
-            self.addr_type_dict[node.attrib['logicalName']] = node.attrib['id'] 
+        offset = 0
+        while True:
+            count = 0
+            for node in self.zsession.get_vocabulary_nodes('AdrPersonTypeVgr', offset=offset, limit=self.PAGE_SIZE):
+                self.addr_type_dict[node.attrib['logicalName']] = node.attrib['id'] 
+                count += 1
+            offset += count
+            if count < self.PAGE_SIZE:
+                break
 
-    def address_id(self, addressItems: List[AddressItem]) ->str:
-        """Get address id or None if it does not exist
+    def _conditions(self, addressItems: List[AddressItem]) ->tuple:
+        """Return the (fieldPath, operand) pairs an address is searched by
+        """
+        conditions = tuple([ (item.fieldPath, item.operand) for item in addressItems ])
+        if len(conditions) == 1:
+            conditions += (('AdrPersonTypeVoc', self.addr_type_dict['institution']),)
+        return conditions
+
+    def _search(self, groups: List[tuple], limit: int, offset=0, after_id=None) ->(List[dict], int):
+        """Search the addresses that match all conditions of any group, 
+        return the records and the total number of matches.
+
+        If groups is None, all addresses or those with an id greater than 
+        after_id are searched sorted by id.
         """
-        namespaces = {}
-        search_tree = LET.fromstring(self.XML_SEARCH)
-        namespaces['search'] =  search_tree.nsmap[None]
-        andNode = search_tree.xpath('//search:expert/search:and', namespaces=namespaces)[0]
-        if len(addressItems) == 1:
-            addressItems.append(AddressItem('AdrPersonTypeVoc', self.addr_type_dict['institution']))
-        for item in addressItems:
-            element = LET.Element("equalsField")
-            element.attrib['fieldPath'] = item.fieldPath
-            element.attrib['operand'] = item.operand
-            andNode.append(element)
+        search_tree = copy.deepcopy(self.search_tree)
+        namespaces = { 'search': search_tree.nsmap[None] }
+        search = search_tree.xpath('//search:search', namespaces=namespaces)[0]
+        search.attrib['limit'] = str(limit)
+        search.attrib['offset'] = str(offset)
+        select = search.xpath('search:select', namespaces=namespaces)[0]
+        for fieldPath in self.SEARCH_FIELDS:
+            field = LET.Element("field")
+            field.attrib['fieldPath'] = fieldPath
+            select.append(field)
+        andNode = search.xpath('search:expert/search:and', namespaces=namespaces)[0]
+        if groups is None:
+            if after_id is None:
+                search.remove(andNode.getparent())
+            else:
+                greater = LET.Element("greaterField")
+                greater.attrib['fieldPath'] = '__id'
+                greater.attrib['operand'] = str(after_id)
+                andNode.getparent().replace(andNode, greater)
+            sort = LET.Element("sort")
+            field = LET.SubElement(sort, "field")
+            field.attrib['fieldPath'] = '__id'
+            field.attrib['direction'] = 'Ascending'
+            select.addnext(sort)
+            groups = []
+        else:
+            orNode = LET.Element("or")
+            andNode.getparent().replace(andNode, orNode)
+        for conditions in groups:
+            groupNode = LET.SubElement(orNode, "and")
+            for fieldPath, operand in conditions:
+                element = LET.SubElement(groupNode, "equalsField")
+                element.attrib['fieldPath'] = fieldPath
+                element.attrib['operand'] = operand
         xml_string = LET.tostring(search_tree, encoding='UTF-8')
         xml = self.zsession.post('/ria-ws/application/module/Address/search', xml_string) 
         namespaces['module'] = xml.nsmap[None] 
-        if len(xml.xpath('//module:module/module:moduleItem', namespaces=namespaces)) > 0:
-            return xml.xpath('//module:module/module:moduleItem/@id', namespaces=namespaces)[0]
+        records = []
+        for item in xml.xpath('//module:module/module:moduleItem', namespaces=namespaces):
+            record = { '__id': item.get('id') }
+            for field in item.xpath('module:dataField', namespaces=namespaces):
+                record[field.get('name')] = ''.join(field.xpath('module:value/text()', namespaces=namespaces))
+            for reference in item.xpath('module:vocabularyReference', namespaces=namespaces):
+                record[reference.get('name')] = set(reference.xpath('module:vocabularyReferenceItem/@id', namespaces=namespaces))
+            records.append(record)
+        total = xml.xpath('//module:module/@totalSize', namespaces=namespaces)
+        return records, int(total[0]) if len(total) > 0 else len(records)
+
+    def prefetch(self, index: AddressIndex = None, after_id=None) ->AddressIndex:
+        """Fetch all addresses or those with an id greater than after_id 
+        page by page into an address index
+        """
+        index = index if index is not None else AddressIndex(server=self.zsession.server)
+        offset = 0
+        while True:
+            records, total = self._search(None, self.PAGE_SIZE, offset, after_id)
+            for record in records:
+                index.add(record)
+            offset += self.PAGE_SIZE
+            if not self.quiet:
+                print(Fore.MAGENTA + f'Prefetched {min(offset, total)}/{total} addresses' + Style.RESET_ALL)
+            if len(records) == 0 or offset >= total:
+                return index
+
+    def load_index(self, snapshot='', ttl=AddressIndex.DAY) ->AddressIndex:
+        """Return the address index of a snapshot that is not expired 
+        or prefetch the addresses and save them as snapshot.
+
+        Addresses created since the snapshot are added to it, if addresses 
+        were deleted all addresses are fetched again.
+        """
+        if snapshot != '' and os.path.exists(snapshot):
+            index = AddressIndex.load(snapshot)
+            if index.server == self.zsession.server and not index.expired(ttl):
+                size = len(index)
+                index = self.prefetch(index, index.max_id())
+                records, total = self._search(None, 1)
+                if total == len(index):
+                    if len(index) > size:
+                        index.save(snapshot)
+                    if not self.quiet:
+                        print(Fore.MAGENTA + f'Using address snapshot {snapshot}: {index}' + Style.RESET_ALL)
+                    return index
+        index = self.prefetch()
+        if snapshot != '':
+            index.save(snapshot)
+        return index
+
+    def address_id(self, addressItems: List[AddressItem]) ->str:
+        """Get address id or None if it does not exist
+        """
+        records, total = self._search([ self._conditions(addressItems) ], self.SEARCH_LIMIT)
+        if len(records) > 0:
+            return records[0]['__id']
         else:
             return None
 
+    def address_ids(self, search_items: List[List[AddressItem]]) ->List[str]:
+        """Get the address id or None for each list of search items.
+
+        The searches are combined into one expert search per batch and the
+        returned records are mapped back by their field values. Searches 
+        that are not resolved in a truncated result are sent one by one.
+        With a prefetched address index no searches are sent.
+        """
+        conditions = [ self._conditions(items) for items in search_items ]
+        if self.index is not None:
+            return [ self.index.lookup(group) for group in conditions ]
+        ids = {}
+        groups = list(dict.fromkeys(conditions))
+        for index in range(0, len(groups), self.batch_size):
+            batch = groups[index:index+self.batch_size]
+            records, total = self._search(batch, self.SEARCH_LIMIT*len(batch))
+            for group in batch:
+                found = [ record['__id'] for record in records if matches(record, group) ]
+                if len(found) > 0:
+                    ids[group] = found[0]
+                elif total > len(records):
+                    records_of_group, _ = self._search([ group ], self.SEARCH_LIMIT)
+                    ids[group] = records_of_group[0]['__id'] if len(records_of_group) > 0 else None
+        return [ ids.get(group) for group in conditions ]
+
     def close(self):
         self.zsession.close()
 
@@ -211,54 +471,38 @@ class ZetcomAddressUpdates:
         else:
             testFunction(operand, addressList)
             
-    def append_address_type(self, addressList: List[AddressItem]):
-        partnerField = 'AdrForeNamePartnerTxt'
-        if len([ item for item in addressList if item.fieldPath == partnerField ]) > 0:
-            addressList.append(AddressItem('AdrPersonTypeVoc', 'couple'))
-        elif len([ item for item in addressList if item.fieldPath == 'AdrForeNameTxt' and item.operand == '' ]) > 0 \
-                and len([ item for item in addressList if item.fieldPath == 'AdrSurNameTxt' and item.operand == '' ]) > 0:
-            addressList.append(AddressItem('AdrPersonTypeVoc', 'institution'))
-        else:
-            addressList.append(AddressItem('AdrPersonTypeVoc', 'person'))
+    def append_address_type(self, addressList: AddressRecord):
+        self.parser.address_type(addressList, AddressItem)
 
-    def get_search_items(self, addressList: List[AddressItem]) -> List[AddressItem]:
-        if len([item for item in addressList if item.fieldPath == 'AdrPersonTypeVoc' and item.operand == 'institution']) == 1:
-            return [item for item in addressList if item.fieldPath == 'AdrOrganisationTxt']
+    def get_search_items(self, addressList: AddressRecord) -> List[AddressItem]:
+        if addressList.values('AdrPersonTypeVoc').count('institution') == 1:
+            return addressList.select(['AdrOrganisationTxt'])
         else:
-            fieldPaths = ['AdrOrganisationTxt', 'AdrForeNameTxt', 'AdrSurNameTxt']
-            return [item for item in addressList if item.fieldPath in fieldPaths]
+            return addressList.select(['AdrOrganisationTxt', 'AdrForeNameTxt', 'AdrSurNameTxt'])
 
     def process_file(self, csvFile: str, targetFile='') ->int:
+        """Look up the addresses of csvFile and write the new ones to targetFile 
+        as soon as they are resolved, the ids of existing ones to a .txt file
+        """
         output_rows: List[dict]  = []
         output_existing_ids = []
+        writeFile = open(targetFile, 'w', newline='') if targetFile != '' else None
+        writer = None
+        if writeFile is not None:
+            writer = csv.DictWriter(writeFile, fieldnames=[ schema.csvField for schema in self.OUTPUT_SCHEMA ])
+            writer.writeheader()
         with open(csvFile, newline='') as openFile: 
-            reader = csv.DictReader(openFile)
-            ignoreString = 'Source not yet identified'
-            lastInstitution = ''
-            lastName = ''
-            counter = 0
-            for row in reader:
-                addressList: List[AddressItem] = []
-                if not row['Institution'].startswith(ignoreString) and row['Institution'] != lastInstitution and row['First_Name'].strip() + row['Last_Name'].strip() != lastName:
-                    lastInstitution = row['Institution']
-                    lastName = row['First_Name'].strip() + row['Last_Name'].strip()
-                    for schema in self.schemas:
-                        self.append_address_item(row, schema, addressList)
-                    self.append_address_type(addressList)
-                    search_items = self.get_search_items(addressList)
-                    addr_id = self.address_id(search_items)
-                    if addr_id is None:
-                        self.print_row(addressList, output_rows)
-                    else:
-                        output_existing_ids.append(addr_id)
-                    counter += 1
-        if targetFile != '':
-            with open(targetFile, 'w', newline='') as writeFile:
-                fieldnames = [ schema.csvField for schema in self.OUTPUT_SCHEMA ] 
-                writer = csv.DictWriter(writeFile, fieldnames=fieldnames)
-                writer.writeheader()
-                for row in output_rows:
-                    writer.writerow(row)
+            pending = []
+            for addressList in self.parse_records(self.accepted_rows(csv.DictReader(openFile))):
+                pending.append((addressList, self.get_search_items(addressList)))
+                if len(pending) >= self.batch_size:
+                    self._resolve(pending, output_rows, output_existing_ids)
+                    pending = []
+                    output_rows = self._write_rows(writer, output_rows)
+            self._resolve(pending, output_rows, output_existing_ids)
+            self._write_rows(writer, output_rows)
+        if writeFile is not None:
+            writeFile.close()
         if len(output_existing_ids) > 0:
             id_file = targetFile.replace('.csv','.txt')
             with open(id_file, 'a') as writeIdFile:
@@ -266,18 +510,68 @@ class ZetcomAddressUpdates:
                     writeIdFile.write(old_addr_id + '\n')
         return 0
 
-    def print_row(self, addressList: List[AddressItem], output_rows: List[dict]):
-        addressDict = {}
-        for schema in self.OUTPUT_SCHEMA:
-            item = [ item for item in addressList if item.fieldPath == schema.fieldPath ]
-            if len(item) > 0:
-                addressDict[schema.csvField] = item[0].operand
-                print(f'\"{item[0].operand}\"', end=",")
+    def accepted_rows(self, reader: Iterator[dict]) ->Iterator[dict]:
+        """Yield the rows that are not ignored and not the same institution or name as the last accepted row
+        """
+        ignoreString = 'Source not yet identified'
+        lastInstitution = ''
+        lastName = ''
+        for row in reader:
+            if not row['Institution'].startswith(ignoreString) and row['Institution'] != lastInstitution and row['First_Name'].strip() + row['Last_Name'].strip() != lastName:
+                lastInstitution = row['Institution']
+                lastName = row['First_Name'].strip() + row['Last_Name'].strip()
+                yield row
+
+    def parse_records(self, rows: Iterator[dict]) ->Iterator[AddressRecord]:
+        """Parse rows into address records in input order.
+
+        With more than one process the rows are parsed in chunks by a 
+        process pool, a few chunks per process are parsed ahead. Custom
+        schema testFunctions must then be module level functions.
+        """
+        if self.processes <= 1:
+            for row in rows:
+                yield self.parser.parse_record(row)
+            return
+        with ProcessPoolExecutor(max_workers=self.processes, initializer=init_worker, initargs=(self.parser,)) as executor:
+            pending = deque()
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= self.CHUNK_SIZE:
+                    pending.append(executor.submit(parse_records, chunk))
+                    chunk = []
+                    if len(pending) >= 2*self.processes:
+                        yield from pending.popleft().result()
+            if len(chunk) > 0:
+                pending.append(executor.submit(parse_records, chunk))
+            while len(pending) > 0:
+                yield from pending.popleft().result()
+
+    def _resolve(self, pending: List[tuple], output_rows: List[dict], output_existing_ids: List[str]):
+        """Look up a batch of (addressList, search items) and output new rows or existing ids in input order
+        """
+        if len(pending) == 0:
+            return
+        for (addressList, search_items), addr_id in zip(pending, self.address_ids([ search_items for addressList, search_items in pending ])):
+            if addr_id is None:
+                self.print_row(addressList, output_rows)
             else:
-                addressDict[schema.csvField] = "" 
-                print('\"\"', end=",")
+                output_existing_ids.append(addr_id)
+
+    def _write_rows(self, writer: csv.DictWriter, output_rows: List[dict]) ->List[dict]:
+        """Write the rows if there is a writer and return the rows that are kept
+        """
+        if writer is None:
+            return output_rows
+        writer.writerows(output_rows)
+        return []
+
+    def print_row(self, addressList: AddressRecord, output_rows: List[dict]):
+        addressDict = { schema.csvField: addressList.first(schema.fieldPath) for schema in self.OUTPUT_SCHEMA }
         output_rows.append(addressDict)
-        print()
+        if not self.quiet:
+            print(','.join([ f'\"{value}\"' for value in addressDict.values() ]) + ',')
 
 def print_address_fields(counter, addressList: List[AddressItem]):
     print(str(counter) + "|", end='')
@@ -311,8 +605,14 @@ def main(argv):
 
         OPTIONS:
         -h|--help                      show help
+        -b|--batch-size                look up this many addresses with one search (default: 50)
         -f|--file                      input csv file 
+        -i|--index                     address snapshot file, reused until it expires (implies --prefetch)
+        --index-ttl                    hours until the address snapshot expires (default: 24)
         -o|--output                    output csv file
+        -p|--prefetch                  fetch all addresses once and check for duplicates locally
+        -w|--workers                   number of processes that parse the csv rows (default: 1)
+        -q|--quiet                     do not print the new addresses
         -s|--server + mplus:           provide mplus address
         -u|--user:                     provide username as email address
     
@@ -323,8 +623,14 @@ def main(argv):
     xml_file = ''
     csv_file = ''
     output_file = ''
+    batch_size = ZetcomAddressUpdates.BATCH_SIZE
+    prefetch = False
+    snapshot = ''
+    snapshot_ttl = 24
+    quiet = False
+    processes = 1
     try:
-        opts, args = getopt.getopt(argv, "hf:o:s:u:x:", ["help", "file=","output=","server=", "user=", "xml="])
+        opts, args = getopt.getopt(argv, "hb:f:i:o:pqs:u:w:x:", ["help", "batch-size=", "file=", "index=", "index-ttl=", "output=", "prefetch", "quiet", "server=", "user=", "workers=", "xml="])
     except getopt.GetoptError:
         usage()
         return 2
@@ -332,8 +638,20 @@ def main(argv):
         if opt in ('-h', '--help'):
             usage()
             return 0
+        elif opt in ('-b', '--batch-size'):
+            batch_size = int(arg)
         elif opt in ('-f', '--file'):
             csv_file = arg
+        elif opt in ('-i', '--index'):
+            snapshot = arg
+        elif opt == '--index-ttl':
+            snapshot_ttl = float(arg)
+        elif opt in ('-p', '--prefetch'):
+            prefetch = True
+        elif opt in ('-q', '--quiet'):
+            quiet = True
+        elif opt in ('-w', '--workers'):
+            processes = int(arg)
         elif opt in ('-o', '--output'):
             output_file = arg
         elif opt in ('-s', '--server'):
@@ -344,7 +662,7 @@ def main(argv):
             xml_file = arg
     if csv_file != '':
         output_file = output_file if output_file != '' else 'address_output_' + csv_file
-        address = ZetcomAddressUpdates([], username, zetcom_server)
+        address = ZetcomAddressUpdates([], username, zetcom_server, batch_size=batch_size, prefetch=prefetch, snapshot=snapshot, snapshot_ttl=snapshot_ttl*60*60, quiet=quiet, processes=processes)
         address.process_file(csv_file, output_file)
         address.close()
         #return process_file(csv_file)
@@ -16,7 +16,9 @@
 #
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <https://www.gnu.org/licenses/> 1}}}
+from collections import deque
 from colorama import Fore, Style
+from concurrent.futures import ThreadPoolExecutor
 import csv
 import getpass
 import getopt
@@ -32,14 +34,63 @@ import urllib.parse
 import xml.dom.minidom as MD
 from xml.etree import ElementTree
 import lxml.etree as LET
+from operator import attrgetter
 import zetcom_session
-from artist_api import Artist
+from artist_api import Artist, ArtistRegistry, schema_accessors
+from artist_cache import ArtistCache
+from journal import Journal
+from local_authority import LocalAuthority, ULAN, WIKIDATA
+from metrics import MetricsRegistry
 from getty_artist import Getty
 from wikidata_artist import Wikidata
 from zetcom_session import DataItem, SchemaItem
-from typing import List
+from typing import Iterable, Iterator, List
 
 DEBUG = False 
+UNKNOWN_FILE = 'unknown_artists.csv'
+UNKNOWN_SCHEMA: List[SchemaItem] = [SchemaItem('Name','name'), SchemaItem('Lebte vor', 'livedBefore'), SchemaItem('Lebte nach', 'livedAfter')]
+
+def is_known(row: dict) ->bool:
+    """Return whether a row contains more than the input name
+    """
+    return len([ key for key in row.keys() if key != 'Input' ]) > 0
+
+class ArtistWriter:
+    """This class writes artists to csv files as soon as they are processed.
+
+    The output files are only created when the first row is written,
+    every row is flushed immediately.
+    """
+    def __init__(self, output_file: str, existing_out: str, output_schema: List[SchemaItem], existing_schema: List[SchemaItem], unknown_file=UNKNOWN_FILE):
+        self.targets = { 'new': (output_file, output_schema), 'existing': (existing_out, existing_schema), 'unknown': (unknown_file, UNKNOWN_SCHEMA) }
+        self.accessors = { status: schema_accessors(schema) for status, (target_file, schema) in self.targets.items() }
+        self.files = {}
+        self.writers = {}
+
+    def _writer(self, status: str) ->csv.DictWriter:
+        if status not in self.writers:
+            target_file, schema = self.targets[status]
+            self.files[status] = open(target_file, 'w', newline='')
+            self.writers[status] = csv.DictWriter(self.files[status], fieldnames=[ item.csvField for item in schema ])
+            self.writers[status].writeheader()
+        return self.writers[status]
+
+    def write(self, artist: Artist, status: str):
+        """Write artist as new, existing or unknown artist
+        """
+        if self.targets[status][0] == '':
+            return
+        row = artist.asrow(self.targets[status][1], self.accessors[status])
+        if status == 'new' and not is_known(row):
+            print(f'Unknown artist: {artist.name}')
+            status = 'unknown'
+            row = artist.asrow(UNKNOWN_SCHEMA, self.accessors[status])
+        self._writer(status).writerow(row)
+        self.files[status].flush()
+
+    def close(self):
+        for openFile in self.files.values():
+            openFile.close()
        
 
 class ZetcomArtistUpdate:
@@ -50,70 +101,262 @@ class ZetcomArtistUpdate:
             SchemaItem('Daten1_Ort','placeOfBirth'),SchemaItem('Daten2_Ort','placeOfDeath'), SchemaItem('Zeitraum','epoche'),\
             SchemaItem('Lebensdaten','life_data'),SchemaItem('Input','input_name'),SchemaItem('Website', 'link')]
     EXISTING_SCHEMA: List[SchemaItem] = [ SchemaItem('ID','id'), SchemaItem('Person','name'), SchemaItem('Input','input_name')]
+    STREAM_CHUNK_SIZE = 500
 
-    def __init__(self, username="SimpleUserTest", server='https://mptest.kumu.swiss'): 
-        self.zsession = zetcom_session.ZetcomSession(username, server)
+    def __init__(self, username="SimpleUserTest", server='https://mptest.kumu.swiss', batch_size=1, cache: ArtistCache = None, workers=1, journal: Journal = None, stream=False, authority='', password=None, metrics: MetricsRegistry = None, rate: float = None, burst: int = None): 
+        self.batch_size = batch_size
+        self.workers = workers
+        self.journal = journal
+        self.stream = stream
+        self.writer = None
+        self.failed = 0
+        self.cache = cache
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.zsession = zetcom_session.ZetcomSession(username, server, password=password, metrics=self.metrics)
         self.zsession.open()
-        self.getty = Getty()
-        self.wikidata = Wikidata()
+        if authority != '':
+            self.getty = LocalAuthority(authority, ULAN, max_workers=workers, metrics=self.metrics)
+            self.wikidata = LocalAuthority(authority, WIKIDATA, max_workers=workers, metrics=self.metrics)
+        else:
+            limits = { key: value for key, value in (('rate', rate), ('burst', burst)) if value is not None }
+            self.getty = Getty(cache=cache, max_workers=workers, metrics=self.metrics, **limits)
+            self.wikidata = Wikidata(cache=cache, max_workers=workers, metrics=self.metrics, **limits)
        
     def close(self):
         self.zsession.close()
+        if self.cache is not None:
+            print(f'Cache {self.cache}')
+            self.cache.close()
+        if self.journal is not None:
+            self.journal.close()
+
+    def _finished(self, artist: Artist, status: str, artists: ArtistRegistry, completed=True):
+        """Collect or write a processed artist and record it in the journal.
+
+        Artists whose queries did not complete are recorded as failed and 
+        written as unknown artists, they are queried again on resume.
+        """
+        if artist in artists:
+            return
+        if not completed:
+            self.failed += 1
+            status = 'failed'
+        if self.journal is not None:
+            self.journal.append({ 'key': artist.name, 'status': status, 'artist': artist.asdict() })
+        if self.writer is None:
+            artists.add(artist)
+        else:
+            self.writer.write(artist, status if completed else 'unknown')
+
+    def read_journal(self) ->dict:
+        """Return the last journal record for each artist name
+        """
+        records = {}
+        if self.journal is not None:
+            for record in self.journal.records():
+                records[record['key']] = record
+        return records
+
+    def artists_from_journal(self) ->(ArtistRegistry, ArtistRegistry, ArtistRegistry):
+        """Return the new, the existing and the failed artists recorded in the journal
+        """
+        new_artists = ArtistRegistry()
+        existing_artists = ArtistRegistry()
+        failed_artists = ArtistRegistry()
+        records = self.read_journal()
+        for key in sorted(records.keys()):
+            artist = Artist.from_dict(records[key]['artist'])
+            if records[key]['status'] == 'existing':
+                existing_artists.add(artist)
+            elif records[key]['status'] == 'failed':
+                failed_artists.add(artist)
+            else:
+                new_artists.add(artist)
+        return new_artists, existing_artists, failed_artists
 
-    def process_api(self, artist: Artist, new_artists: List[Artist]) ->int:
+    def process_api(self, artist: Artist, new_artists: ArtistRegistry) ->int:
         exit_code = 0
         print(f'Getty update: {artist.name}')
-        exit_code = self.getty.query_artist(artist)
+        getty_code = self.getty.query_artist(artist)
         print(f'Wikidata update: {artist.name}')
         exit_code = self.wikidata.query_artist(artist)
-        if len([ item for item in new_artists if item.name == artist.name]) == 0:
-            new_artists.append(artist)
+        self._finished(artist, 'new', new_artists, getty_code == 0 and exit_code == 0)
         return exit_code
 
-    def process_file(self, csvFile: str, output_file='', existing_out='') ->int:
-        new_artists: List[Artist]  = []
-        existing_artists: List[Artist] = []
-        unknown_artists: List[Artist] = []
-        artists = {}
+    def process_api_batches(self, artists: List[Artist], new_artists: ArtistRegistry) ->int:
+        """Query Getty and Wikidata with one query per batch of artists
+        """
+        exit_code = 0
+        for index in range(0, len(artists), self.batch_size):
+            batch = artists[index:index+self.batch_size]
+            failed: List[Artist] = []
+            print(f'Getty update: artists {index+1}-{index+len(batch)} of {len(artists)}')
+            getty_code = self.getty.query_artists(batch, self.batch_size, failed)
+            print(f'Wikidata update: artists {index+1}-{index+len(batch)} of {len(artists)}')
+            exit_code = self.wikidata.query_artists(batch, self.batch_size, failed)
+            interrupted = getty_code in (403, 429) or exit_code in (403, 429)
+            for artist in batch:
+                self._finished(artist, 'new', new_artists, not interrupted and artist not in failed)
+            if exit_code == 429:
+                break
+        return exit_code
+
+    def process_api_pipeline(self, artists: List[Artist], new_artists: ArtistRegistry) ->int:
+        """Query Getty and Wikidata concurrently for many artists at once.
+
+        Responses are merged into the artists in input order, Getty before Wikidata.
+        At most a few queries per worker are submitted ahead of the merge.
+        Workers hide the latency of the queries, the throughput is still bounded
+        by the rate limiter of each api (see --rate and --burst).
+        """
+        exit_code = 0
+        max_workers = self.getty.max_workers + self.wikidata.max_workers
+        print(f'Getty: {self.getty.limiter}, Wikidata: {self.wikidata.limiter}')
+        pending = deque()
+        remaining = iter(artists)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                for artist in remaining:
+                    pending.append((artist, self.getty.submit_artist(executor, artist), self.wikidata.submit_artist(executor, artist)))
+                    if len(pending) >= 4*max_workers:
+                        break
+                if len(pending) == 0:
+                    break
+                artist, getty_future, wikidata_future = pending.popleft()
+                print(f'Getty/Wikidata update: {artist.name}')
+                getty_code = self.getty.process_future(getty_future, artist)
+                exit_code = self.wikidata.process_future(wikidata_future, artist)
+                self._finished(artist, 'new', new_artists, getty_code == 0 and exit_code == 0)
+                if exit_code == 429:
+                    for item in pending:
+                        item[1].cancel()
+                        item[2].cancel()
+                    break
+        return exit_code
+
+    def process_artists(self, artists: List[Artist], new_artists: ArtistRegistry) ->int:
+        """Query the apis for artists in batches, concurrently or one by one
+        """
+        if self.batch_size > 1:
+            return self.process_api_batches(artists, new_artists)
+        if self.workers > 1:
+            return self.process_api_pipeline(artists, new_artists)
+        exit_code = 0
+        for artist in artists:
+            exit_code = self.process_api(artist, new_artists)
+            if exit_code == 429:
+                break
+        return exit_code
+
+    def read_rows(self, csvFile: str) ->Iterator[tuple]:
+        """Yield the (input name, date strings, replace) of each artist in the rows of csvFile,
+        with replace the artist replaces an artist with the same name
+        """
         with open(csvFile, newline='') as openFile: 
             reader = csv.DictReader(openFile)
             header = list(dict(next(reader)).keys())
-            print('Creating dictionary ...')
             if "Name" in header and "Vor" in header and "Nach" in header:
                 for row in reader:
-                    name = row["Name"]
-                    key = Artist.parse_name(name)
-                    artists[key] = Artist(name, self.zsession)
-                    artists[key].addDate(row['Vor'])
-                    artists[key].addDate(row['Nach'])
+                    yield row["Name"], [ row['Vor'], row['Nach'] ], True
             else:
                 unkown = 'Unknown'
-                counter = 0
                 for row in reader:
                     name = row['Artist'].strip() if not row['Artist'].startswith(unkown) else 'unbekannt'
                     for input_name in name.split(' and '):
-                        key = Artist.parse_name(input_name)
-                        if key not in artists.keys():
-                            artists[key] = Artist(input_name, self.zsession)
-                            artists[key].addDate(row['Date'])
-                        else:
-                            artists[key].addDate(row['Date'])
-            print('Processing artists ...')
-            for key in sorted(artists.keys()):
-                currentArtist = artists[key]
-                if currentArtist.id is None:
-                    exit_code = self.process_api(currentArtist, new_artists)
-                    if exit_code == 429:
-                        break
-                else:
-                    existing_artists.append(currentArtist)
-                    print(f'Exists: {currentArtist.name}')
+                        yield input_name, [ row['Date'] ], False
+
+    def _add_row(self, artists: ArtistRegistry, input_name: str, dates: List[str], replace: bool) ->Artist:
+        key = Artist.parse_name(input_name)
+        if replace or key not in artists:
+            artists.add(Artist(input_name, self.zsession, False), replace=True)
+        artist = artists.get(key)
+        for dateStr in dates:
+            artist.addDate(dateStr)
+        return artist
+
+    def process_chunk(self, artists: List[Artist], finished: dict, new_artists: ArtistRegistry, existing_artists: ArtistRegistry) ->int:
+        """Look up the existing artists and query the apis for the others
+        """
+        print('Looking up existing artists ...')
+        Artist.update_ids(artists, self.zsession)
+        print('Processing artists ...')
+        query_artists: List[Artist] = []
+        for currentArtist in sorted(artists, key=attrgetter('name')):
+            if currentArtist.name in finished:
+                print(f'Resumed: {currentArtist.name}')
+                if self.writer is not None:
+                    self.writer.write(Artist.from_dict(finished[currentArtist.name]['artist']), finished[currentArtist.name]['status'])
+            elif currentArtist.id is None:
+                query_artists.append(currentArtist)
+            else:
+                self._finished(currentArtist, 'existing', existing_artists)
+                print(f'Exists: {currentArtist.name}')
+        return self.process_artists(query_artists, new_artists)
+
+    def stream_file(self, csvFile: str, finished: dict) ->int:
+        """Read csvFile twice: first the row of the last occurrence of every name,
+        then the artists, which are processed in chunks as soon as their last row
+        was read and are released after they are written
+        """
+        last_rows = {}
+        for index, (input_name, dates, replace) in enumerate(self.read_rows(csvFile)):
+            last_rows[Artist.parse_name(input_name)] = index
+        artists = ArtistRegistry()
+        complete: List[Artist] = []
+        exit_code = 0
+        for index, row in enumerate(self.read_rows(csvFile)):
+            artist = self._add_row(artists, *row)
+            if last_rows[artist.name] == index:
+                complete.append(artist)
+            if len(complete) >= self.STREAM_CHUNK_SIZE:
+                exit_code = self.process_chunk(complete, finished, ArtistRegistry(), ArtistRegistry())
+                if exit_code == 429:
+                    return exit_code
+                for artist in complete:
+                    artists.discard(artist)
+                complete = []
+        if len(complete) > 0:
+            exit_code = self.process_chunk(complete, finished, ArtistRegistry(), ArtistRegistry())
+        return exit_code
+
+    def process_file(self, csvFile: str, output_file='', existing_out='', resume=False, unknown_file=UNKNOWN_FILE) ->int:
+        """Look up the artists of csvFile and write them as new, existing or unknown artists.
+
+        In stream mode the input file is read incrementally and every artist 
+        is written and released as soon as it is processed.
+        Artists whose Getty/Wikidata queries failed are written as unknown artists.
+        """
+        self.failed = 0
+        new_artists = ArtistRegistry()
+        existing_artists = ArtistRegistry()
+        unknown_artists = ArtistRegistry()
+        finished = { key: record for key, record in self.read_journal().items() if record['status'] != 'failed' } if resume else {}
+        if self.stream:
+            self.writer = ArtistWriter(output_file, existing_out, self.OUTPUT_SCHEMA, self.EXISTING_SCHEMA, unknown_file)
+            print('Streaming artists ...')
+            self.stream_file(csvFile, finished)
+        else:
+            artists = ArtistRegistry()
+            print('Creating dictionary ...')
+            for row in self.read_rows(csvFile):
+                self._add_row(artists, *row)
+            self.process_chunk(list(artists), finished, new_artists, existing_artists)
+        if self.failed > 0:
+            print(Fore.RED + f'Queries failed for {self.failed} artists, they are written to {unknown_file}, use --resume to query them again!' + Style.RESET_ALL)
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            return 0
+        if self.journal is not None:
+            new_artists, existing_artists, failed_artists = self.artists_from_journal()
+            for artist in failed_artists:
+                unknown_artists.add(artist)
         if len(new_artists) > 0 and output_file != '':
             self.write_artists(new_artists, output_file, self.OUTPUT_SCHEMA, unknown_artists)
         if len(existing_artists) > 0 and existing_out != '':
             self.write_artists(existing_artists, existing_out, self.EXISTING_SCHEMA)
         if len(unknown_artists) > 0:
-            self.write_artists(unknown_artists, 'unknown_artists.csv', [SchemaItem('Name','name'), SchemaItem('Lebte vor', 'livedBefore'), SchemaItem('Lebte nach', 'livedAfter')])
+            self.write_artists(unknown_artists, unknown_file, UNKNOWN_SCHEMA)
         return 0
 
     def update_file(self, csvFile: str) ->int:
@@ -124,30 +367,28 @@ class ZetcomArtistUpdate:
             for row in reader:
                 artist = Artist('', None, False)
                 for schema in self.OUTPUT_SCHEMA:
-                    try:
-                        artist.__dict__[schema.fieldPath] = row[schema.csvField]
-                    except Exception as e:
-                        artist.__dict__[schema.fieldPath] = ''
+                    setattr(artist, schema.fieldPath, row.get(schema.csvField, ''))
                 artist.update()
                 artists.append(artist)
         self.write_artists(artists, csvFile, self.OUTPUT_SCHEMA)
         return 0
 
-    def write_artists(self, artists: List[Artist], target_file: str, schema: List[SchemaItem], unknown=None):
+    def write_artists(self, artists: Iterable[Artist], target_file: str, schema: List[SchemaItem], unknown: ArtistRegistry = None):
         """Write data to csv file
         """
-        with open(target_file, 'w', newline='') as writeFile:
+        with self.metrics.timer('csv_write_seconds'), open(target_file, 'w', newline='') as writeFile:
             fieldnames = [ item.csvField for item in schema ] 
             writer = csv.DictWriter(writeFile, fieldnames=fieldnames)
             writer.writeheader()
+            accessors = schema_accessors(schema)
             for artist in artists:
-                row = artist.asrow(schema)
-                if len([ key for key in row.keys() if key != 'Input' ]) > 0:
+                row = artist.asrow(schema, accessors)
+                if is_known(row):
                     writer.writerow(row)  
                 elif unknown is not None:
                     print(f'Unknown artist: {artist.name}')
                     artist.update()
-                    unknown.append(artist)
+                    unknown.add(artist)
 
 def usage():
     """prints information on how to use the script
@@ -161,12 +402,24 @@ def main(argv):
 
         OPTIONS:
         -h|--help                      show help
+        -a|--resume                    skip artists that are finished in the journal
+        -b|--batch-size                query Getty/Wikidata for this many artists at once
+        --burst                        Getty/Wikidata requests that may be sent at once (default: Getty 4, Wikidata 2)
+        -c|--cache                     sqlite file for caching Getty/Wikidata responses
+        --cache-ttl                    days until cached responses expire (default: 30, responses without results: 1)
+        --no-cache                     do not read or write the cache
         -e|--existing-out              output csv file for existing ids
         -f|--file                      input csv file 
+        -j|--journal                   checkpoint journal (default: journal_<file>.jsonl)
+        -l|--local                     use a local authority index (see local_authority.py) instead of Getty/Wikidata
+        -m|--metrics                   print a metrics summary and export it to a .json or Prometheus text file
         -o|--output                    output csv file
         -r|--refresh                   update csv file with missing data
+        --rate                         Getty/Wikidata requests per second (default: Getty 2, Wikidata 1)
         -s|--server + mplus:           provide mplus address
+        -t|--stream                    read the input incrementally and write each artist as soon as it is processed
         -u|--user:                     provide username 
+        -w|--workers                   number of concurrent queries per api, the requests per second are still bounded by --rate
     
         :return: exit code (int)
     """
@@ -177,8 +430,20 @@ def main(argv):
     output_file = ''
     existing_out = ''
     update = False
+    batch_size = 1
+    cache_file = 'artist_cache.sqlite'
+    cache_ttl = 30
+    bypass_cache = False
+    workers = 1
+    journal_file = ''
+    resume = False
+    stream = False
+    authority = ''
+    metrics_file = ''
+    rate = None
+    burst = None
     try:
-        opts, args = getopt.getopt(argv, "he:f:o:rs:u:x:", ["help", "existing-out=","file=","output=","refresh","server=", "user=", "xml="])
+        opts, args = getopt.getopt(argv, "hab:c:e:f:j:l:m:o:rs:tu:w:x:", ["help", "resume", "journal=", "local=", "metrics=", "batch-size=", "burst=", "cache=", "cache-ttl=", "no-cache", "existing-out=","file=","output=","rate=","refresh","server=", "stream", "user=", "workers=", "xml="])
     except getopt.GetoptError:
         usage()
         return 2
@@ -186,28 +451,58 @@ def main(argv):
         if opt in ('-h', '--help'):
             usage()
             return 0
+        elif opt in ('-a', '--resume'):
+            resume = True
+        elif opt in ('-j', '--journal'):
+            journal_file = arg
+        elif opt in ('-l', '--local'):
+            authority = arg
+        elif opt in ('-m', '--metrics'):
+            metrics_file = arg
+        elif opt in ('-b', '--batch-size'):
+            batch_size = int(arg)
+        elif opt == '--burst':
+            burst = int(arg)
+        elif opt in ('-c', '--cache'):
+            cache_file = arg
+        elif opt == '--cache-ttl':
+            cache_ttl = int(arg)
+        elif opt == '--no-cache':
+            bypass_cache = True
         elif opt in ('-e', '--existing-out'):
             existing_out = arg
         elif opt in ('-f', '--file'):
             csv_file = arg
+        elif opt == '--rate':
+            rate = float(arg)
         elif opt in ('-r', '--refresh'):
             update = True
         elif opt in ('-o', '--output'):
             output_file = arg
         elif opt in ('-s', '--server'):
             zetcom_server = arg
+        elif opt in ('-t', '--stream'):
+            stream = True
         elif opt in ('-u', '--user'):
             username = arg
+        elif opt in ('-w', '--workers'):
+            workers = int(arg)
         elif opt in ('-x', '--xml'):
             xml_file = arg
     if csv_file != '':
-        artist = ZetcomArtistUpdate(username, zetcom_server)
+        cache = ArtistCache(cache_file, cache_ttl*ArtistCache.DAY) if not bypass_cache else None
+        journal = None
+        if not update:
+            journal_file = journal_file if journal_file != '' else 'journal_' + csv_file + '.jsonl'
+            journal = Journal(journal_file, truncate=not resume)
+        metrics = MetricsRegistry(metrics_file, verbose=metrics_file != '')
+        artist = ZetcomArtistUpdate(username, zetcom_server, batch_size, cache, workers, journal, stream, authority, metrics=metrics, rate=rate, burst=burst)
         if update:
             artist.update_file(csv_file)
         else:
             output_file = output_file if output_file != '' else 'artist_output_' + csv_file
             existing_out = existing_out if existing_out != '' else 'existing_' + zetcom_server.split('//')[1].replace('.','-') + '.csv'
-            artist.process_file(csv_file, output_file, existing_out)
+            artist.process_file(csv_file, output_file, existing_out, resume)
         artist.close()
         #return process_file(csv_file)
     else:
@@ -16,20 +16,27 @@
 #
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <https://www.gnu.org/licenses/> 1}}}
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import getpass
 import getopt
 import glob
+import io
 import json
 import keyring
 import keyring.util.platform_ as keyring_platform
 import os
+import random
 import requests
+from requests.adapters import HTTPAdapter
 import sys
+import time
 import urllib.parse
 import xml.dom.minidom as MD
 from xml.etree import ElementTree
 import lxml.etree as LET
-from typing import List
+from metrics import MetricsRegistry, endpoint
+from typing import Iterator, List
 
 DEBUG = False 
 GENDER_DICT = { 'male': 'männlich',\
@@ -65,18 +72,89 @@ class SchemaItem:
 
 class ZetcomSession:
     """A zetcom session class.
+
+    All requests go through a pooled, retrying transport: GET, PUT and DELETE
+    requests are retried with exponential backoff and jitter on 429/5xx
+    responses and on connection errors, POST requests are sent only once.
+    Counts, latencies, bytes and retries of all requests are recorded in
+    metrics, its summary is dumped when the session is closed.
     """
-    def __init__(self, username="SimpleUserTest", server='https://mptest.kumu.swiss'): 
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+    IDEMPOTENT_METHODS = ('GET', 'PUT', 'DELETE')
+
+    def __init__(self, username="SimpleUserTest", server='https://mptest.kumu.swiss', pool_size=10, connect_timeout=10, read_timeout=120, retries=5, backoff_factor=1.0, max_backoff=60, password=None, metrics: MetricsRegistry = None): 
         self.server = server
         self.username = username
+        self.password = password
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         self.key = None
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+
+    def _backoff(self, attempt: int, response=None) ->float:
+        """Return the number of seconds to wait before retry attempt.
+
+        A Retry-After header of the response is honoured, otherwise 
+        exponential backoff with full jitter is used.
+        """
+        if response is not None and 'Retry-After' in response.headers:
+            try:
+                return min(float(response.headers['Retry-After']), self.max_backoff)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_backoff, self.backoff_factor * (2 ** attempt)))
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request through the pooled transport and retry idempotent requests.
+        Str bodies are sent utf-8 encoded, so their bytes are counted.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        if isinstance(kwargs.get('data'), str):
+            kwargs['data'] = kwargs['data'].encode('utf-8')
+        retries = self.retries if method in self.IDEMPOTENT_METHODS else 0
+        path = endpoint(url)
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.metrics.inc('ria_errors_total', method=method, endpoint=path, error=e.__class__.__name__)
+                if attempt >= retries:
+                    raise e
+                wait = self._backoff(attempt)
+            else:
+                self.metrics.observe('ria_request_seconds', time.perf_counter() - start, method=method, endpoint=path)
+                self.metrics.inc('ria_requests_total', method=method, endpoint=path, status=str(response.status_code))
+                self.metrics.inc('ria_bytes_total', len(kwargs.get('data') or b''), direction='sent')
+                self.metrics.inc('ria_bytes_total', len(response.content), direction='received')
+                if response.status_code not in self.RETRY_STATUS or attempt >= retries:
+                    return response
+                wait = self._backoff(attempt, response)
+                response.close()
+            self.metrics.inc('ria_retries_total', method=method, endpoint=path)
+            if DEBUG:
+                print(f'{method} {url} failed, retry {attempt + 1}/{retries} in {wait:.1f}s')
+            time.sleep(wait)
+            attempt += 1
+
+    def _parse(self, content: bytes) -> LET:
+        """Parse a xml response and record the parse time
+        """
+        with self.metrics.timer('xml_parse_seconds'):
+            return LET.fromstring(content)
 
     def get_json(self, url: str) ->List[dict]:
         """GET a json and return a List of dictonaries 
         """
         get_url = self.server + url
-        response = self.session.get(get_url)
+        response = self._request('GET', get_url)
         if response.status_code == 200:
            return json.loads(response.content) 
         else:
@@ -86,49 +164,66 @@ class ZetcomSession:
         """GET a xml response
         """
         get_url = self.server + url
-        response = self.session.get(get_url)
+        response = self._request('GET', get_url)
         if response.status_code == 200:
-           return LET.fromstring(response.content) 
+           return self._parse(response.content) 
         else:
             raise Exception(response.status_code)
 
+    def get_vocabulary_nodes(self, vocabulary: str, nodeName='', offset=0, limit=500) ->Iterator[LET]:
+        """GET a page of vocabulary nodes and yield each node as it is parsed,
+        nodes that were yielded before are removed from the tree
+        """
+        url = self.server + '/ria-ws/application/vocabulary/instances/' + vocabulary + '/nodes/search/?' \
+                + urllib.parse.urlencode({ 'nodeName': nodeName, 'offset': offset, 'limit': limit })
+        response = self._request('GET', url)
+        if response.status_code != 200:
+            raise Exception(response.status_code)
+        for event, node in LET.iterparse(io.BytesIO(response.content), events=('end',), tag='{*}node'):
+            yield node
+            while node.getprevious() is not None:
+                del node.getparent()[0]
+
     def open(self, attempt=0):
         """Open a session on the server
         """
         auth_url = self.server + '/ria-ws/application/session'
         headers = {"Content-Type": "application/xml"}
         try:
-            credentials = keyring.get_credential(self.server, self.username)
-            self.session.auth = (f'user[{credentials.username}]', f'password[{credentials.password}]')
+            if self.password is not None:
+                self.session.auth = (f'user[{self.username}]', f'password[{self.password}]')
+            else:
+                credentials = keyring.get_credential(self.server, self.username)
+                self.session.auth = (f'user[{credentials.username}]', f'password[{credentials.password}]')
         except Exception:
             print(f'Insert password for user {self.username} on server {self.server}')
             password = getpass.getpass()
             keyring.set_password(self.server, self.username, password)
             self.session.auth = (f'user[{self.username}]', f'password[{password}]')
-        response = self.session.get(auth_url)
+        response = self._request('GET', auth_url)
         if response.status_code == 200:
-           xml_response = LET.fromstring(response.content) 
+           xml_response = self._parse(response.content) 
            namespaces = { 'session': xml_response.nsmap[None] }
            if len(xml_response.xpath('//session:key', namespaces=namespaces)) > 0:
                self.key = xml_response.xpath('//session:key', namespaces=namespaces)[0].text
                self.session.auth = (f'user[{self.username}]', f'session[{self.key}]')
            else:
                raise Exception('No session key found!')
-        elif attempt < 3:
+        elif attempt < 3 and self.password is None:
             attempt += 1
             keyring.delete_password(self.server, self.username)
             print(f'Wrong password for {self.username} on server {self.server}, attempt {attempt}')
             self.open(attempt)
         else:
-            raise Exception(r.status_code)
+            raise Exception(response.status_code)
 
     def post(self, url: str, xml_string: str) -> LET:
         """Post to ria application and receive a xml response
         """
         headers = {'Content-Type':'application/xml; charset=UTF-8'}
-        response = self.session.post(self.server + url, data=xml_string, headers=headers) 
+        response = self._request('POST', self.server + url, data=xml_string, headers=headers) 
         if response.status_code == 200:
-            return LET.fromstring(response.content)
+            return self._parse(response.content)
         else:
             raise Exception(response.status_code)
 
@@ -136,14 +231,88 @@ class ZetcomSession:
         """Put to ria application and receive a xml response
         """
         headers = {'Content-Type':'application/xml; charset=UTF-8', 'Accept':'application/xml'}
-        response = self.session.put(self.server + url, data=xml_string, headers=headers) 
+        response = self._request('PUT', self.server + url, data=xml_string, headers=headers) 
         if response.status_code == 200:
-            return LET.fromstring(response.content)
+            return self._parse(response.content)
         else:
             raise Exception(response.status_code)
 
 
     def close(self):
         if self.key:
-            self.session.delete(self.server +  '/ria-ws/application/session/' + self.key)
+            self._request('DELETE', self.server +  '/ria-ws/application/session/' + self.key)
         self.session.close()
+        self.metrics.close()
+
+
+class AsyncZetcomSession:
+    """An asyncio variant of ZetcomSession.
+
+    Requests are executed on a pool of concurrency worker threads through 
+    one shared, pooled ZetcomSession, a semaphore bounds the number of 
+    requests in flight.
+    """
+    def __init__(self, username="SimpleUserTest", server='https://mptest.kumu.swiss', concurrency=20, **transport): 
+        self.zsession = ZetcomSession(username, server, pool_size=max(concurrency, transport.pop('pool_size', 10)), **transport)
+        self.concurrency = concurrency
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    @property
+    def server(self) ->str:
+        return self.zsession.server
+
+    @property
+    def username(self) ->str:
+        return self.zsession.username
+
+    @property
+    def key(self) ->str:
+        return self.zsession.key
+
+    @property
+    def metrics(self) ->MetricsRegistry:
+        return self.zsession.metrics
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def _call(self, function, *args):
+        async with self.semaphore:
+            return await self._run(function, *args)
+
+    async def get_json(self, url: str) ->List[dict]:
+        """GET a json and return a List of dictonaries 
+        """
+        return await self._call(self.zsession.get_json, url)
+
+    async def get(self, url: str) -> LET:
+        """GET a xml response
+        """
+        return await self._call(self.zsession.get, url)
+
+    async def open(self):
+        """Open a session on the server
+        """
+        await self._run(self.zsession.open)
+
+    async def post(self, url: str, xml_string: str) -> LET:
+        """Post to ria application and receive a xml response
+        """
+        return await self._call(self.zsession.post, url, xml_string)
+
+    async def put(self, url: str, xml_string: str) -> LET:
+        """Put to ria application and receive a xml response
+        """
+        return await self._call(self.zsession.put, url, xml_string)
+
+    async def close(self):
+        await self._run(self.zsession.close)
+        self.executor.shutdown()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
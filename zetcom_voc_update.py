@@ -17,6 +17,8 @@
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <https://www.gnu.org/licenses/> 1}}}
 from colorama import Fore, Style
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import csv
 import getpass
 import getopt
@@ -31,13 +33,52 @@ import sys
 import urllib.parse
 import xml.dom.minidom as MD
 from xml.etree import ElementTree
+import uuid
 import lxml.etree as LET
 from lxml.etree import Element
+from journal import Journal
 import zetcom_session
 from zetcom_session import DataItem, SchemaItem
-from typing import List
+from typing import Iterator, List
 
 DEBUG = False 
+VOCABULARY_NS = 'http://www.zetcom.com/ria/ws/vocabulary'
+
+def latest_run(journal: Journal) ->dict:
+    """Return the start record of the latest run in journal or None
+    """
+    latest = None
+    if journal is not None:
+        for record in journal.records():
+            if record['status'] == 'started':
+                latest = record
+    return latest
+
+def run_ids(journal: Journal) ->List[str]:
+    """Return the ids of all runs in journal, None for records without a run id
+    """
+    runs = []
+    if journal is not None:
+        for record in journal.records():
+            if record.get('run') not in runs:
+                runs.append(record.get('run'))
+    return runs
+
+def last_records(journal: Journal, run: str = None) ->dict:
+    """Return the last journal record of run for each PUT url and node id
+    """
+    records = {}
+    if journal is not None:
+        for record in journal.records():
+            if record.get('run') == run:
+                records[record['key']] = record
+    return records
+
+def open_entries(records: dict) ->List[str]:
+    """Return the urls of PUTs that are pending or belong to a node that is not committed
+    """
+    return [ key for key, record in records.items() if record['status'] == 'pending'\
+            or (record['status'] == 'done' and records.get(record['node'], {}).get('status') != 'committed') ]
 
 
 class ZetcomVocUpdate:
@@ -57,11 +98,16 @@ class ZetcomVocUpdate:
                 </modules> \
     </application>' 
 
-    def __init__(self, vocabulary: str, filter_term: str, replace_term: str, username="SimpleUserTest", server='https://mptest.kumu.swiss'): 
-        self.zsession = zetcom_session.ZetcomSession(username, server)
+    PAGE_SIZE = 500
+
+    def __init__(self, vocabulary: str, filter_term: str, replace_term: str, username="SimpleUserTest", server='https://mptest.kumu.swiss', workers=1, journal: Journal = None, password=None): 
+        self.zsession = zetcom_session.ZetcomSession(username, server, pool_size=max(10, workers), password=password)
         self.vocabulary = vocabulary
         self.filter_term = filter_term
         self.replace_term = replace_term
+        self.workers = workers
+        self.journal = journal
+        self.run = None
         self.zsession.open()
 
     def get_nodes(self) -> LET:
@@ -70,31 +116,176 @@ class ZetcomVocUpdate:
         url = '/ria-ws/application/vocabulary/instances/' + self.vocabulary + '/nodes/search/?nodeName=' + self.filter_term 
         return self.zsession.get(url)
 
-    def update_node(self, node: Element, namespaces: dict) ->LET:
-        logicalName = node.get('logicalName').replace(self.filter_term, self.replace_term)
-        node.set('logicalName', logicalName)
+    def get_node_pages(self, page_size=PAGE_SIZE, dry_run=False) ->Iterator[Iterator[Element]]:
+        """Yield the nodes that conform to filter term page by page, each page
+        is an iterator of nodes that are parsed as they are read.
+
+        Renamed nodes drop out of the search: the next page is requested 
+        after the previous one was consumed, its offset only skips the nodes 
+        that still conform to the filter term, or all nodes with dry_run.
+        Nodes that are returned again are not yielded twice but skipped by 
+        the following offsets, so a page without new nodes ends the search 
+        at the latest when the offset passes the last node.
+        """
+        offset = 0
+        seen = set()
+        while True:
+            nodes = []
+            yield self._page(offset, page_size, nodes, seen)
+            offset += len([ node for node, was_seen in nodes if was_seen or dry_run or self.filter_term in node.get('logicalName') ])
+            if len(nodes) < page_size:
+                break
+
+    def _page(self, offset: int, page_size: int, nodes: List[tuple], seen: set) ->Iterator[Element]:
+        for node in self.zsession.get_vocabulary_nodes(self.vocabulary, self.filter_term, offset, page_size):
+            nodes.append((node, node.get('id') in seen))
+            if node.get('id') not in seen:
+                seen.add(node.get('id'))
+                yield node
+
+    def plan_node(self, node: Element, namespaces: dict) ->List[tuple]:
+        """Replace filter term in node and return the (url, original xml, updated xml) PUTs,
+        terms before the node. Terms and node names that would not change are skipped.
+        """
+        puts = []
         record_id = node.get('id')
+        node_url = '/ria-ws/application/vocabulary/instances/' + self.vocabulary + '/nodes/' + record_id 
+        node_original = LET.tostring(node, encoding='UTF-8')
         for content in node.xpath('collection:terms/collection:term/collection:content', namespaces=namespaces):
-            content.text = content.text.replace(self.filter_term, self.replace_term)
+            text = content.text if content.text is not None else ''
+            if text.replace(self.filter_term, self.replace_term) == text:
+                continue
             term = content.getparent()
-            term_id = term.get('id')
-            url = '/ria-ws/application/vocabulary/instances/' + self.vocabulary + '/nodes/' + record_id + '/terms/' + term_id
-            xml_string = LET.tostring(content.getparent(), encoding='UTF-8')
-            self.zsession.put(url, xml_string)
-        xml_string = LET.tostring(node, encoding='UTF-8')
-        url = '/ria-ws/application/vocabulary/instances/' + self.vocabulary + '/nodes/' + record_id 
-        return self.zsession.put(url, xml_string)
-
-    def update(self, xml_tree: LET) ->int:
-        namespaces = {}
-        namespaces['collection'] = xml_tree.nsmap[None]
-        for node in xml_tree.xpath('//collection:collection/collection:node', namespaces=namespaces):
-            xml = self.update_node(node, namespaces)    
-            print(xml.get('logicalName'))
-        return 0
+            term_original = LET.tostring(term, encoding='UTF-8')
+            content.text = text.replace(self.filter_term, self.replace_term)
+            url = node_url + '/terms/' + term.get('id')
+            puts.append((url, term_original, LET.tostring(term, encoding='UTF-8')))
+        logicalName = node.get('logicalName')
+        if logicalName.replace(self.filter_term, self.replace_term) != logicalName:
+            node.set('logicalName', logicalName.replace(self.filter_term, self.replace_term))
+            puts.append((node_url, node_original, LET.tostring(node, encoding='UTF-8')))
+        return puts
+
+    def _journal(self, **record):
+        if self.journal is not None:
+            self.journal.append(dict(record, run=self.run))
+
+    def read_journal(self) ->dict:
+        """Return the last journal record of the current run for each PUT url and node id
+        """
+        return last_records(self.journal, self.run)
+
+    def start_run(self, resume=False):
+        """Start a new run in the journal, with resume continue the latest run 
+        if it replaces the same terms.
+        """
+        latest = latest_run(self.journal)
+        if resume and latest is not None and latest['filter'] == self.filter_term and latest['replace'] == self.replace_term:
+            self.run = latest['run']
+            return
+        if resume:
+            print(Fore.MAGENTA + f'The latest run in the journal does not replace "{self.filter_term}" by "{self.replace_term}", starting a new run.' + Style.RESET_ALL)
+        self.run = uuid.uuid4().hex
+        self._journal(key='run', status='started', filter=self.filter_term, replace=self.replace_term)
+
+    def put_node(self, node: Element, puts: List[tuple]) ->LET:
+        """PUT the planned terms and node one after the other.
+
+        Every PUT is journaled with its original xml before it is sent, 
+        the node is marked committed when all its PUTs succeeded.
+        """
+        xml = node
+        for url, original, xml_string in puts:
+            self._journal(key=url, node=node.get('id'), status='pending', original=original.decode('utf-8'), updated=xml_string.decode('utf-8'))
+            xml = self.zsession.put(url, xml_string)
+            self._journal(key=url, node=node.get('id'), status='done')
+        self._journal(key=node.get('id'), status='committed')
+        return xml
+
+    def rollback(self) ->int:
+        """Restore the original xml of all journaled PUTs of the latest run, the latest first.
+        Returns the number of restored PUTs.
+        """
+        latest = latest_run(self.journal)
+        if latest is None:
+            print(Fore.RED + 'There is no run in the journal that could be rolled back!' + Style.RESET_ALL)
+            return 0
+        self.run = latest['run']
+        print(f'Rolling back the replacement of "{latest["filter"]}" by "{latest["replace"]}"')
+        originals = {}
+        committed = []
+        for record in self.journal.records():
+            if record.get('run') != self.run:
+                continue
+            if record['status'] == 'pending' and record['key'] not in originals:
+                originals[record['key']] = record['original']
+            elif record['status'] == 'committed':
+                committed.append(record['key'])
+            elif record['status'] == 'rolledback':
+                originals.pop(record['key'], None)
+        for url in reversed(list(originals.keys())):
+            self.zsession.put(url, originals[url].encode('utf-8'))
+            self._journal(key=url, status='rolledback')
+            print(f'Restored: {url}')
+        for node_id in committed:
+            self._journal(key=node_id, status='rolledback')
+        return len(originals)
+
+    def update_node(self, node: Element, namespaces: dict) ->LET:
+        return self.put_node(node, self.plan_node(node, namespaces))
+
+    def print_diff(self, puts: List[tuple]):
+        """Print the changes of the planned PUTs
+        """
+        for url, original, xml_string in puts:
+            print(url)
+            print(Fore.RED + '- ' + original.decode('utf-8') + Style.RESET_ALL)
+            print(Fore.GREEN + '+ ' + xml_string.decode('utf-8') + Style.RESET_ALL)
+
+    def _finished(self, node: Element, future):
+        future.result()
+        print(node.get('logicalName'))
+
+    def update(self, xml_tree: LET = None, dry_run=False, resume=False) ->int:
+        """Update all nodes of xml_tree or of the paged node search, returns 
+        the number of changed nodes.
+
+        Nodes are updated concurrently by a pool of workers, the terms of a 
+        node are always PUT before the node itself. With dry_run the changes
+        are printed instead, with resume nodes committed by the latest run in 
+        the journal are skipped if it replaced the same terms.
+        """
+        namespaces = { 'collection': xml_tree.nsmap[None] if xml_tree is not None else VOCABULARY_NS }
+        pages = [ xml_tree.xpath('//collection:collection/collection:node', namespaces=namespaces) ] if xml_tree is not None else self.get_node_pages(self.PAGE_SIZE, dry_run)
+        changed = 0
+        pending = deque()
+        if not dry_run and self.journal is not None:
+            self.start_run(resume)
+        committed = set([ key for key, record in self.read_journal().items() if record['status'] == 'committed' ]) if resume else set()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for page in pages:
+                for node in page:
+                    if node.get('id') in committed:
+                        print(f'Resumed: {node.get("logicalName")}')
+                        continue
+                    puts = self.plan_node(node, namespaces)
+                    if len(puts) == 0:
+                        continue
+                    changed += 1
+                    if dry_run:
+                        self.print_diff(puts)
+                        continue
+                    pending.append((node, executor.submit(self.put_node, node, puts)))
+                    if len(pending) >= 4*self.workers:
+                        self._finished(*pending.popleft())
+                while len(pending) > 0:
+                    self._finished(*pending.popleft())
+        return changed
        
     def close(self):
         self.zsession.close()
+        if self.journal is not None:
+            self.journal.close()
 
 
 def usage():
@@ -109,11 +300,17 @@ def main(argv):
 
         OPTIONS:
         -h|--help                      show help
+        -a|--resume                    skip nodes that are committed by the latest run in the journal
+        -d|--dry-run                   print the changes without updating
         -f|--filter                    provide a filter term
+        -j|--journal                   write-ahead journal (default: journal_<vocabulary>.jsonl)
+        -n|--new-journal               start a new journal, refused while PUTs of the old one are not committed
         -r|--replace                   provide a replace term
+        --rollback                     restore the original content of all PUTs of the latest run in the journal
         -s|--server + mplus:           provide mplus address
         -u|--user:                     provide username as email address
         -v|--vocabulary:               provide the vocabulary name
+        -w|--workers                   number of nodes that are updated concurrently (default: 1)
     
         :return: exit code (int)
     """
@@ -122,8 +319,14 @@ def main(argv):
     vocabulary = 'PerRightsHolderVgr'
     filter_term = '2025'
     replace_term = '2026'
+    dry_run = False
+    workers = 1
+    journal_file = ''
+    resume = False
+    rollback = False
+    new_journal = False
     try:
-        opts, args = getopt.getopt(argv, "hf:r:s:u:v:", ["help", "filter=","replace=","server=", "user=", "vocabulary="])
+        opts, args = getopt.getopt(argv, "hadf:j:nr:s:u:v:w:", ["help", "resume", "dry-run", "filter=", "journal=", "new-journal", "replace=", "rollback", "server=", "user=", "vocabulary=", "workers="])
     except getopt.GetoptError:
         usage()
         return 2
@@ -131,19 +334,47 @@ def main(argv):
         if opt in ('-h', '--help'):
             usage()
             return 0
+        elif opt in ('-a', '--resume'):
+            resume = True
+        elif opt in ('-d', '--dry-run'):
+            dry_run = True
         elif opt in ('-f', '--filter'):
             filter_term = arg
+        elif opt in ('-j', '--journal'):
+            journal_file = arg
+        elif opt in ('-n', '--new-journal'):
+            new_journal = True
         elif opt in ('-r', '--replace'):
             replace_term = arg
+        elif opt == '--rollback':
+            rollback = True
         elif opt in ('-s', '--server'):
             zetcom_server = arg
         elif opt in ('-u', '--user'):
             username = arg
         elif opt in ('-v', '--vocabulary'):
             vocabulary = arg
-    voc = ZetcomVocUpdate(vocabulary, filter_term, replace_term, username, zetcom_server)
-    xml_tree = voc.get_nodes()
-    voc.update(xml_tree)
+        elif opt in ('-w', '--workers'):
+            workers = int(arg)
+    if dry_run and rollback:
+        print(Fore.RED + '--dry-run cannot be combined with --rollback!' + Style.RESET_ALL)
+        return 2
+    journal = None
+    if not dry_run:
+        journal_file = journal_file if journal_file != '' else 'journal_' + vocabulary + '.jsonl'
+        journal = Journal(journal_file, sync=True)
+        if new_journal:
+            entries = [ entry for run in run_ids(journal) for entry in open_entries(last_records(journal, run)) ]
+            journal.close()
+            if len(entries) > 0:
+                print(Fore.RED + f'{journal_file} has {len(entries)} PUTs that are not committed, use --resume or --rollback!' + Style.RESET_ALL)
+                return 1
+            journal = Journal(journal_file, truncate=True, sync=True)
+    voc = ZetcomVocUpdate(vocabulary, filter_term, replace_term, username, zetcom_server, workers, journal)
+    if rollback:
+        voc.rollback()
+    else:
+        voc.update(dry_run=dry_run, resume=resume)
     voc.close()
     return 0 
 